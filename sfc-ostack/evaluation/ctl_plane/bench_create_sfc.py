@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+
+"""
+About : Benchmark the SFC creation and deletion control plane offline
+
+        - record: Create and delete a SFC on a real cloud, all API requests
+                  are recorded into a fixture file.
+        - replay: Create and delete the same SFC with responses served from the
+                  fixture file, optionally with a injected latency.
+
+        SF programs are not waited in both modes, since no ready-packets are
+        sent in the replay mode.
+
+Email : xianglinks@gmail.com
+"""
+
+import argparse
+import sys
+import time
+
+from sfcostack import conf, log
+from sfcostack.dev import http_fixture
+from sfcostack.sfc import manager
+
+
+def run_bench():
+    sfc_conf = conf.SFCConf()
+    sfc_conf.load_file(CONF_FILE)
+    log.conf_logger(level=sfc_conf.log.level)
+
+    if MODE == 'record':
+        sess_reg = http_fixture.get_record_registry(FIXTURE_FILE)
+    else:
+        sess_reg = http_fixture.get_replay_registry(FIXTURE_FILE, LATENCY)
+
+    sfc_mgr = manager.StaticSFCManager(
+        sfc_conf.auth,
+        mgr_ip=sfc_conf.sfc_mgr_conf.mgr_ip,
+        mgr_port=sfc_conf.sfc_mgr_conf.mgr_port,
+        return_ts=True, sess_reg=sess_reg
+    )
+
+    start_ts = time.time()
+    sfc, time_info = sfc_mgr.create_sfc(sfc_conf, ALLOC_METHOD, CHAIN_METHOD,
+                                        wait_sf_ready=False)
+    create_ts = time.time() - start_ts
+    start_ts = time.time()
+    sfc_mgr.delete_sfc(sfc)
+    delete_ts = time.time() - start_ts
+
+    print('[INFO] Mode: %s, fixture file: %s' % (MODE, FIXTURE_FILE))
+    print('[INFO] Time info: %s' % ','.join(map(str, time_info)))
+    print('[INFO] Creation time: %.4fs, deletion time: %.4fs' %
+          (create_ts, delete_ts))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        description='Benchmark SFC creation with recorded cloud API responses.')
+    ap.add_argument('mode', choices=['record', 'replay'],
+                    help='Record requests on a cloud or replay them')
+    ap.add_argument('conf_file', help='sfc-ostack conf file')
+    ap.add_argument('fixture_file', help='Path of the fixture file')
+    ap.add_argument('-a', '--alloc_method', default='nova_default',
+                    help='SFC allocation method')
+    ap.add_argument('-c', '--chain_method', default='default',
+                    help='SFC chain method')
+    ap.add_argument('-l', '--latency', type=float, default=None,
+                    help=('Injected latency for each replayed response in '
+                          'seconds, the recorded latency is used by default'))
+
+    if len(sys.argv) == 1:
+        ap.print_help()
+        sys.exit()
+
+    args = ap.parse_args()
+    MODE = args.mode
+    CONF_FILE = args.conf_file
+    FIXTURE_FILE = args.fixture_file
+    ALLOC_METHOD = args.alloc_method
+    CHAIN_METHOD = args.chain_method
+    LATENCY = args.latency
+
+    run_bench()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+
+"""
+About : Compare chain building time of SFCClient and AsyncSFCClient
+
+        Both clients run against a local stub Neutron server(stub_neutron.py)
+        with injected per-request latency. A chain has grp_num port pair
+        groups, each with pp_num port pairs.
+
+Email : xianglinks@gmail.com
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+
+from sfcostack.sfc import netsfc_clt
+
+from stub_neutron import start_stub_server
+
+
+def _pp_args(chn_idx, grp_idx, pp_idx):
+    return {
+        'name': 'bench_%d_pp_%d_%d' % (chn_idx, grp_idx, pp_idx),
+        'ingress': 'in_%d_%d' % (grp_idx, pp_idx),
+        'egress': 'out_%d_%d' % (grp_idx, pp_idx)
+    }
+
+
+def build_chain_sync(clt, chn_idx, grp_num, pp_num):
+    """Build a chain with blocking and sequential requests"""
+    pp_grp_id_lst = list()
+    for grp_idx in range(grp_num):
+        pp_id_lst = [
+            clt.create('port_pair', _pp_args(chn_idx, grp_idx, pp_idx))['id']
+            for pp_idx in range(pp_num)
+        ]
+        pp_grp = clt.create('port_pair_group', {
+            'name': 'bench_%d_pp_grp_%d' % (chn_idx, grp_idx),
+            'port_pairs': pp_id_lst
+        })
+        pp_grp_id_lst.append(pp_grp['id'])
+    fc = clt.create('flow_classifier', {'name': 'bench_%d_fc' % chn_idx})
+    clt.create('port_chain', {
+        'name': 'bench_%d_pc' % chn_idx,
+        'port_pair_groups': pp_grp_id_lst,
+        'flow_classifiers': [fc['id']]
+    })
+
+
+async def _build_grp_async(async_clt, chn_idx, grp_idx, pp_num):
+    pp_lst = await asyncio.gather(*[
+        async_clt.create('port_pair', _pp_args(chn_idx, grp_idx, pp_idx))
+        for pp_idx in range(pp_num)
+    ])
+    pp_grp = await async_clt.create('port_pair_group', {
+        'name': 'bench_%d_pp_grp_%d' % (chn_idx, grp_idx),
+        'port_pairs': [pp['id'] for pp in pp_lst]
+    })
+    return pp_grp['id']
+
+
+async def build_chain_async(async_clt, chn_idx, grp_num, pp_num):
+    """Build a chain with concurrent requests for independent resources"""
+    *pp_grp_id_lst, fc = await asyncio.gather(
+        *[_build_grp_async(async_clt, chn_idx, grp_idx, pp_num)
+          for grp_idx in range(grp_num)],
+        async_clt.create('flow_classifier', {'name': 'bench_%d_fc' % chn_idx})
+    )
+    await async_clt.create('port_chain', {
+        'name': 'bench_%d_pc' % chn_idx,
+        'port_pair_groups': pp_grp_id_lst,
+        'flow_classifiers': [fc['id']]
+    })
+
+
+def run_bench():
+    server, auth_args = start_stub_server(latency=LATENCY)
+    clt = netsfc_clt.SFCClient(auth_args)
+    async_clt = netsfc_clt.AsyncSFCClient(auth_args,
+                                          max_concurrency=MAX_CONCURRENCY,
+                                          sfc_client=clt)
+
+    sync_ts_lst = list()
+    async_ts_lst = list()
+    for rd in range(TEST_ROUND):
+        start_ts = time.time()
+        build_chain_sync(clt, 2 * rd, GRP_NUM, PP_NUM)
+        sync_ts_lst.append(time.time() - start_ts)
+
+        start_ts = time.time()
+        asyncio.run(
+            build_chain_async(async_clt, 2 * rd + 1, GRP_NUM, PP_NUM))
+        async_ts_lst.append(time.time() - start_ts)
+
+    async_clt.close()
+    server.shutdown()
+
+    print('[INFO] Groups: %d, port pairs per group: %d, latency: %.3fs' %
+          (GRP_NUM, PP_NUM, LATENCY))
+    print('[INFO] Sync chain building time: %.4fs' %
+          (sum(sync_ts_lst) / TEST_ROUND))
+    print('[INFO] Async chain building time: %.4fs' %
+          (sum(async_ts_lst) / TEST_ROUND))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        description='Benchmark chain building with sync and async SFC client.')
+    ap.add_argument('grp_num', type=int, help='Number of port pair groups')
+    ap.add_argument('-p', '--pp_num', type=int, default=1,
+                    help='Number of port pairs per group')
+    ap.add_argument('-l', '--latency', type=float, default=0.02,
+                    help='Injected latency for every request in seconds')
+    ap.add_argument('-c', '--concurrency', type=int, default=8,
+                    help='Maximal number of concurrent requests of async client')
+    ap.add_argument('-r', '--round', type=int, default=3,
+                    help='Number of rounds for testing')
+
+    if len(sys.argv) == 1:
+        ap.print_help()
+        sys.exit()
+
+    args = ap.parse_args()
+    GRP_NUM = args.grp_num
+    PP_NUM = args.pp_num
+    LATENCY = args.latency
+    MAX_CONCURRENCY = args.concurrency
+    TEST_ROUND = args.round
+
+    run_bench()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+
+"""
+About : Local stub of Keystone and Neutron networking-sfc API
+
+        Used to benchmark the control plane of sfc-ostack without a cloud.
+        Serves the Keystone v3 token API with a catalog pointing to itself and
+        the CRUD API of networking-sfc resources, each request is delayed by a
+        configurable latency.
+
+Email : xianglinks@gmail.com
+"""
+
+import argparse
+import itertools
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlparse
+
+SFC_RSC = {
+    'flow_classifiers': 'flow_classifier',
+    'port_pairs': 'port_pair',
+    'port_pair_groups': 'port_pair_group',
+    'port_chains': 'port_chain'
+}
+
+RSC_URL = re.compile(r'^/v2\.0/sfc/(?P<rsc>[a-z_]+?)(/(?P<id>[^/]+))?$')
+
+
+class StubNeutronHandler(BaseHTTPRequestHandler):
+
+    """Request handler of the stub server"""
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send_json(self, code, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode('utf-8'))
+
+    def _endpoint(self):
+        return 'http://%s:%d' % self.server.server_address
+
+    def _token(self):
+        endpoint = self._endpoint()
+        return {
+            'token': {
+                'methods': ['password'],
+                'expires_at': '2099-01-01T00:00:00.000000Z',
+                'issued_at': '2017-01-01T00:00:00.000000Z',
+                'user': {'id': 'stub_user', 'name': 'admin',
+                         'domain': {'id': 'default', 'name': 'Default'}},
+                'project': {'id': 'stub_project', 'name': 'admin',
+                            'domain': {'id': 'default', 'name': 'Default'}},
+                'roles': [{'id': 'admin', 'name': 'admin'}],
+                'catalog': [{
+                    'type': 'network', 'name': 'neutron', 'id': 'neutron',
+                    'endpoints': [
+                        {'interface': itf, 'region': 'RegionOne',
+                         'region_id': 'RegionOne', 'id': itf,
+                         'url': endpoint + '/'}
+                        for itf in ('admin', 'internal', 'public')
+                    ]
+                }]
+            }
+        }
+
+    def _handle(self, method):
+        time.sleep(self.server.latency)
+        url = urlparse(self.path)
+        path = url.path.rstrip('/')
+        if method == 'POST' and path.endswith('/auth/tokens'):
+            self._read_json()
+            self._send_json(201, self._token(),
+                            {'X-Subject-Token': 'stub_token'})
+            return
+        if method == 'GET' and path.endswith('/identity/v3'):
+            self._send_json(200, {'version': {
+                'id': 'v3.8', 'status': 'stable',
+                'links': [{'rel': 'self',
+                           'href': self._endpoint() + path + '/'}]
+            }})
+            return
+        if method == 'GET' and path == '':
+            self._send_json(200, {'versions': [{
+                'id': 'v2.0', 'status': 'CURRENT',
+                'links': [{'rel': 'self',
+                           'href': self._endpoint() + '/v2.0/'}]
+            }]})
+            return
+        match = RSC_URL.match(path)
+        if not match or match.group('rsc') not in SFC_RSC:
+            self._send_json(404, {'NeutronError': {'message': 'Not found'}})
+            return
+        self.server.handle_rsc(self, method, match.group('rsc'),
+                               match.group('id'), parse_qs(url.query))
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+class StubNeutronServer(ThreadingMixIn, HTTPServer):
+
+    """Threaded stub server keeping SFC resources in memory"""
+
+    daemon_threads = True
+
+    def __init__(self, addr, latency=0.0):
+        """Init a stub server
+
+        :param addr (tuple): (IP, port) to bind
+        :param latency (float): Injected latency for every request in seconds
+        """
+        super(StubNeutronServer, self).__init__(addr, StubNeutronHandler)
+        self.latency = latency
+        self.items = {plural: dict() for plural in SFC_RSC}
+        self.req_num = 0
+        self._lock = threading.Lock()
+        self._id_gen = itertools.count()
+
+    def _add_item(self, plural, item_args):
+        item = dict(item_args)
+        item['id'] = 'stub-%s-%d' % (SFC_RSC[plural], next(self._id_gen))
+        self.items[plural][item['id']] = item
+        return item
+
+    def handle_rsc(self, handler, method, plural, item_id, query):
+        single = SFC_RSC[plural]
+        with self._lock:
+            self.req_num += 1
+            if method == 'GET' and not item_id:
+                fields = query.pop('fields', None)
+                limit = int(query.pop('limit', [0])[0])
+                marker = query.pop('marker', [None])[0]
+                item_lst = [item for item in self.items[plural].values()
+                            if all(item.get(key) in values
+                                   for key, values in query.items())]
+                if marker:
+                    marker_idx = [item['id'] for item in item_lst].index(marker)
+                    item_lst = item_lst[marker_idx + 1:]
+                if limit:
+                    item_lst = item_lst[:limit]
+                if fields:
+                    item_lst = [{key: item.get(key) for key in fields}
+                                for item in item_lst]
+                handler._send_json(200, {plural: item_lst})
+            elif method == 'POST':
+                body = handler._read_json()
+                if plural in body:
+                    handler._send_json(201, {plural: [
+                        self._add_item(plural, args) for args in body[plural]
+                    ]})
+                else:
+                    handler._send_json(
+                        201, {single: self._add_item(plural, body[single])})
+            elif method == 'DELETE' and item_id in self.items[plural]:
+                del self.items[plural][item_id]
+                handler.send_response(204)
+                handler.end_headers()
+            elif item_id in self.items[plural]:
+                if method == 'PUT':
+                    self.items[plural][item_id].update(
+                        handler._read_json()[single])
+                handler._send_json(200, {single: self.items[plural][item_id]})
+            else:
+                handler._send_json(
+                    404, {'NeutronError': {'message': 'Not found'}})
+
+
+def start_stub_server(ip='127.0.0.1', port=0, latency=0.0):
+    """Start a stub server in a daemon thread
+
+    :return: The server object and its auth arguments for SFCClient
+    """
+    server = StubNeutronServer((ip, port), latency)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    auth_args = {
+        'auth_url': 'http://%s:%d/identity/v3' % server.server_address,
+        'project_name': 'admin',
+        'project_domain_name': 'default',
+        'username': 'admin',
+        'user_domain_name': 'default',
+        'password': 'stack'
+    }
+    return server, auth_args
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        description='Run a stub Keystone and Neutron networking-sfc server.')
+    ap.add_argument('-i', '--ip', default='127.0.0.1', help='IP to bind')
+    ap.add_argument('-p', '--port', type=int, default=9696,
+                    help='Port to bind')
+    ap.add_argument('-l', '--latency', type=float, default=0.0,
+                    help='Injected latency for every request in seconds')
+
+    if len(sys.argv) == 1:
+        ap.print_help()
+        sys.exit()
+
+    args = ap.parse_args()
+    server = StubNeutronServer((args.ip, args.port), args.latency)
+    print('[INFO] Stub server listens on %s:%d' % server.server_address)
+    server.serve_forever()
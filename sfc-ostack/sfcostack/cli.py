@@ -14,7 +14,7 @@ import sys
 sys.path.insert(1, '../')
 
 from sfcostack import conf
-from sfcostack.sfc import resource
+from sfcostack.sfc import journal, resource
 
 
 def cli():
@@ -30,7 +30,14 @@ def cli():
         'conf_path', help='Path of configuration file(YAML format).', type=str
     )
     parser.add_argument(
-        'operation', help='Operation for SFC', choices=['create', 'delete']
+        'operation', help='Operation for SFC',
+        choices=['create', 'delete', 'teardown']
+    )
+    parser.add_argument(
+        '-j', '--journal', type=str, default=None,
+        help=('Path of the resource journal. Created resources are recorded '
+              'in it, teardown deletes only resources in it. '
+              'Default: <port chain name>.journal')
     )
 
     if len(sys.argv) < 2:
@@ -44,28 +51,45 @@ def cli():
     net_conf = conf_hd.get_sfc_net()
     srv_queue = conf_hd.get_sfc_server()
     fc_conf = conf_hd.get_sfc_fc()
+    jnl_path = args.journal or '%s.journal' % fc_conf['name']
 
     if args.operation == 'create':
         logger.info('Create the SFC, config file path: %s' % args.conf_path)
+        jnl = journal.Journal(jnl_path)
         srv_chain = resource.ServerChain(auth_args, fc_conf['name'],
                                          fc_conf['description'],
-                                         net_conf, srv_queue, False, 'pt_in')
+                                         net_conf, srv_queue, False, 'pt_in',
+                                         journal=jnl)
         srv_chain.create()
         port_chain = resource.PortChain(auth_args, fc_conf['name'],
                                         fc_conf['description'],
-                                        srv_chain, flow_conf)
+                                        srv_chain, flow_conf, journal=jnl)
         port_chain.create()
+        jnl.close()
 
     elif args.operation == 'delete':
         logger.info('Delete the SFC, config file: %s' % args.conf_path)
+        jnl = journal.Journal(jnl_path)
         srv_chain = resource.ServerChain(auth_args, fc_conf['name'],
                                          fc_conf['description'],
-                                         net_conf, srv_queue, False)
+                                         net_conf, srv_queue, False,
+                                         journal=jnl)
         port_chain = resource.PortChain(auth_args, fc_conf['name'],
                                         fc_conf['description'],
-                                        srv_chain, flow_conf)
-        port_chain.delete()
-        srv_chain.delete()
+                                        srv_chain, flow_conf, journal=jnl)
+        try:
+            port_chain.delete()
+            srv_chain.delete()
+        finally:
+            # MARK: Resources failed to be deleted are kept for teardown
+            jnl.close(remove_empty=True)
+
+    elif args.operation == 'teardown':
+        logger.info('Teardown the SFC, journal file: %s' % jnl_path)
+        fail_map = journal.teardown(jnl_path, auth_args)
+        if fail_map:
+            logger.error('Failed to delete resources: %s' % fail_map)
+            sys.exit(1)
 
 
 def dev_test():
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+
+"""
+About: Shared cloud sessions and service clients
+
+       Sessions, connections and service clients are created once per cloud
+       (identified by the authentication arguments) and shared by all sfc-ostack
+       resources. Each session uses a pooled keep-alive HTTP connection and
+       re-uses the Keystone token until it expires.
+
+Email: xianglinks@gmail.com
+"""
+
+import threading
+
+import requests
+from heatclient import client as heatclient
+from keystoneauth1 import loading, session
+from openstack import connection
+from requests.adapters import HTTPAdapter
+
+from sfcostack import log
+from sfcostack.sfc import netsfc_clt
+
+logger = log.logger
+
+
+class SessionRegistry(object):
+
+    """Registry of auth-sessions and service clients keyed by auth arguments"""
+
+    def __init__(self, pool_connections=4, pool_maxsize=16,
+                 http_adapter=None):
+        """Init a session registry
+
+        :param pool_connections (int): Number of cached connection pools(hosts)
+        :param pool_maxsize (int): Maximal number of connections in each pool
+        :param http_adapter (requests.adapters.BaseAdapter): Transport adapter
+                                                             of all sessions,
+                                                             e.g. for recording
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.http_adapter = http_adapter
+        self._lock = threading.RLock()
+        # Cloud key -> {client type -> client}
+        self._clt_map = dict()
+
+    @staticmethod
+    def _get_cloud_key(auth_args):
+        return tuple(sorted((key, str(value))
+                            for key, value in auth_args.items()))
+
+    def _get_client(self, typ, auth_args, build_func):
+        """Get a cached client of a cloud, build it if not exist"""
+        cloud_key = self._get_cloud_key(auth_args)
+        with self._lock:
+            cloud_clt = self._clt_map.setdefault(cloud_key, dict())
+            if typ not in cloud_clt:
+                logger.debug('Create %s for cloud: %s',
+                             typ, auth_args['auth_url'])
+                cloud_clt[typ] = build_func(auth_args)
+            return cloud_clt[typ]
+
+    def _build_session(self, auth_args):
+        loader = loading.get_plugin_loader('password')
+        auth = loader.load_from_options(**auth_args)
+        http_sess = requests.Session()
+        adapter = self.http_adapter or HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize
+        )
+        for prefix in ('http://', 'https://'):
+            http_sess.mount(prefix, adapter)
+        return session.Session(auth=auth, session=http_sess)
+
+    def get_session(self, auth_args):
+        """Get the keystoneauth session of a cloud"""
+        return self._get_client('session', auth_args, self._build_session)
+
+    def get_connection(self, auth_args):
+        """Get the openstack-sdk connection of a cloud"""
+        return self._get_client(
+            'connection', auth_args,
+            lambda args: connection.Connection(
+                session=self.get_session(args))
+        )
+
+    def get_heat_client(self, auth_args):
+        """Get the heat client of a cloud"""
+        return self._get_client(
+            'heat_client', auth_args,
+            lambda args: heatclient.Client('1',
+                                           session=self.get_session(args))
+        )
+
+    def get_sfc_client(self, auth_args):
+        """Get the networking-sfc client of a cloud"""
+        return self._get_client(
+            'sfc_client', auth_args,
+            lambda args: netsfc_clt.SFCClient(
+                args, logger, session=self.get_session(args))
+        )
+
+    def clear(self):
+        """Remove all cached sessions and clients"""
+        with self._lock:
+            self._clt_map.clear()
+
+
+# The default registry shared by all sfc-ostack resources
+default_registry = SessionRegistry()
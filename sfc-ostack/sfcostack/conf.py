@@ -20,12 +20,70 @@ logger = log.logger
 # Supported conf format
 SUP_FMT = ('yaml', )
 
+# Supported load balancing fields of networking-sfc port pair groups
+SUP_LB_FIELDS = ('eth_src', 'eth_dst', 'ip_src', 'ip_dst',
+                 'tcp_src', 'tcp_dst', 'udp_src', 'udp_dst')
+
 
 class ConfigError(Exception):
     """Config error"""
     pass
 
 
+def _get_lb_fields(srv_name, conf):
+    """Get the load balancing fields of a server as a list
+
+    Fields can be given as a list or a string joined with '&', e.g.
+    ip_src&ip_dst, same as the networking-sfc CLI
+    """
+    lb_fields = conf.get('lb_fields', None)
+    if not lb_fields:
+        return []
+    if isinstance(lb_fields, str):
+        lb_fields = lb_fields.split('&')
+    for field in lb_fields:
+        if field not in SUP_LB_FIELDS:
+            raise ConfigError('Unknown lb_fields: %s of server: %s' %
+                              (field, srv_name))
+    return list(lb_fields)
+
+
+def get_srv_grp_lst(srv_chn_conf):
+    """Get a list of server groups from the server chain conf
+
+    Servers with the same sequence number are instances of one server group,
+    which is mapped to a port pair group. Groups are ordered by their sequence
+    numbers. The lb_fields of a group can be set on any of its servers, it is
+    copied to all servers of the group.
+
+    :param srv_chn_conf (dict): Server name -> server conf
+    :retype: list
+    """
+    seq_map = dict()
+    for srv, conf in srv_chn_conf.items():
+        conf['name'] = srv
+        if 'seq_num' not in conf:
+            raise ConfigError('Missing seq_num of server: %s' % srv)
+        seq_map.setdefault(conf['seq_num'], list()).append(conf)
+
+    srv_grp_lst = list()
+    for seq_num in sorted(seq_map):
+        srv_grp = seq_map[seq_num]
+        lb_fields_lst = [_get_lb_fields(conf['name'], conf)
+                         for conf in srv_grp]
+        lb_fields_set = set(tuple(lb_fields) for lb_fields in lb_fields_lst
+                            if lb_fields)
+        if len(lb_fields_set) > 1:
+            raise ConfigError('Conflicting lb_fields of servers with sequence '
+                              'number: %s' % seq_num)
+        if lb_fields_set:
+            lb_fields = lb_fields_set.pop()
+            for conf in srv_grp:
+                conf['lb_fields'] = list(lb_fields)
+        srv_grp_lst.append(srv_grp)
+    return srv_grp_lst
+
+
 # TODO: To be removed
 # ------------------------------------------------------------------------------
 @utils.deprecated
@@ -103,14 +161,7 @@ class ConfigHolder(object):
         if not srv_conf:
             logger.warning('No SF server(s) described in the conf file.')
             return []
-        # TODO: Add support for server group
-        srv_grp_lst = [0] * len(srv_conf)
-        for srv, conf in srv_conf.items():
-            conf['name'] = srv
-            if srv_grp_lst[conf['seq_num'] - 1] != 0:
-                raise ConfigError('Duplicated server sequence number.')
-            srv_grp_lst[conf['seq_num'] - 1] = [conf]
-            return srv_grp_lst
+        return get_srv_grp_lst(srv_conf)
 
 
 class ConfigParser(object):
@@ -284,19 +335,13 @@ class SFCConf(object):
             # logger.warning('No SF server in server_chain conf!')
             self._server_chain = []
             return
-        # MARK: Duplicated sequence number is not allowed
-        # TODO: Add support for server group
-        srv_chn = [0] * len(srv_chn_conf)
         for srv, conf in srv_chn_conf.items():
-            conf['name'] = srv
-            if srv_chn[conf['seq_num'] - 1] != 0:
-                raise ConfigError('Duplicated server sequence number.')
             self._check_sec_arg('SFC, server_chain, %s' % srv,
                                 conf,
-                                ('image', 'flavor', 'init_script')
+                                ('seq_num', 'image', 'flavor', 'init_script')
                                 )
-            srv_chn[conf['seq_num'] - 1] = [conf]
-        self._server_chain = srv_chn
+        # MARK: Servers with the same sequence number form a server group
+        self._server_chain = get_srv_grp_lst(srv_chn_conf)
 
     def _get_sample_server(self):
         return self._sample_server
@@ -14,10 +14,9 @@ Email: xianglinks@gmail.com
 import os
 import time
 
-from keystoneauth1 import loading, session
 from openstack import connection
 
-from sfcostack import hot, log
+from sfcostack import cloud, hot, log
 from sfcostack.sfc import netsfc_clt
 
 
@@ -31,10 +30,8 @@ def get_service_client(service, auth_args):
     :param service (str): Name of the service
     :param auth_args (dict): Dict of keystone authentication arguments
     """
-    # Use keystoneauth session API
-    loader = loading.get_plugin_loader('password')
-    auth = loader.load_from_options(**auth_args)
-    sess = session.Session(auth=auth)
+    # Use the shared keystoneauth session of the cloud
+    sess = cloud.default_registry.get_session(auth_args)
     if service == 'compute':
         from novaclient import client
         return client.Client(2, session=sess)
@@ -45,7 +42,7 @@ def get_service_client(service, auth_args):
         from heatclient import client
         return client.Client(1, session=sess)
     elif service == 'all':
-        return connection.Connection(**auth_args)
+        return cloud.default_registry.get_connection(auth_args)
     else:
         raise RuntimeError('Unknown service type!')
 
@@ -83,9 +80,15 @@ def cleanup_port_chn(auth_args):
     pc_client = netsfc_clt.SFCClient(auth_args)
     for pc_rsc in ('port_chain', 'flow_classifier',
                    'port_pair_group', 'port_pair'):
-        for rsc in pc_client.list(pc_rsc):
-            pc_client.delete(pc_rsc, rsc['name'])
-            time.sleep(1)
+        name_lst = [rsc['name'] for rsc in
+                    pc_client.iter_list(pc_rsc, fields=['name'])]
+        for name in name_lst:
+            pc_client.delete(pc_rsc, name)
+        # Dependent resources can only be deleted after these are removed
+        pc_client.wait_many(
+            [(pc_rsc, name, 'delete') for name in name_lst],
+            max_interval=1, timeout=60
+        )
 
 
 #############################
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+
+"""
+About: Record and replay HTTP fixtures of cloud API requests
+
+       The adapters are mounted on the HTTP session of a cloud.SessionRegistry,
+       so all Keystone, Heat, Nova, Neutron and networking-sfc requests sent by
+       sfc-ostack resources are captured or served from a fixture file.
+
+       Fixture format: JSON lines, one request/response pair per line.
+
+Usage:
+    # Record requests against a real cloud
+    sess_reg = http_fixture.get_record_registry('./create_sfc.jsonl')
+    sfc_mgr = manager.StaticSFCManager(auth_args, sess_reg=sess_reg)
+
+    # Replay without a cloud, each response is delayed by 10ms
+    sess_reg = http_fixture.get_replay_registry('./create_sfc.jsonl',
+                                                latency=0.01)
+
+Email: xianglinks@gmail.com
+"""
+
+import base64
+import datetime
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from requests import Response
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.exceptions import ConnectionError as ReqConnectionError
+from requests.structures import CaseInsensitiveDict
+
+from sfcostack import cloud, log
+
+logger = log.logger
+
+# Headers carrying Keystone tokens, never written to fixture files
+TOKEN_HEADERS = ('X-Subject-Token', 'X-Auth-Token')
+TOKEN_PLACEHOLDER = 'fixture-token'
+
+
+class FixtureError(ReqConnectionError):
+    """No recorded response for a request"""
+    pass
+
+
+def _norm_url(url):
+    """Normalize a URL by sorting the query parameters"""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, query, ''))
+
+
+def _body_digest(body):
+    if not body:
+        return ''
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return hashlib.sha1(body).hexdigest()
+
+
+def _encode_content(content):
+    try:
+        return {'text': content.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {'b64': base64.b64encode(content).decode('ascii')}
+
+
+def _decode_content(body):
+    if 'text' in body:
+        return body['text'].encode('utf-8')
+    return base64.b64decode(body['b64'])
+
+
+def _scrub_headers(headers):
+    """Replace tokens in response headers with a placeholder"""
+    headers = CaseInsensitiveDict(headers)
+    for hdr in TOKEN_HEADERS:
+        if hdr in headers:
+            headers[hdr] = TOKEN_PLACEHOLDER
+    return dict(headers)
+
+
+def _renew_token(content, lifetime=86400):
+    """Move the expiration of a recorded Keystone token into the future
+
+    Otherwise, keystoneauth re-authenticates before each replayed request
+    after the recorded expiration time.
+
+    :param content (bytes): Content of a token response
+    :param lifetime (int): Lifetime of the renewed token in seconds
+    """
+    try:
+        body = json.loads(content.decode('utf-8'))
+    except ValueError:
+        return content
+    token = body.get('token', None) if isinstance(body, dict) else None
+    if not token or 'expires_at' not in token:
+        return content
+    expires_at = datetime.datetime.utcnow()
+    expires_at += datetime.timedelta(seconds=lifetime)
+    token['expires_at'] = expires_at.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    return json.dumps(body).encode('utf-8')
+
+
+class RecordAdapter(HTTPAdapter):
+
+    """HTTP adapter that appends all request/response pairs to a fixture file
+
+    Keystone tokens in response headers are replaced with a placeholder, so
+    fixture files can be shared.
+    """
+
+    def __init__(self, path, **kargs):
+        """Init a record adapter
+
+        :param path (str): Path of the fixture file, records are appended
+        """
+        super(RecordAdapter, self).__init__(**kargs)
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, request, **kargs):
+        start_ts = time.time()
+        resp = super(RecordAdapter, self).send(request, **kargs)
+        latency = time.time() - start_ts
+        record = {
+            'method': request.method,
+            'url': _norm_url(request.url),
+            'body': _body_digest(request.body),
+            'status': resp.status_code,
+            'reason': resp.reason,
+            'headers': _scrub_headers(resp.headers),
+            'content': _encode_content(resp.content),
+            'latency': latency
+        }
+        with self._lock:
+            with open(self.path, 'a+') as fixture_file:
+                fixture_file.write(json.dumps(record) + '\n')
+        return resp
+
+
+class ReplayAdapter(BaseAdapter):
+
+    """HTTP adapter that serves responses from a fixture file
+
+    Requests are matched by method, URL and body. If the body does not match,
+    only method and URL are used. Responses of the same request are served in
+    the recorded order, the last one is repeated when all are consumed, e.g.
+    for status polling.
+    """
+
+    def __init__(self, path, latency=None):
+        """Init a replay adapter
+
+        :param path (str): Path of the fixture file
+        :param latency (float): Injected latency for each response in seconds,
+                                the recorded latency is used if None
+        """
+        super(ReplayAdapter, self).__init__()
+        self.latency = latency
+        self._lock = threading.Lock()
+        # (method, URL) -> a list of not served records in recorded order
+        self._records = defaultdict(list)
+        self._last = dict()
+        with open(path, 'r') as fixture_file:
+            for line in fixture_file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                self._records[(record['method'], record['url'])].append(record)
+
+    def _pop_record(self, request):
+        key = (request.method, _norm_url(request.url))
+        body = _body_digest(request.body)
+        with self._lock:
+            record_lst = self._records.get(key, None)
+            if not record_lst:
+                return self._last.get(key, None)
+            for idx, record in enumerate(record_lst):
+                if record['body'] == body:
+                    break
+            else:
+                idx = 0
+            record = record_lst.pop(idx)
+            self._last[key] = record
+            return record
+
+    def send(self, request, **kargs):
+        record = self._pop_record(request)
+        if not record:
+            raise FixtureError('No recorded response for %s %s' %
+                               (request.method, request.url),
+                               request=request)
+        if self.latency is None:
+            time.sleep(record['latency'])
+        elif self.latency > 0:
+            time.sleep(self.latency)
+
+        resp = Response()
+        resp.status_code = record['status']
+        resp.reason = record['reason']
+        resp.headers = CaseInsensitiveDict(record['headers'])
+        # The content is already decoded by the recorded session
+        for hdr in ('Content-Encoding', 'Transfer-Encoding'):
+            resp.headers.pop(hdr, None)
+        resp._content = _decode_content(record['content'])
+        is_token = urlsplit(request.url).path.endswith('/auth/tokens')
+        if request.method == 'POST' and is_token:
+            resp._content = _renew_token(resp._content)
+            resp.headers['Content-Length'] = str(len(resp._content))
+        resp.encoding = 'utf-8'
+        resp.url = request.url
+        resp.request = request
+        resp.connection = self
+        return resp
+
+    def close(self):
+        pass
+
+
+def get_record_registry(path):
+    """Get a session registry recording all requests into a fixture file"""
+    return cloud.SessionRegistry(http_adapter=RecordAdapter(path))
+
+
+def get_replay_registry(path, latency=None):
+    """Get a session registry serving all requests from a fixture file"""
+    return cloud.SessionRegistry(http_adapter=ReplayAdapter(path, latency))
@@ -82,13 +82,21 @@ class Resource(object):
         'subnet': 'OS::Neutron::Subnet',
         'port': 'OS::Neutron::Port',
         'fip': 'OS::Neutron::FloatingIP',
-        'server': 'OS::Nova::Server'
+        'server': 'OS::Nova::Server',
+        'software_config': 'OS::Heat::SoftwareConfig'
     }
 
     def __init__(self, name, type=None, prop=None, metadata=None, depends_on=None):
-        """Init a HOT resource"""
+        """Init a HOT resource
+
+        :param type (str): Short name in RSC_TYPE_MAP or the file name of a
+                           template resource, e.g. grp.yaml
+        """
         self.name = name
         self.type = self.RSC_TYPE_MAP.get(type, None)
+        # Template resource, the template is passed in the files of the stack
+        if not self.type and type and type.endswith('.yaml'):
+            self.type = type
         if not self.type:
             raise HOTError('Unknown resource type: ' + type)
         self.prop = prop or {}
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+
+"""
+About: Durable resource journal of a SFC
+
+       IDs of all cloud resources created for a SFC are appended to a journal
+       file of the SFC, so the SFC can be torn down after the manager process
+       died halfway, without touching resources of other SFCs.
+
+       Format: One record per line, fields are separated by tabs:
+
+           <op>    <resource name>    <ID>
+
+           op: + for created and - for deleted resources
+           resource name: stack or a networking-sfc resource, e.g. port_pair
+
+       Heat stacks are recorded with their names. Each record is flushed to
+       the OS directly, fsync is batched by number of records and time. A
+       truncated last record (crash during writing) is ignored when loading.
+
+Usage:
+    jnl = journal.Journal('./sfc_1.journal')
+    srv_chn = resource.ServerChain(..., journal=jnl)
+    port_chn = resource.PortChain(..., journal=jnl)
+    ...
+    jnl.close()
+
+    # After a crash
+    journal.teardown('./sfc_1.journal', auth_args)
+
+Email: xianglinks@gmail.com
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from sfcostack import cloud, log
+from sfcostack.sfc import resource
+
+logger = log.logger
+
+OP_ADD = '+'
+OP_REMOVE = '-'
+
+# Resources in teardown order, resources in the same step are independent.
+# Stacks are deleted after port pairs, which use ports of the stacks
+TEARDOWN_ORDER = resource.PortChain.RSC_DEL_ORDER + (('stack', ), )
+
+
+class JournalError(Exception):
+    """Resource journal error"""
+    pass
+
+
+class Journal(object):
+
+    """Append-only resource journal of a SFC, thread-safe"""
+
+    def __init__(self, path, sync_num=16, sync_interval=0.5):
+        """Init a journal, records are appended to an existing file
+
+        :param path (str): Path of the journal file
+        :param sync_num (int): Maximal number of records not synced to disk
+        :param sync_interval (float): Maximal time in seconds since the last
+                                      sync when a record is appended
+        """
+        self.path = path
+        self.sync_num = sync_num
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._file = open(path, 'a')
+        self._unsync_num = 0
+        self._last_sync_ts = time.time()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsync_num = 0
+        self._last_sync_ts = time.time()
+
+    def _append(self, op, rsc_name, id_lst):
+        if not id_lst:
+            return
+        rec_str = ''.join('%s\t%s\t%s\n' % (op, rsc_name, item_id)
+                          for item_id in id_lst)
+        with self._lock:
+            if self._file.closed:
+                raise JournalError('Journal: %s is closed' % self.path)
+            self._file.write(rec_str)
+            self._file.flush()
+            self._unsync_num += len(id_lst)
+            sync_time = time.time() - self._last_sync_ts
+            if self._unsync_num >= self.sync_num or \
+                    sync_time >= self.sync_interval:
+                self._sync()
+
+    def add(self, rsc_name, id_lst):
+        """Record created resource items
+
+        :param rsc_name (str): stack or a networking-sfc resource name
+        :param id_lst (list): IDs of items, names for stacks
+        """
+        self._append(OP_ADD, rsc_name, id_lst)
+
+    def remove(self, rsc_name, id_lst):
+        """Record deleted resource items"""
+        self._append(OP_REMOVE, rsc_name, id_lst)
+
+    def sync(self):
+        """Sync all appended records to disk"""
+        with self._lock:
+            if not self._file.closed and self._unsync_num:
+                self._sync()
+
+    def close(self, remove_empty=False):
+        """Close the journal
+
+        :param remove_empty (Bool): If True, the journal file is removed if
+                                    all recorded resources are deleted
+        """
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+                self._file.close()
+        if remove_empty and os.path.exists(self.path):
+            if not any(self.load(self.path).values()):
+                os.remove(self.path)
+
+    @staticmethod
+    def load(path):
+        """Replay a journal file
+
+        :param path (str): Path of the journal file
+        :return: Resource name -> IDs of not deleted items in creation order
+        :retype: dict
+        """
+        rsc_map = {rsc_name: OrderedDict() for rsc_lst in TEARDOWN_ORDER
+                   for rsc_name in rsc_lst}
+        with open(path, 'r') as jnl_file:
+            for line in jnl_file:
+                # MARK: The last record MAY be truncated by a crash
+                if not line.endswith('\n'):
+                    logger.warning('Ignore truncated record in journal: %s',
+                                   path)
+                    break
+                field_lst = line.rstrip('\n').split('\t')
+                if len(field_lst) != 3 or field_lst[1] not in rsc_map:
+                    raise JournalError('Invalid record in journal: %s, %s'
+                                       % (path, line.strip()))
+                op, rsc_name, item_id = field_lst
+                if op == OP_ADD:
+                    rsc_map[rsc_name][item_id] = None
+                elif op == OP_REMOVE:
+                    rsc_map[rsc_name].pop(item_id, None)
+                else:
+                    raise JournalError('Invalid record in journal: %s, %s'
+                                       % (path, line.strip()))
+        return {rsc_name: list(id_map.keys())
+                for rsc_name, id_map in rsc_map.items()}
+
+
+##############
+#  Teardown  #
+##############
+
+def _delete_sfc_rsc(pc_client, rsc_name, item_id):
+    if pc_client.delete_by_id(rsc_name, item_id):
+        return True
+    # Already deleted items are also removed from the journal
+    return pc_client.find_by_id(rsc_name, item_id) is None
+
+
+def _delete_stack(conn, heat_client, stack_name, wait_complete, interval,
+                  timeout):
+    """Delete a stack
+
+    :return: True if deleted, None if the deletion is not waited for
+    """
+    stack = conn.orchestration.find_stack(stack_name)
+    if not stack:
+        return True
+    marker = resource.get_last_event_id(heat_client, stack_name)
+    conn.orchestration.delete_stack(stack)
+    if not wait_complete:
+        return None
+    resource.wait_stack_complete(conn, heat_client, stack_name, 'DELETE',
+                                 marker, timeout, max_interval=interval)
+    return True
+
+
+def teardown(path, auth_args, sess_reg=None, max_workers=8,
+             wait_complete=True, interval=1.0, timeout=600):
+    """Delete all not deleted resources recorded in a journal
+
+    Only resources in the journal are touched. Items of the same resource
+    step are deleted in parallel. Each deletion is appended to the journal, so
+    an interrupted teardown can be resumed. The journal file is removed if
+    all resources are deleted. Stacks are kept in the journal if
+    wait_complete is False.
+
+    :param path (str): Path of the journal file
+    :param auth_args (dict):
+    :param sess_reg (cloud.SessionRegistry):
+    :param max_workers (int): Maximal number of concurrent requests
+    :param wait_complete (Bool): Block until all stacks are deleted
+    :return: Resource name -> IDs of items failed to be deleted
+    :retype: dict
+    """
+    rsc_map = Journal.load(path)
+    sess_reg = sess_reg or cloud.default_registry
+    pc_client = sess_reg.get_sfc_client(auth_args)
+    conn = sess_reg.get_connection(auth_args)
+    heat_client = sess_reg.get_heat_client(auth_args)
+    logger.info('Teardown resources in journal: %s, %s', path,
+                ', '.join('%s: %d' % (rsc_name, len(id_lst))
+                          for rsc_name, id_lst in rsc_map.items()))
+
+    fail_map = dict()
+    jnl = Journal(path)
+    try:
+        with ThreadPoolExecutor(max_workers) as executor:
+            for rsc_lst in TEARDOWN_ORDER:
+                future_map = dict()
+                for rsc_name in rsc_lst:
+                    for item_id in rsc_map[rsc_name]:
+                        if rsc_name == 'stack':
+                            future = executor.submit(
+                                _delete_stack, conn, heat_client, item_id,
+                                wait_complete, interval, timeout)
+                        else:
+                            future = executor.submit(
+                                _delete_sfc_rsc, pc_client, rsc_name, item_id)
+                        future_map[future] = (rsc_name, item_id)
+                # Wait for the current step
+                for future, (rsc_name, item_id) in future_map.items():
+                    try:
+                        deleted = future.result()
+                    except Exception as error:
+                        logger.error('Error during deleting %s: %s, %s',
+                                     rsc_name, item_id, error)
+                        deleted = False
+                    if deleted:
+                        jnl.remove(rsc_name, [item_id])
+                    elif deleted is None:
+                        logger.info('Deletion of %s: %s is not waited for',
+                                    rsc_name, item_id)
+                    else:
+                        logger.error('Failed to delete %s: %s',
+                                     rsc_name, item_id)
+                        fail_map.setdefault(rsc_name, list()).append(item_id)
+    finally:
+        jnl.close(remove_empty=True)
+    return fail_map
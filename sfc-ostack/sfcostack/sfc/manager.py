@@ -8,19 +8,22 @@ About: SFC Resource Manager
 Email: xianglinks@gmail.com
 """
 
+import contextlib
 import logging
+import os
 import random
 import socket
 import threading
 import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 
 import paramiko
-from openstack import connection
 
-from sfcostack import conf, log
+from sfcostack import cloud, conf, log
 from sfcostack.dev import helper
-from sfcostack.sfc import resource
+from sfcostack.sfc import journal, resource
 
 logger = log.logger
 
@@ -50,6 +53,71 @@ class SFCManagerError(Exception):
 #  Manager  #
 #############
 
+class ReadyListener(object):
+
+    """Shared receiver of SF ready-packets
+
+    One UDP socket is bound for all SFCs of a manager, ready-packets are
+    demultiplexed by their source addresses. Packets received before the
+    waiter is registered are kept.
+    """
+
+    def __init__(self, ip, port):
+        self.ip = ip
+        self.port = port
+        self._cond = threading.Condition()
+        # Source IP -> number of received and not consumed packets
+        self._recv_num = defaultdict(int)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind((ip, port))
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                _, addr = self._sock.recvfrom(1024)
+            except OSError:
+                # Socket is closed
+                return
+            with self._cond:
+                self._recv_num[addr[0]] += 1
+                self._cond.notify_all()
+
+    def wait(self, addr_lst, timeout=None):
+        """Wait for one ready-packet from each server
+
+        :param addr_lst (list): A list of address sets, one for each server
+        :param timeout (float): Timeout in seconds, no timeout if None
+        :return: False if timeout
+        """
+        remain_lst = [set(addrs) for addrs in addr_lst]
+        end_ts = time.time() + timeout if timeout is not None else None
+        with self._cond:
+            while True:
+                for addrs in list(remain_lst):
+                    for addr in addrs:
+                        if self._recv_num[addr] > 0:
+                            self._recv_num[addr] -= 1
+                            remain_lst.remove(addrs)
+                            logger.debug(
+                                'Recv ready-packet from %s, remain %d SF(s) '
+                                'to be ready', addr, len(remain_lst))
+                            break
+                if not remain_lst:
+                    return True
+                if end_ts is None:
+                    self._cond.wait()
+                else:
+                    left = end_ts - time.time()
+                    if left <= 0:
+                        return False
+                    self._cond.wait(left)
+
+    def close(self):
+        self._sock.close()
+
+
 class BaseSFCManager(object):
 
     """Base class for all SFC resource managers"""
@@ -84,18 +152,35 @@ class StaticSFCManager(BaseSFCManager):
     Static means the SFC CAN not be updated
 
     MARK:
-        Do not support port pair group feature
+        Each server group is created as a port pair group, servers with the
+        same sequence number in the conf are instances of one group and flows
+        are balanced among them with the lb_fields of the group.
     """
 
     def __init__(self, auth_args,
                  mgr_ip='127.0.0.1', mgr_port=6666,
-                 ssh_access=True, return_ts=False, log_ts=True
+                 ssh_access=True, return_ts=False, log_ts=True,
+                 sess_reg=None, req_report=False, pool=None,
+                 nested=False, journal_dir=None
                  ):
         """Init a StaticSFCManager
 
         :param mgr_ip (str): IP address for SF management
         :param mgr_port (int): Port for SF management
         :param auth_args (dict)
+        :param sess_reg (cloud.SessionRegistry): Registry of shared cloud
+                                                 sessions, also used by all
+                                                 created SFC resources
+        :param req_report (Bool): If True, a report of networking-sfc requests
+                                  sent during create_sfc is appended to the
+                                  time info
+        :param pool (pool.WarmPool): Pool of pre-booted SF instances used by
+                                     all created server chains
+        :param nested (Bool): If True, server groups are created in nested
+                              stacks of the server chain stack
+        :param journal_dir (str): Directory of resource journals, resources
+                                  of each SFC are recorded in the journal
+                                  <SFC name>.journal. No journal if None
         """
         logger.debug(
             'Init StaticSFCManager, management addr: %s:%s', mgr_ip, mgr_port)
@@ -104,9 +189,16 @@ class StaticSFCManager(BaseSFCManager):
         self.ssh_access = ssh_access
         self.return_ts = return_ts
         self.log_ts = log_ts
+        self.req_report = req_report
+        self.pool = pool
+        self.nested = nested
+        self.journal_dir = journal_dir
+        self._ready_listener = None
+        self._ready_listener_lock = threading.Lock()
 
         # --- Stack API and SSH client ---
-        self.conn = connection.Connection(**auth_args)
+        self.sess_reg = sess_reg or cloud.default_registry
+        self.conn = self.sess_reg.get_connection(auth_args)
         self.ssh_clt = paramiko.SSHClient()
         self.ssh_clt.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
@@ -133,8 +225,10 @@ class StaticSFCManager(BaseSFCManager):
                     srv['availability_zone'] = avail_zone
 
         elif method == 'fill_one':
-            sf_num = len(srv_chn_conf)
-            flavor_name = srv_chn_conf[0][0]['flavor']
+            # MARK: Instances of server groups are allocated one by one
+            srv_lst = [srv for srv_grp in srv_chn_conf for srv in srv_grp]
+            sf_num = len(srv_lst)
+            flavor_name = srv_lst[0]['flavor']
             # Assume other host are equal
             hyper_lst = avail_hypers.copy()
             hyper_lst.remove(dst_hyper_name)
@@ -151,25 +245,35 @@ class StaticSFCManager(BaseSFCManager):
             allocated = 0
             for ins_num, hyper_name in zip(hyper_ins_num, hyper_lst):
                 for idx in range(allocated, allocated + ins_num):
-                    for srv in srv_chn_conf[idx]:
-                        srv['availability_zone'] = 'nova:%s' % hyper_name
+                    srv = srv_lst[idx]
+                    srv['availability_zone'] = 'nova:%s' % hyper_name
                     allocated += 1
                     logger.debug('Allocate %s to %s, already allocated:%d'
                                  % (srv['name'], hyper_name, allocated))
                     if allocated == sf_num:
                         return
 
-    def _reorder_srv_chn(self, method, srv_chn_conf, avail_hypers):
-        """Reorder the srv_chn_conf according to the priority in avail_hypers"""
-        reorder_srv_chn_conf = list()
-        if method == 'min_lat':
-            alloc_map = self._get_srv_chn_alloc(srv_chn_conf, avail_hypers)
-
-            for hyper in avail_hypers:
-                for srv in alloc_map[hyper]:
-                    reorder_srv_chn_conf.append([srv])
+    def _reorder_srv_chn(self, method, srv_chn_conf, avail_hypers,
+                         chn_name=None):
+        """Reorder the srv_chn_conf according to the priority in avail_hypers
 
-            return reorder_srv_chn_conf
+        Server groups are reordered as a whole, a group is ordered by the
+        mean priority of the hypervisors of its instances.
+        """
+        if method == 'min_lat':
+            alloc_map = self._get_srv_chn_alloc(srv_chn_conf, avail_hypers,
+                                                chn_name)
+            srv_prio_map = {srv['name']: prio
+                            for prio, hyper in enumerate(avail_hypers)
+                            for srv in alloc_map[hyper]}
+
+            # MARK: sorted is stable, groups with the same priority keep the
+            # original order
+            return sorted(
+                srv_chn_conf,
+                key=lambda srv_grp: (sum(srv_prio_map[srv['name']]
+                                         for srv in srv_grp) / len(srv_grp))
+            )
     # -------------------------------------------------------------------------------
     # -------------------------------------------------------------------------------
 
@@ -190,26 +294,35 @@ class StaticSFCManager(BaseSFCManager):
 
         return min(num_cpu, num_ram, num_disk)
 
-    def _get_srv_chn_alloc(self, srv_chn_conf, avail_hypers):
+    def _get_srv_chn_alloc(self, srv_chn_conf, avail_hypers, chn_name=None):
         """Get allocation of server chain on available hypervisors
 
+        :param chn_name (str): Name of the server chain, prefix of server
+                               names in the cloud
         :return alloc_map (dict):
         """
         alloc_map = {hyper: list() for hyper in avail_hypers}
         for srv_grp in srv_chn_conf:
             for srv in srv_grp:
+                cloud_name = resource.get_cloud_name(chn_name, srv['name'])
                 while True:
-                    srv_tmp = self.conn.compute.find_server(srv['name'])
+                    srv_tmp = self.conn.compute.find_server(cloud_name)
                     if srv_tmp:
                         break
                     else:
                         logger.debug('Server:%s can not be found in the db' %
-                                     srv['name'])
+                                     cloud_name)
                         time.sleep(1)
                 srv_obj = self.conn.compute.get_server(srv_tmp)
                 alloc_map[srv_obj.hypervisor_hostname].append(srv)
         return alloc_map
 
+    @staticmethod
+    def _get_srv_chn_str(srv_chn_conf):
+        """Get server names of the server chain, e.g. sf1,sf2|sf3"""
+        return ','.join('|'.join(srv['name'] for srv in srv_grp)
+                        for srv_grp in srv_chn_conf)
+
     @staticmethod
     def _get_alloc_map_str(alloc_map):
         map_str = ''
@@ -245,6 +358,48 @@ class StaticSFCManager(BaseSFCManager):
         self.create_sfc(sfc_conf, alloc_method, chain_method, wait_sf_ready,
                         wait_method)
 
+    def create_many(self, sfc_conf_lst, alloc_method='nova_default',
+                    chain_method='default', max_parallel=8,
+                    wait_sf_ready=True, wait_method='udp_packet'):
+        """Create multiple independent SFCs concurrently
+
+        Each SFC is created by a worker thread with create_sfc. SF ready-packets
+        of all SFCs are received by one shared listener. With req_report, the
+        request report of each SFC only contains its own requests, since
+        request captures are kept per thread.
+
+        :param sfc_conf_lst (list): A list of sfcostack.conf.SFCConf
+        :param max_parallel (int): Maximal number of concurrently created SFCs
+        :return: A list of results in the order of sfc_conf_lst, each result
+                 is a dict with keys: sfc, time_info, time, error
+        :retype: list
+        """
+        def create_one(sfc_conf):
+            result = {'sfc': None, 'time_info': None, 'time': 0.0,
+                      'error': None}
+            start_ts = time.time()
+            try:
+                result['sfc'], result['time_info'] = self._create_sfc(
+                    sfc_conf, alloc_method, chain_method,
+                    wait_sf_ready, wait_method
+                )
+            except Exception as error:
+                logger.error('Failed to create SFC: %s, error: %s',
+                             sfc_conf.function_chain.name, error)
+                result['error'] = error
+            result['time'] = time.time() - start_ts
+            return result
+
+        logger.info('Create %d SFCs, maximal parallel number: %d',
+                    len(sfc_conf_lst), max_parallel)
+        start_ts = time.time()
+        with ThreadPoolExecutor(max_parallel) as executor:
+            result_lst = list(executor.map(create_one, sfc_conf_lst))
+        logger.info('Create %d SFCs in %.4fs, failed: %d',
+                    len(sfc_conf_lst), time.time() - start_ts,
+                    sum(1 for result in result_lst if result['error']))
+        return result_lst
+
     def create_sfc(self, sfc_conf,
                    alloc_method, chain_method,
                    wait_sf_ready=True, wait_method='udp_packet'):
@@ -257,6 +412,57 @@ class StaticSFCManager(BaseSFCManager):
                                      programs are ready.
         :param wait_method (str): Method for waiting SF programs
         """
+        sfc, time_info = self._create_sfc(sfc_conf, alloc_method,
+                                          chain_method, wait_sf_ready,
+                                          wait_method)
+        if self.return_ts:
+            return sfc, time_info
+        return sfc
+
+    def get_journal_path(self, sfc_name):
+        """Get the path of the resource journal of a SFC"""
+        if not self.journal_dir:
+            raise SFCManagerError('No journal directory is configured.')
+        return os.path.join(self.journal_dir, sfc_name + '.journal')
+
+    def _create_sfc(self, sfc_conf, alloc_method, chain_method,
+                    wait_sf_ready, wait_method):
+        """Create a SFC, return the SFC and its time info"""
+        jnl = None
+        if self.journal_dir:
+            jnl = journal.Journal(
+                self.get_journal_path(sfc_conf.function_chain.name))
+        req_stats = None
+        # MARK: The capture is always stopped, also if the creation failed
+        with contextlib.ExitStack() as ctx_stack:
+            if self.req_report:
+                pc_client = self.sess_reg.get_sfc_client(sfc_conf.auth)
+                req_stats = ctx_stack.enter_context(pc_client.capture())
+            try:
+                sfc, time_info = self._create_sfc_rsc(
+                    sfc_conf, alloc_method, chain_method, wait_sf_ready,
+                    wait_method, jnl
+                )
+            except Exception:
+                # MARK: The journal is kept for teardown_sfc
+                if jnl:
+                    jnl.close()
+                raise
+        if jnl:
+            jnl.sync()
+
+        if req_stats:
+            logger.info('Request report: %s', req_stats.to_json())
+            # Number and latency of networking-sfc requests and per-resource
+            # completion time of the server chain stack
+            req_report = req_stats.report()
+            req_report['stack_rsc_time'] = sfc.srv_chn.stack_time_info
+            time_info.append(req_report)
+        return sfc, time_info
+
+    def _create_sfc_rsc(self, sfc_conf, alloc_method, chain_method,
+                        wait_sf_ready, wait_method, jnl):
+        """Create resources of a SFC, recorded in the journal jnl"""
 
         if alloc_method not in ('nova_default', 'fill_one'):
             raise SFCManagerError('Unknown allocation method for SF servers.')
@@ -286,7 +492,9 @@ class StaticSFCManager(BaseSFCManager):
             sfc_desc,
             sfc_conf.network,
             sfc_conf.server_chain,
-            self.ssh_access, 'pt'
+            self.ssh_access, 'pt',
+            sess_reg=self.sess_reg, pool=self.pool, nested=self.nested,
+            journal=jnl
         )
 
         logger.info('Create server chain: %s', srv_chn.name)
@@ -314,6 +522,9 @@ class StaticSFCManager(BaseSFCManager):
         srv_chn.create_instance(wait_complete=True)
         # Server chain launching time
         time_info.append(time.time() - start_ts)
+        # Per-resource completion time of the stack, kept before reordering
+        stack_time_info = srv_chn.stack_time_info
+        logger.debug('Stack resource time info: %s', stack_time_info)
         # Block main thread until all SFs are ready
         logger.info(
             'All server instances are launched, waiting for SF programs')
@@ -328,7 +539,8 @@ class StaticSFCManager(BaseSFCManager):
         # Log server chain allocation mapping
         alloc_map = self._get_srv_chn_alloc(
             sfc_conf.server_chain,
-            self.all_hypers
+            self.all_hypers,
+            srv_chn.name
         )
         logger.info(
             'Allocation mapping: %s', self._get_alloc_map_str(alloc_map)
@@ -342,30 +554,24 @@ class StaticSFCManager(BaseSFCManager):
                 )
             logger.info('Reorder server chain with simple min_lat method')
             logger.debug(
-                'Before reorder: %s', ','.join(
-                    (srv_grp[0]['name'] for srv_grp in sfc_conf.server_chain)
-                )
+                'Before reorder: %s',
+                self._get_srv_chn_str(sfc_conf.server_chain)
             )
             reorder_srv_chn_conf = self._reorder_srv_chn(
                 chain_method,
                 sfc_conf.server_chain,
-                sfc_conf.function_chain.available_hypervisors
+                sfc_conf.function_chain.available_hypervisors,
+                srv_chn.name
             )
 
             logger.debug(
-                'After reorder: %s', ','.join(
-                    (srv_grp[0]['name'] for srv_grp in reorder_srv_chn_conf)
-                )
+                'After reorder: %s',
+                self._get_srv_chn_str(reorder_srv_chn_conf)
             )
 
-            srv_chn = resource.ServerChain(
-                sfc_conf.auth,
-                sfc_name + '_srv_chn',
-                sfc_desc,
-                sfc_conf.network,
-                reorder_srv_chn_conf,
-                self.ssh_access, 'pt'
-            )
+            # MARK: Only the order is changed, the stack is not updated and
+            # servers claimed from the pool are kept
+            srv_chn.update(reorder_srv_chn_conf)
             # Time for reorder the chain
             time_info.append(time.time() - start_ts)
         else:
@@ -376,7 +582,8 @@ class StaticSFCManager(BaseSFCManager):
             sfc_name + '_port_chn',
             sfc_desc,
             srv_chn,
-            sfc_conf.flow_classifier
+            sfc_conf.flow_classifier,
+            sess_reg=self.sess_reg, journal=jnl
         )
         logger.info('Create port chain: %s', port_chn.name)
         start_ts = time.time()
@@ -388,14 +595,8 @@ class StaticSFCManager(BaseSFCManager):
             logger.info('Time info: %s',
                         ','.join(map(str, time_info)))
 
-        if self.return_ts:
-            return (
-                resource.SFC(sfc_name, sfc_desc, srv_chn, port_chn),
-                time_info
-            )
-
-        else:
-            return resource.SFC(sfc_name, sfc_desc, srv_chn, port_chn)
+        return (resource.SFC(sfc_name, sfc_desc, srv_chn, port_chn, jnl),
+                time_info)
 
     def delete(self, sfc):
         self.delete_sfc(sfc)
@@ -406,6 +607,22 @@ class StaticSFCManager(BaseSFCManager):
         )
         sfc.port_chn.delete()
         sfc.srv_chn.delete()
+        if sfc.journal:
+            sfc.journal.close(remove_empty=True)
+
+    def teardown_sfc(self, sfc_name, auth_args, max_workers=8):
+        """Delete resources of a SFC recorded in its journal
+
+        Used to cleanup a SFC whose creation or deletion was interrupted, e.g.
+        by a crash of the manager. Resources of other SFCs are not touched.
+
+        :return: Resource name -> IDs of items failed to be deleted
+        :retype: dict
+        """
+        logger.info('Teardown SFC: %s with its journal', sfc_name)
+        return journal.teardown(self.get_journal_path(sfc_name), auth_args,
+                                sess_reg=self.sess_reg,
+                                max_workers=max_workers)
 
     def update_sfc(self, **args):
         raise RuntimeError(
@@ -417,32 +634,22 @@ class StaticSFCManager(BaseSFCManager):
         """TODO"""
         pass
 
-    def _wait_sf_ready(self, srv_chn, method='udp_packet', interval=0.5):
+    def _wait_sf_ready(self, srv_chn, method='udp_packet'):
         """Wait for SF conf and programs to be ready"""
 
         if method == 'udp_packet':
-            # Get floating IPs for all SF servers
-            fip_lst = srv_chn.get_srv_fips(no_grp=True)
-            check_num = len(fip_lst)
+            # Get addresses for all SF servers, servers claimed from the
+            # pool are already ready
+            addr_lst = srv_chn.get_srv_addrs(with_claimed=False)
             logger.debug(
-                'Total number of to be waited SF servers: %d' % check_num
+                'Total number of to be waited SF servers: %d' % len(addr_lst)
             )
-            recv_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            recv_sock.bind((self.mgr_ip, self.mgr_port))
-            recv_sock.settimeout(None)
-
+            with self._ready_listener_lock:
+                if not self._ready_listener:
+                    self._ready_listener = ReadyListener(self.mgr_ip,
+                                                         self.mgr_port)
             # MARK: Timeout MAY be used here
-            while True:
-                if check_num == 0:
-                    break
-                _, addr = recv_sock.recvfrom(1024)
-                check_num -= 1
-                debug_info = (
-                    'Recv ready-packet from %s, remain %d SF(s) to be ready'
-                    % (addr[0], check_num)
-                )
-                logger.debug(debug_info)
-                time.sleep(interval)
+            self._ready_listener.wait(addr_lst)
 
         # TODO: Check if specific file is created on all instances
         elif method == 'file':
@@ -19,9 +19,16 @@ Ref   :
 Email : xianglinks@gmail.com
 """
 
+import asyncio
+import bisect
+import contextlib
+import functools
+import json
 import logging
+import threading
 import time
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
 from keystoneauth1 import adapter, session
 from keystoneauth1.exceptions import ClientException as ks_clt_excp
@@ -65,6 +72,110 @@ class RscOptTimeout(SFCClientException):
     pass
 
 
+#####################
+#  Instrumentation  #
+#####################
+
+# MARK: Captures are kept per thread, so concurrently created SFCs sharing one
+# client only capture their own requests. Each item is (client, stats)
+_capture_local = threading.local()
+
+
+def _get_thread_captures():
+    captures = getattr(_capture_local, 'captures', None)
+    if captures is None:
+        captures = _capture_local.captures = list()
+    return captures
+
+
+def bind_captures(func):
+    """Bind active captures of the current thread to a function
+
+    Requests sent by the function are captured as if they are sent by the
+    current thread, e.g. for functions run by a thread pool.
+
+    Usage:
+        executor.submit(netsfc_clt.bind_captures(func), *args)
+    """
+    captures = list(_get_thread_captures())
+    if not captures:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kargs):
+        old_captures = getattr(_capture_local, 'captures', None)
+        _capture_local.captures = list(captures)
+        try:
+            return func(*args, **kargs)
+        finally:
+            _capture_local.captures = old_captures
+    return wrapper
+
+
+class ReqStats(object):
+
+    """Call counters and latency histograms of REST requests
+
+    Requests are grouped by resource and method, e.g. 'port_pair POST'.
+    """
+
+    # Upper bounds of histogram buckets in seconds, the last bucket is open
+    LAT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = dict()
+
+    def record(self, rsc_name, method, latency, error=False):
+        """Record a finished request
+
+        :param latency (float): Request latency in seconds
+        :param error (Bool): If True, the request got a error response
+        """
+        key = '%s %s' % (rsc_name, method)
+        with self._lock:
+            stat = self._stats.get(key, None)
+            if not stat:
+                stat = {
+                    'count': 0, 'error': 0, 'total': 0.0,
+                    'min': latency, 'max': latency,
+                    'hist': [0] * (len(self.LAT_BUCKETS) + 1)
+                }
+                self._stats[key] = stat
+            stat['count'] += 1
+            stat['error'] += int(error)
+            stat['total'] += latency
+            stat['min'] = min(stat['min'], latency)
+            stat['max'] = max(stat['max'], latency)
+            stat['hist'][bisect.bisect_left(self.LAT_BUCKETS, latency)] += 1
+
+    def report(self):
+        """Get a report of all recorded requests
+
+        :retype: dict
+        """
+        with self._lock:
+            report = {'buckets': list(self.LAT_BUCKETS),
+                      'requests': dict(), 'count': 0, 'total': 0.0}
+            for key, stat in self._stats.items():
+                report['requests'][key] = dict(stat, hist=list(stat['hist']))
+                report['count'] += stat['count']
+                report['total'] += stat['total']
+        return report
+
+    def to_json(self, path=None):
+        """Export the report in JSON format
+
+        :param path (str): If not None, the report is also written to the file
+        :retype: str
+        """
+        json_str = json.dumps(self.report(), sort_keys=True)
+        if path:
+            with open(path, 'w+') as json_file:
+                json_file.write(json_str)
+        return json_str
+
+
 #################
 #  REST Client  #
 #################
@@ -90,17 +201,29 @@ class SFCClient(object):
     }
     rsc_tuple = tuple(rsc_dict.keys())
 
-    def __init__(self, auth_args, logger=None):
+    def __init__(self, auth_args, logger=None, cache_ttl=30, session=None):
         """Initialization of SFCClient object
 
         :param auth_args (dict): A dict of essential arguments for Keystone authentication
         :param logger(logging.Logger): Logger object
+        :param cache_ttl (float): Number of seconds a filled name index stays
+                                  valid. The index is disabled if <= 0.
+        :param session (keystoneauth1.session.Session): Use a shared
+                                                        auth-session instead of
+                                                        constructing a new one
         """
         self.auth_args = auth_args
         if not logger:
             logger = _get_logger()
         self.logger = logger
-        sess = self._construct_session()
+        # Per-resource index: rsc_name -> {item_name: item}
+        self.cache_ttl = cache_ttl
+        self._name_idx = {rsc: dict() for rsc in self.rsc_tuple}
+        # Timestamp of the last full listing of each resource
+        self._name_idx_ts = dict.fromkeys(self.rsc_tuple, None)
+        # Stats of all sent requests, captures are kept per thread
+        self.stats = ReqStats()
+        sess = session or self._construct_session()
         adap_args = {
             'user_agent': 'python-sfcclient',
             'service_type': 'network',
@@ -122,12 +245,20 @@ class SFCClient(object):
         auth = v3.Password(**self.auth_args)
         return session.Session(auth)
 
+    def _get_rsc_name(self, url):
+        for rsc_name, rsc_para in self.rsc_dict.items():
+            if url == rsc_para.url or url.startswith(rsc_para.url + '/'):
+                return rsc_name
+        return url
+
     def _send_request(self, method, url, **kargs):
         """Send a HTTP request
 
         :param method (str): Request method, is converted to lowercase
         :param url: Request URL
         """
+        error = False
+        start_ts = time.time()
         try:
             self.logger.debug('Request URL: %s', url)
             self.logger.debug('Request Method: %s', method)
@@ -136,90 +267,448 @@ class SFCClient(object):
                 raise SFCClientException('Invalid request method: %s' % method)
             resp = method_to_call(url, **kargs)
         except ks_clt_excp as excp:
+            error = True
             self.logger.error('Error Response:')
-            self.logger.error(excp.response.json())
+            # MARK: Connection errors have no response
+            if getattr(excp, 'response', None) is not None:
+                self.logger.error(excp.response.json())
+            else:
+                self.logger.error(excp)
         else:
             return resp
+        finally:
+            latency = time.time() - start_ts
+            rsc_name = self._get_rsc_name(url)
+            stats_lst = [self.stats] + [
+                stats for clt, stats in _get_thread_captures() if clt is self]
+            for stats in stats_lst:
+                stats.record(rsc_name, method.upper(), latency, error)
+
+    # --- Instrumentation ---
+
+    def start_capture(self):
+        """Start capturing stats of requests sent from now on by the current
+        thread, see bind_captures for requests sent by worker threads
+
+        :retype: ReqStats
+        """
+        stats = ReqStats()
+        _get_thread_captures().append((self, stats))
+        return stats
+
+    def stop_capture(self, stats):
+        """Stop capturing requests into given stats"""
+        captures = _get_thread_captures()
+        for idx, (clt, cap_stats) in enumerate(captures):
+            if clt is self and cap_stats is stats:
+                del captures[idx]
+                return
+
+    @contextlib.contextmanager
+    def capture(self):
+        """Capture stats of requests sent in a block of code
+
+        Usage:
+            with sfc_clt.capture() as stats:
+                ...
+            print(stats.to_json())
+        """
+        stats = self.start_capture()
+        try:
+            yield stats
+        finally:
+            self.stop_capture(stats)
+
+    # --- Name Index ---
+
+    # MARK: The index is only complete after a full listing of the resource.
+    # Creations and deletions by this client keep it up to date, changes made
+    # by other clients are only seen after the TTL expires or the index is
+    # invalidated.
+
+    def _idx_valid(self, rsc_name):
+        """Check if the name index of a resource is filled and not expired"""
+        fill_ts = self._name_idx_ts[rsc_name]
+        if self.cache_ttl <= 0 or fill_ts is None:
+            return False
+        return (time.time() - fill_ts) < self.cache_ttl
+
+    def _idx_fill(self, rsc_name, item_lst):
+        """Replace the name index of a resource with a full item list"""
+        name_idx = dict()
+        for item in item_lst:
+            # Keep the first item for duplicated names, same as a linear scan
+            name_idx.setdefault(item['name'], item)
+        self._name_idx[rsc_name] = name_idx
+        self._name_idx_ts[rsc_name] = time.time()
+
+    def _idx_add(self, rsc_name, item):
+        if self._idx_valid(rsc_name):
+            self._name_idx[rsc_name].setdefault(item['name'], item)
+
+    def _idx_remove(self, rsc_name, item):
+        name_idx = self._name_idx[rsc_name]
+        if name_idx.get(item['name'], {}).get('id') == item['id']:
+            name_idx.pop(item['name'], None)
+
+    def invalidate(self, rsc_name=None):
+        """Invalidate the name index
+
+        :param rsc_name (str): Name of the resource, all resources are
+                               invalidated if None
+        """
+        rsc_lst = (rsc_name, ) if rsc_name else self.rsc_tuple
+        for rsc in rsc_lst:
+            self._name_idx[rsc] = dict()
+            self._name_idx_ts[rsc] = None
 
     # --- CRUD Operations ---
 
     # Each item is described as a dictionary of fields, like name, id, description etc.
     # Check REST API Ref for details
 
-    def list(self, rsc_name):
-        """List all items of a resource
+    def list(self, rsc_name, filters=None, fields=None):
+        """List items of a resource
+
+        Filters and field projection are handled by Neutron, the name index is
+        only filled by a full listing.
 
         :param rsc_name (str): Name of the resource
+        :param filters (dict): Query parameters to filter items, e.g. {'name': 'pp_0_0'}
+        :param fields (list): Only return these fields of each item, e.g. ['id', 'name']
         :retype: list
         """
         rsc_para = self.rsc_dict[rsc_name]
-        resp = self._send_request('GET', rsc_para.url)
+        params = dict(filters or {})
+        if fields:
+            params['fields'] = list(fields)
+        if params:
+            resp = self._send_request('GET', rsc_para.url, params=params)
+        else:
+            resp = self._send_request('GET', rsc_para.url)
         item_lst = resp.json()[rsc_para.plural_name]
+        if not params:
+            self._idx_fill(rsc_name, item_lst)
         return item_lst
 
+    def iter_list(self, rsc_name, filters=None, fields=None, page_size=100):
+        """Iterate over items of a resource page by page
+
+        Uses Neutron limit/marker pagination, the next page is only requested
+        when all items of the current page are consumed. The name index is not
+        filled.
+
+        :param filters (dict): Query parameters to filter items
+        :param fields (list): Only return these fields of each item, the 'id'
+                              field is always included for the marker
+        :param page_size (int): Maximal number of items in a page
+        """
+        rsc_para = self.rsc_dict[rsc_name]
+        params = dict(filters or {})
+        if fields:
+            params['fields'] = list(fields)
+            if 'id' not in fields:
+                params['fields'].append('id')
+        params['limit'] = page_size
+        while True:
+            resp = self._send_request('GET', rsc_para.url, params=params)
+            item_lst = resp.json()[rsc_para.plural_name]
+            # MARK: Servers or proxies MAY ignore limit and marker, the same
+            # page is then returned again
+            if item_lst and item_lst[-1]['id'] == params.get('marker', None):
+                self.logger.warning('Pagination of %s is not supported, '
+                                    'the marker does not advance', rsc_name)
+                return
+            for item in item_lst:
+                yield item
+            if len(item_lst) != page_size:
+                # Last page or the limit is ignored
+                return
+            params['marker'] = item_lst[-1]['id']
+
+    def _find_by(self, rsc_name, key, value, ignore_missing, fields):
+        """Find a resource item with a server-side filtered lookup"""
+        item = next(self.iter_list(rsc_name, filters={key: value},
+                                   fields=fields, page_size=1), None)
+        if item:
+            return item
+        if ignore_missing:
+            return None
+        else:
+            raise SFCClientException('Can not find %s with %s: %s' %
+                                     (rsc_name, key, value))
+
     # MARK: Based on item name of a resource instead of the ID
 
-    def find(self, rsc_name, item_name, ignore_missing=True):
+    def find(self, rsc_name, item_name, ignore_missing=True, fields=None):
         """Find a resource item with given name
 
+        The name index is used if it is valid, otherwise only the matched item
+        is queried from Neutron. Call list() before many lookups to warm up the
+        index.
+
         :param item_name (str): Name of a specified item of a resource with rsc_name
         :param ignore_missing (Bool): If True, None is returned if the item is not found.
                                       Otherwise, the BaseSFCClientException is raised.
+        :param fields (list): Fields to be returned by a Neutron query
         :retype: dict
         """
-        for item in self.list(rsc_name):
-            if item['name'] == item_name:
+        if self._idx_valid(rsc_name):
+            item = self._name_idx[rsc_name].get(item_name, None)
+            if item:
                 return item
-        if ignore_missing:
-            return None
-        else:
-            raise SFCClientException('Can not find %s with name: %s' %
-                                     (rsc_name, item_name))
+            if ignore_missing:
+                return None
+            else:
+                raise SFCClientException('Can not find %s with name: %s' %
+                                         (rsc_name, item_name))
+        return self._find_by(rsc_name, 'name', item_name, ignore_missing,
+                             fields)
+
+    def find_by_id(self, rsc_name, item_id, ignore_missing=True, fields=None):
+        """Find a resource item with given ID
+
+        :param item_id (str): ID of the item
+        :retype: dict
+        """
+        return self._find_by(rsc_name, 'id', item_id, ignore_missing, fields)
 
     def create(self, rsc_name, item_args):
         """Create a resource item with given item arguments
 
         :param item_args (dict): A dict of resource item arguments
+        :return: The created item with its ID, None if the creation failed
+        :retype: dict
         """
         rsc_para = self.rsc_dict[rsc_name]
         item_args = {rsc_para.name: item_args}
-        self._send_request('POST', rsc_para.url, json=item_args)
+        resp = self._send_request('POST', rsc_para.url, json=item_args)
+        if resp is None:
+            self.invalidate(rsc_name)
+            return None
+        item = resp.json()[rsc_para.name]
+        self._idx_add(rsc_name, item)
+        return item
+
+    def create_bulk(self, rsc_name, item_args_lst):
+        """Create multiple resource items with a single bulk request
+
+        :param item_args_lst (list): A list of dicts of resource item arguments
+        :return: A list of created items in the same order as item_args_lst,
+                 None if the creation failed
+        :retype: list
+        """
+        if not item_args_lst:
+            return list()
+        rsc_para = self.rsc_dict[rsc_name]
+        item_args = {rsc_para.plural_name: list(item_args_lst)}
+        resp = self._send_request('POST', rsc_para.url, json=item_args)
+        if resp is None:
+            self.invalidate(rsc_name)
+            return None
+        item_lst = resp.json()[rsc_para.plural_name]
+        for item in item_lst:
+            self._idx_add(rsc_name, item)
+        return item_lst
+
+    def update(self, rsc_name, item_id, item_args):
+        """Update a resource item with given ID
+
+        :param item_args (dict): A dict of updated item arguments
+        :return: The updated item, None if the update failed
+        :retype: dict
+        """
+        rsc_para = self.rsc_dict[rsc_name]
+        resp = self._send_request('PUT', '/'.join((rsc_para.url, item_id)),
+                                  json={rsc_para.name: item_args})
+        if resp is None or 'name' in item_args:
+            self.invalidate(rsc_name)
+        if resp is None:
+            return None
+        item = resp.json()[rsc_para.name]
+        name_idx = self._name_idx[rsc_name]
+        if name_idx.get(item['name'], {}).get('id') == item['id']:
+            name_idx[item['name']] = item
+        return item
+
+    def delete_by_id(self, rsc_name, item_id):
+        """Delete a resource item with given ID
+
+        :return: False if the deletion failed
+        :retype: Bool
+        """
+        rsc_para = self.rsc_dict[rsc_name]
+        resp = self._send_request('DELETE', '/'.join((rsc_para.url, item_id)))
+        # MARK: The name of the item is unknown here
+        self.invalidate(rsc_name)
+        return resp is not None
 
     def delete(self, rsc_name, item_name, ignore_missing=True):
         """Delete a created resource item with given name"""
         item = self.find(rsc_name, item_name, ignore_missing)
         if item:
             rsc_para = self.rsc_dict[rsc_name]
-            self._send_request('DELETE', '/'.join((rsc_para.url, item['id'])))
+            resp = self._send_request('DELETE',
+                                      '/'.join((rsc_para.url, item['id'])))
+            if resp is not None:
+                self._idx_remove(rsc_name, item)
+            else:
+                self.invalidate(rsc_name)
 
     def get_id(self, rsc_name, item_name):
         """Get the ID of a resource item
         :retype: string
         """
-        item = self.find(rsc_name, item_name, ignore_missing=False)
+        item = self.find(rsc_name, item_name, ignore_missing=False,
+                         fields=['id', 'name'])
         return item['id']
 
     def wait(self, rsc_name, item_name, opt, interval, timeout):
         """Wait for finishing a operation for a resource item
 
         :param opt (str): Operation, can be 'create' or 'delete'
-        :param interval (float): Number of seconds to wait between checks
+        :param interval (float): Maximal number of seconds to wait between checks
         :param timeout (float): Maximum number of seconds to wait for operation
+        :return: Number of seconds until the operation is finished
+        :retype: float
         """
-        total_wait = 0
-        while total_wait < timeout:
-            rsc = self.find(rsc_name, item_name)
-            if opt == 'create':
-                if not rsc:
-                    time.sleep(interval)
-                    total_wait += interval
-            if opt == 'delete':
-                if rsc:
-                    time.sleep(interval)
-                    total_wait += interval
-            else:
+        target = (rsc_name, item_name, opt)
+        return self.wait_many((target, ), interval, timeout)[target]
+
+    def wait_many(self, targets, max_interval=1.0, timeout=60,
+                  min_interval=0.02):
+        """Wait for finishing operations for multiple resource items
+
+        Each poll round sends one filtered listing per resource for all pending
+        items. The interval between rounds starts at min_interval and is
+        doubled after each round up to max_interval.
+
+        :param targets (iterable): Tuples of (rsc_name, item_name, opt), opt
+                                   can be 'create' or 'delete'
+        :param max_interval (float): Maximal number of seconds between rounds
+        :param timeout (float): Maximum number of seconds to wait for all
+                                operations
+        :param min_interval (float): Number of seconds before the second round
+        :return: A dict of target tuple -> seconds until it is finished
+        :retype: dict
+        """
+        pending = set(targets)
+        for _, _, opt in pending:
+            if opt not in ('create', 'delete'):
                 raise RuntimeError('Unknown operation: %s' % opt)
 
-        msg = "Timeout waiting for %s operation on %s with name: %s" % (
-            opt, rsc_name, item_name)
+        latency = dict()
+        start_ts = time.time()
+        interval = min_interval
+        while True:
+            for rsc_name in {target[0] for target in pending}:
+                name_lst = sorted({target[1] for target in pending
+                                   if target[0] == rsc_name})
+                # The state MUST be read from Neutron, not from the name index
+                exist_names = {
+                    item['name'] for item in
+                    self.list(rsc_name, filters={'name': name_lst},
+                              fields=['id', 'name'])
+                }
+                for target in [t for t in pending if t[0] == rsc_name]:
+                    created = target[1] in exist_names
+                    if created == (target[2] == 'create'):
+                        latency[target] = time.time() - start_ts
+                        pending.remove(target)
+            if not pending:
+                return latency
+
+            remain = timeout - (time.time() - start_ts)
+            if remain <= 0:
+                break
+            time.sleep(min(interval, remain))
+            interval = min(interval * 2, max_interval)
+
+        msg = "Timeout waiting for operations on: %s" % ', '.join(
+            '%s %s with name: %s' % (opt, rsc_name, item_name)
+            for rsc_name, item_name, opt in sorted(pending)
+        )
         raise RscOptTimeout(msg)
+
+
+class AsyncSFCClient(object):
+
+    """Asyncio variant of the SFCClient
+
+    The blocking REST calls of a wrapped SFCClient run in a thread pool, so the
+    auth-session, name index and error handling are shared with the sync
+    client. At most max_concurrency requests are in flight at the same time.
+
+    Usage:
+        async_clt = AsyncSFCClient(auth_args)
+        pp_lst = await asyncio.gather(
+            async_clt.create('port_pair', pp_args_1),
+            async_clt.create('port_pair', pp_args_2)
+        )
+    """
+
+    def __init__(self, auth_args, logger=None, max_concurrency=8,
+                 sfc_client=None):
+        """Init a AsyncSFCClient object
+
+        :param auth_args (dict): A dict of essential arguments for Keystone authentication
+        :param logger(logging.Logger): Logger object
+        :param max_concurrency (int): Maximal number of concurrent requests
+        :param sfc_client (SFCClient): Use a existing sync client instead of
+                                       creating a new one
+        """
+        if not sfc_client:
+            sfc_client = SFCClient(auth_args, logger)
+        self.sfc_client = sfc_client
+        self.max_concurrency = max_concurrency
+        # MARK: The pool size bounds the number of requests in flight
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    async def _run(self, func, *args, **kargs):
+        """Run a blocking function of the sync client in the thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            bind_captures(functools.partial(func, *args, **kargs)))
+
+    def close(self):
+        """Shutdown the thread pool"""
+        self._executor.shutdown(wait=True)
+
+    # --- CRUD Operations ---
+
+    async def list(self, rsc_name, filters=None, fields=None):
+        return await self._run(self.sfc_client.list, rsc_name,
+                               filters=filters, fields=fields)
+
+    async def find(self, rsc_name, item_name, ignore_missing=True,
+                   fields=None):
+        return await self._run(self.sfc_client.find, rsc_name, item_name,
+                               ignore_missing=ignore_missing, fields=fields)
+
+    async def find_by_id(self, rsc_name, item_id, ignore_missing=True,
+                         fields=None):
+        return await self._run(self.sfc_client.find_by_id, rsc_name, item_id,
+                               ignore_missing=ignore_missing, fields=fields)
+
+    async def create(self, rsc_name, item_args):
+        return await self._run(self.sfc_client.create, rsc_name, item_args)
+
+    async def create_bulk(self, rsc_name, item_args_lst):
+        return await self._run(self.sfc_client.create_bulk, rsc_name,
+                               item_args_lst)
+
+    async def update(self, rsc_name, item_id, item_args):
+        return await self._run(self.sfc_client.update, rsc_name, item_id,
+                               item_args)
+
+    async def delete_by_id(self, rsc_name, item_id):
+        return await self._run(self.sfc_client.delete_by_id, rsc_name,
+                               item_id)
+
+    async def delete(self, rsc_name, item_name, ignore_missing=True):
+        return await self._run(self.sfc_client.delete, rsc_name, item_name,
+                               ignore_missing=ignore_missing)
+
+    async def get_id(self, rsc_name, item_name):
+        return await self._run(self.sfc_client.get_id, rsc_name, item_name)
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+
+"""
+About: Warm pool of pre-booted SF server instances
+
+       Spare instances are booted per profile (image, flavor, init script, key,
+       availability zone, network and port layout), each in its own small Heat
+       stack with its ports and floating IP. A ServerChain claims spares instead of booting new
+       servers, a background thread keeps the number of spares between the
+       watermarks and evicts spares which are idle for too long.
+
+Usage:
+    pool = pool.WarmPool(auth_args, 'sf_pool', net_conf, size=2,
+                         low_wm=1, high_wm=4)
+    pool.add_profile(srv)
+    pool.start()
+    srv_chn = resource.ServerChain(..., pool=pool)
+    ...
+    pool.stop()
+
+Email: xianglinks@gmail.com
+"""
+
+import itertools
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from sfcostack import cloud, log
+from sfcostack.sfc import resource
+
+logger = log.logger
+
+
+class WarmPoolError(Exception):
+    """Warm pool error"""
+    pass
+
+
+class SpareInstance(object):
+
+    """A pre-booted server instance with its ports and floating IP"""
+
+    def __init__(self, profile, srv_chn, topo):
+        """Init a spare instance
+
+        :param profile (tuple): Profile of the instance
+        :param srv_chn (resource.ServerChain): Server chain of the single
+                                               instance, owns the stack
+        :param topo (dict): Topology of the instance, see ServerChain.topology
+        """
+        self.profile = profile
+        self.srv_chn = srv_chn
+        self.topo = topo
+        self.name = srv_chn.name
+        self.ready_ts = time.time()
+
+
+class WarmPool(object):
+
+    """Pool of pre-booted server instances per profile
+
+    Watermarks are counted per profile and include instances that are still
+    booting:
+
+        - size: Number of spares booted when a profile is added
+        - low_wm: Refill if the number of spares drops below it
+        - high_wm: Number of spares after a refill
+        - idle_timeout: Spares idle longer than it are evicted, as long as the
+                        number of spares stays above low_wm
+    """
+
+    def __init__(self, auth_args, name, net_conf, sep_access_port=True,
+                 fip_port='pt', size=2, low_wm=1, high_wm=4,
+                 idle_timeout=600, check_interval=5, max_boot=4,
+                 sess_reg=None):
+        """Init a warm pool
+
+        :param auth_args (dict):
+        :param name (str): Name of the pool, prefix of all spare stacks
+        :param net_conf (dict): Network configs, same as the ServerChain
+        :param sep_access_port (Bool): Same as the ServerChain
+        :param fip_port (str): Same as the ServerChain
+        :param check_interval (float): Interval of the refill thread
+        :param max_boot (int): Maximal number of concurrently booting spares
+        :param sess_reg (cloud.SessionRegistry):
+        """
+        if not 0 <= low_wm <= high_wm:
+            raise WarmPoolError('Invalid watermarks, low: %d, high: %d' %
+                                (low_wm, high_wm))
+        self.auth_args = auth_args
+        self.name = name
+        self.net_conf = net_conf
+        self.sep_access_port = sep_access_port
+        self.fip_port = fip_port
+        self.size = min(size, high_wm)
+        self.low_wm = low_wm
+        self.high_wm = high_wm
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+        self.sess_reg = sess_reg
+
+        sess_reg = sess_reg or cloud.default_registry
+        conn = sess_reg.get_connection(auth_args)
+        # Spares are only claimed by chains on the same network
+        self.network_id = {
+            'net': conn.network.find_network(net_conf['net_name']).id,
+            'subnet': conn.network.find_subnet(net_conf['subnet_name']).id
+        }
+
+        if sep_access_port:
+            self.port_suffix = ('pt', 'pt_in', 'pt_out')
+        else:
+            self.port_suffix = ('pt_in', 'pt_out')
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.max_boot = max_boot
+        self._executor = ThreadPoolExecutor(max_boot)
+        self._spare_id = itertools.count()
+        # Profile -> a server used as template
+        self._profile_map = dict()
+        # Profile -> ready spares, the oldest on the left
+        self._spare_map = defaultdict(deque)
+        # Profile -> number of booting spares
+        self._boot_num = defaultdict(int)
+
+    def get_profile(self, srv, srv_chn=None):
+        """Get the profile of a server
+
+        :param srv (dict): Server conf of a server chain
+        :param srv_chn (resource.ServerChain): The server chain of the server,
+                                               network IDs and the port layout
+                                               of the pool are used if None
+        :retype: tuple
+        """
+        layout = srv_chn or self
+        return (srv['image'], srv['flavor'], srv.get('init_script', None),
+                (srv.get('ssh', None) or {}).get('pub_key_name', None),
+                srv.get('availability_zone', None),
+                layout.network_id['net'], layout.network_id['subnet'],
+                bool(layout.sep_access_port), layout.fip_port)
+
+    def add_profile(self, srv):
+        """Add the profile of a server and boot initial spares
+
+        :param srv (dict): Server conf of a server chain
+        """
+        profile = self.get_profile(srv)
+        with self._lock:
+            if profile in self._profile_map:
+                return
+            self._profile_map[profile] = dict(srv)
+            self._boot_num[profile] += self.size
+        logger.info('Add profile: %s to warm pool: %s', profile, self.name)
+        for _ in range(self.size):
+            self._executor.submit(self._boot_spare, profile)
+
+    def get_spare_num(self, srv):
+        """Get the number of ready spares for the profile of a server"""
+        with self._lock:
+            return len(self._spare_map[self.get_profile(srv)])
+
+    # --- Spare lifecycle ---
+
+    def _boot_spare(self, profile):
+        """Boot a spare in its own stack, run in worker threads"""
+        spare_name = '%s_spare_%d' % (self.name, next(self._spare_id))
+        srv = dict(self._profile_map[profile])
+        srv['name'] = spare_name
+        srv_chn = None
+        try:
+            srv_chn = resource.ServerChain(
+                self.auth_args, spare_name, 'Spare of warm pool %s' % self.name,
+                self.net_conf, [[srv]], self.sep_access_port, self.fip_port,
+                sess_reg=self.sess_reg
+            )
+            hot_tpl = srv_chn.get_output_hot(only_network=False)
+            srv_chn.heat_client.stacks.create(stack_name=spare_name,
+                                              template=hot_tpl)
+            srv_chn._wait_creation_complete(spare_name)
+            spare = SpareInstance(profile, srv_chn,
+                                  srv_chn.topology()[spare_name])
+        except Exception as error:
+            logger.error('Failed to boot spare: %s, error: %s',
+                         spare_name, error)
+            with self._lock:
+                self._boot_num[profile] -= 1
+            if srv_chn:
+                self._delete_stack(srv_chn)
+            return
+
+        logger.debug('Spare: %s is ready', spare_name)
+        with self._lock:
+            self._boot_num[profile] -= 1
+            self._spare_map[profile].append(spare)
+
+    @staticmethod
+    def _delete_stack(srv_chn, wait_complete=False):
+        """Delete the stack of a spare
+
+        :return: False if the deletion failed
+        :retype: Bool
+        """
+        try:
+            srv_chn.delete(wait_complete=wait_complete)
+        except resource.SFCRscError as error:
+            logger.error('Failed to delete spare: %s, error: %s',
+                         srv_chn.name, error)
+            return False
+        return True
+
+    def claim(self, srv, cloud_name=None, srv_chn=None):
+        """Claim a spare for a server
+
+        The spare server and its ports are renamed after the server, so the
+        claimed instance can be found like a server booted by the chain.
+
+        :param srv (dict): Server conf of a server chain
+        :param cloud_name (str): Name of the server in the cloud, see
+                                 resource.SFServer. The name in the conf is
+                                 used if None
+        :param srv_chn (resource.ServerChain): The server chain claiming the
+                                               spare, see get_profile
+        :return: A spare or None if no spare of the profile is ready
+        :retype: SpareInstance
+        """
+        cloud_name = cloud_name or srv['name']
+        profile = self.get_profile(srv, srv_chn)
+        with self._lock:
+            if not self._spare_map[profile]:
+                return None
+            spare = self._spare_map[profile].popleft()
+        # Refill in the background
+        self._wake.set()
+
+        conn = spare.srv_chn.conn
+        try:
+            nova_srv = conn.compute.find_server(
+                spare.srv_chn.get_srv(spare.name).cloud_name)
+            if nova_srv:
+                conn.compute.update_server(nova_srv, name=cloud_name)
+            for suffix in self.port_suffix:
+                conn.network.update_port(spare.topo[suffix + '_id'],
+                                         name='_'.join((cloud_name, suffix)))
+        except Exception as error:
+            # MARK: The spare MAY be partially renamed, it is not re-used
+            logger.error('Failed to claim spare: %s, error: %s',
+                         spare.name, error)
+            self._executor.submit(self._delete_stack, spare.srv_chn)
+            raise
+        logger.debug('Claim spare: %s for server: %s', spare.name,
+                     cloud_name)
+        return spare
+
+    def release(self, spare, wait_complete=False):
+        """Release a claimed spare, the instance is deleted
+
+        :param wait_complete (Bool): Block until the stack is deleted
+        :return: True if the stack is deleted, or only its deletion is
+                 requested if wait_complete is False
+        :retype: Bool
+        """
+        logger.debug('Release spare: %s', spare.name)
+        return self._delete_stack(spare.srv_chn, wait_complete)
+
+    # --- Refill and eviction ---
+
+    def check(self):
+        """Refill spares below the low watermark and evict idle spares"""
+        now = time.time()
+        boot_lst = list()
+        evict_lst = list()
+        with self._lock:
+            for profile in self._profile_map:
+                spare_que = self._spare_map[profile]
+                while len(spare_que) > self.low_wm:
+                    if now - spare_que[0].ready_ts <= self.idle_timeout:
+                        break
+                    evict_lst.append(spare_que.popleft())
+                total = len(spare_que) + self._boot_num[profile]
+                if total < self.low_wm:
+                    self._boot_num[profile] += self.high_wm - total
+                    boot_lst.extend([profile] * (self.high_wm - total))
+
+        for spare in evict_lst:
+            logger.debug('Evict idle spare: %s', spare.name)
+            self._executor.submit(self._delete_stack, spare.srv_chn)
+        for profile in boot_lst:
+            self._executor.submit(self._boot_spare, profile)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.check()
+            self._wake.wait(self.check_interval)
+            self._wake.clear()
+
+    def start(self):
+        """Start the refill thread"""
+        if self._thread:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, delete_spares=True):
+        """Stop the refill thread
+
+        :param delete_spares (Bool): If True, all ready spares are deleted
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        # Wait for booting spares
+        self._executor.shutdown(wait=True)
+        self._executor = ThreadPoolExecutor(self.max_boot)
+        if delete_spares:
+            with self._lock:
+                spare_lst = [spare for spare_que in self._spare_map.values()
+                             for spare in spare_que]
+                self._spare_map.clear()
+            for spare in spare_lst:
+                self._delete_stack(spare.srv_chn, wait_complete=True)
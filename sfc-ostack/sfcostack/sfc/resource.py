@@ -8,15 +8,18 @@ About: SFC Resource
 Email: xianglinks@gmail.com
 """
 
+import calendar
+import hashlib
+import itertools
+import re
+import threading
 import time
-from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import paramiko
-from heatclient import client as heatclient
-from keystoneauth1 import loading, session
-from openstack import connection
+from heatclient import exc as heat_exc
 
-from sfcostack import hot, log, utils
+from sfcostack import cloud, hot, log, utils
 # MARK: CAN be replaced with openstack-neutronclient with v2 API
 from sfcostack.sfc import netsfc_clt
 
@@ -76,13 +79,241 @@ of the ServerChain takes much time, which SHOULD be avoided if the SFs on the
 server remain unchanged.
 """
 
-# TODO: Add get and set methods for server groups instead of playing with nested
-# lists
+
+class SFServer(object):
+
+    """SF server of a server group
+
+    Wraps the server conf, which is still accessible like a dict, e.g.
+    srv['image']. Port names are computed once, port IDs, fixed IPs and the
+    floating IP are stored after they are fetched.
+
+    The name in the conf is only unique in the server chain, it is used for
+    resources in the stack. Names of the server instance and its ports in the
+    cloud are prefixed with the chain name, so chains built from the same conf
+    do not conflict.
+    """
+
+    __slots__ = ('conf', 'name', 'cloud_name', 'grp_idx', 'port_name',
+                 'port_id', 'port_ip', 'fip')
+
+    PORT_SUFFIX = ('pt', 'pt_in', 'pt_out')
+
+    def __init__(self, conf, grp_idx=None, chn_name=None):
+        """Init a SF server
+
+        :param conf (dict): Server conf, e.g. a item of SFCConf.server_chain
+        :param grp_idx (int): Index of the server group
+        :param chn_name (str): Name of the server chain, prefix of the cloud
+                               names
+        """
+        self.conf = conf
+        self.name = conf['name']
+        self.cloud_name = get_cloud_name(chn_name, self.name)
+        self.grp_idx = grp_idx
+        # Port suffix -> port name in the cloud
+        self.port_name = {suffix: '_'.join((self.cloud_name, suffix))
+                          for suffix in self.PORT_SUFFIX}
+        self.reset()
+
+    def reset(self):
+        """Remove all fetched IDs and IPs"""
+        self.port_id = dict()
+        self.port_ip = dict()
+        self.fip = None
+
+    def set_topo(self, topo):
+        """Set port IDs, fixed IPs and the floating IP from the topology
+
+        :param topo (dict): Topology of the server, see ServerChain.topology
+        """
+        for suffix in self.PORT_SUFFIX:
+            if topo.get(suffix + '_id', None):
+                self.port_id[suffix] = topo[suffix + '_id']
+            if topo.get(suffix + '_ip', None):
+                self.port_ip[suffix] = topo[suffix + '_ip']
+        self.fip = topo.get('fip', None) or self.fip
+
+    # MARK: Dict like access to the server conf
+
+    def __getitem__(self, key):
+        return self.conf[key]
+
+    def __setitem__(self, key, value):
+        self.conf[key] = value
+
+    def __contains__(self, key):
+        return key in self.conf
+
+    def get(self, key, default=None):
+        return self.conf.get(key, default)
+
+    def keys(self):
+        return self.conf.keys()
 
 
 class ServerGroup(object):
-    """TODO: ServerGroup -> PortGroup"""
-    pass
+
+    """A group of SF servers, mapped to a port pair group
+
+    Servers of a group are instances of the same SF, flows are balanced among
+    them by networking-sfc.
+    """
+
+    __slots__ = ('idx', 'name', 'srv_lst', 'lb_fields', '_srv_map')
+
+    def __init__(self, idx, srv_lst, name=None):
+        """Init a server group
+
+        :param idx (int): Index of the group in the server chain
+        :param srv_lst (list): A list of SFServer objects
+        :param name (str): Name of the group, kept over updates of the chain.
+                           grp_<idx> is used if None
+        """
+        self.idx = idx
+        self.name = name or 'grp_%d' % idx
+        self.srv_lst = srv_lst
+        # MARK: Servers of a group share the lb_fields, see conf.SFCConf
+        self.lb_fields = next(
+            (list(srv.get('lb_fields')) for srv in srv_lst
+             if srv.get('lb_fields', None)), list())
+        self._srv_map = {srv.name: srv for srv in srv_lst}
+
+    def __iter__(self):
+        return iter(self.srv_lst)
+
+    def __len__(self):
+        return len(self.srv_lst)
+
+    def __getitem__(self, idx):
+        return self.srv_lst[idx]
+
+    def get_srv(self, srv_name):
+        """Get a server with its name, None if not in the group"""
+        return self._srv_map.get(srv_name, None)
+
+
+def get_cloud_name(chn_name, srv_name):
+    """Get the name of a server instance in the cloud"""
+    if not chn_name:
+        return srv_name
+    return '%s_%s' % (chn_name, srv_name)
+
+
+def _get_srv_conf(srv):
+    """Get the conf of a SFServer or a server conf
+
+    MARK: getattr can not be used here, since missing attributes of
+    addict.Dict are empty dicts
+    """
+    if isinstance(srv, SFServer):
+        return srv.conf
+    return srv
+
+
+def get_last_event_id(heat_client, stack_name):
+    """Get the ID of the latest event of a stack, None if no events"""
+    try:
+        event_lst = heat_client.events.list(
+            stack_name, sort_dir='desc', limit=1)
+    except heat_exc.HTTPNotFound:
+        return None
+    return event_lst[0].id if event_lst else None
+
+
+def _is_stack_fresh(stack, action, start_ts):
+    """Check if the status of a stack is set after the action started
+
+    MARK: Heat timestamps have a resolution of seconds
+    """
+    stack_ts = stack.created_at if action == 'CREATE' else stack.updated_at
+    try:
+        stack_ts = calendar.timegm(
+            time.strptime(stack_ts[:19], '%Y-%m-%dT%H:%M:%S'))
+    except (TypeError, ValueError):
+        return False
+    return stack_ts >= int(start_ts)
+
+
+def _check_stack_status(conn, stack_name, action, start_ts, started):
+    """Check the stack status for a action without events
+
+    :param started (Bool): If the action is already seen in progress
+    :return: If the action is completed and if it is seen in progress
+    :retype: tuple
+    """
+    stack = conn.orchestration.find_stack(stack_name)
+    if not stack:
+        return action == 'DELETE', started
+    if stack.status == '%s_IN_PROGRESS' % action:
+        return False, True
+    if not started and not _is_stack_fresh(stack, action, start_ts):
+        return False, started
+    if stack.status == '%s_FAILED' % action:
+        raise ServerChainError('Stack: %s %s failed: %s' % (
+            stack_name, action.lower(), getattr(stack, 'status_reason', '')))
+    return stack.status == '%s_COMPLETE' % action, started
+
+
+def wait_stack_complete(conn, heat_client, stack_name, action, marker=None,
+                        timeout=300, min_interval=0.1, max_interval=1.0):
+    """Wait for a stack action by following the stack events stream
+
+    The poll interval is reset to min_interval when new events arrive and
+    grows up to max_interval while the stack is idle. The stack status is
+    also checked when no events arrive, for Heat versions without events
+    for the stack itself. The status is only used if the stack was updated
+    after the start or is seen in progress, since it MAY still be the status
+    of a previous action.
+
+    :param conn (openstack.connection.Connection):
+    :param heat_client (heatclient.v1.client.Client):
+    :param action (str): Stack action, e.g. CREATE, UPDATE, DELETE
+    :param marker (str): ID of the last event before the action started
+    :return: A dict of resource name -> seconds until its action completed
+    :retype: dict
+    """
+    start_ts = time.time()
+    interval = min_interval
+    rsc_time_info = dict()
+    started = False
+    while time.time() - start_ts < timeout:
+        try:
+            event_lst = heat_client.events.list(
+                stack_name, marker=marker, sort_dir='asc')
+        except heat_exc.HTTPNotFound:
+            # Not created in the db or already deleted
+            if action == 'DELETE':
+                return rsc_time_info
+            event_lst = list()
+
+        for event in event_lst:
+            marker = event.id
+            if event.resource_name == stack_name:
+                if event.resource_status == '%s_COMPLETE' % action:
+                    return rsc_time_info
+                if event.resource_status == '%s_FAILED' % action:
+                    raise ServerChainError(
+                        'Stack: %s %s failed: %s' % (
+                            stack_name, action.lower(),
+                            event.resource_status_reason))
+            elif event.resource_status == '%s_COMPLETE' % action:
+                rsc_time_info[event.resource_name] = time.time() - start_ts
+
+        if event_lst:
+            interval = min_interval
+        else:
+            complete, started = _check_stack_status(
+                conn, stack_name, action, start_ts, started)
+            if complete:
+                return rsc_time_info
+            logger.debug('Stack: %s %s is in progress.',
+                         stack_name, action.lower())
+            interval = min(interval * 2, max_interval)
+        time.sleep(interval)
+
+    raise ServerChainError(
+        'Stack: %s %s timeout!' % (stack_name, action.lower()))
 
 
 class ServerChain(object):
@@ -96,7 +327,8 @@ class ServerChain(object):
 
     def __init__(self, auth_args, name, desc,
                  net_conf, srv_grp_lst, sep_access_port=False,
-                 fip_port=None):
+                 fip_port=None, sess_reg=None, pool=None, nested=False,
+                 journal=None):
         """Init server chain object
 
         :param auth_args (dict):
@@ -110,62 +342,138 @@ class ServerChain(object):
                                pt: sep_access_port
                                pt_in: ingress port
                                pt_out: egress port
+        :param sess_reg (cloud.SessionRegistry): Registry of shared cloud
+                                                 sessions, the default registry
+                                                 is used if None
+        :param pool (pool.WarmPool): Pool of pre-booted instances, servers are
+                                     claimed from it if spares are ready
+        :param nested (Bool): If True, each server group is created in a
+                              nested stack of the server chain stack
+        :param journal (journal.Journal): Resource journal of the SFC, the
+                                          stack and claimed spares are
+                                          recorded in it
         """
 
         self.name = name
         self.desc = desc
         self.net_conf = net_conf
-        self.srv_grp_lst = deque(srv_grp_lst)
+        # Server name -> SFServer
+        self._srv_map = dict()
+        self._grp_id = itertools.count()
+        self.srv_grp_lst = self._get_srv_grp_lst(srv_grp_lst)
         self.sep_access_port = sep_access_port
         self.fip_port = fip_port
+        self.nested = nested
 
-        self.conn = connection.Connection(**auth_args)
+        sess_reg = sess_reg or cloud.default_registry
+        self.conn = sess_reg.get_connection(auth_args)
         # MARK: Since there is no examples for usage of the orchestration
         # resource in openstack-pythonsdk, the heatclient lib is used here.
         # It SHOULD be replaced with pythonsdk later
-        loader = loading.get_plugin_loader('password')
-        auth = loader.load_from_options(**auth_args)
-        sess = session.Session(auth=auth)
-        self.heat_client = heatclient.Client('1', session=sess)
+        self.heat_client = sess_reg.get_heat_client(auth_args)
+
+        # Port name -> port, built from a single port listing
+        self._port_idx = None
+        # Server name -> floating IP, cached for the life of the stack
+        self._srv_fip_map = None
+        # Memoized stack outputs
+        self._topo = None
+        # Stack phase -> {resource name: seconds until completed}
+        self.stack_time_info = dict()
+
+        self.pool = pool
+        # Server name -> spare claimed from the pool
+        self.claimed_srv = dict()
+        self.journal = journal
 
         self._get_network_id()
 
+    def _get_srv_grp_lst(self, srv_grp_lst):
+        """Build server groups from a list of lists of server confs
+
+        Existing servers with unchanged confs are re-used, so their fetched
+        IDs and IPs are kept. A group keeps the name of the old group sharing
+        a server with it, new groups get new names.
+
+        :retype: list
+        """
+        old_grp_map = {srv.name: srv_grp.name
+                       for srv_grp in getattr(self, 'srv_grp_lst', ())
+                       for srv in srv_grp}
+        grp_name_set = set()
+        srv_map = dict()
+        grp_lst = list()
+        for grp_idx, srv_grp in enumerate(srv_grp_lst):
+            srv_lst = list()
+            for srv_conf in srv_grp:
+                srv_conf = _get_srv_conf(srv_conf)
+                srv = self._srv_map.get(srv_conf['name'], None)
+                if srv and srv.conf == srv_conf:
+                    srv.grp_idx = grp_idx
+                else:
+                    srv = SFServer(srv_conf, grp_idx, self.name)
+                srv_lst.append(srv)
+                srv_map[srv.name] = srv
+            grp_name = None
+            for srv in srv_lst:
+                old_name = old_grp_map.get(srv.name, None)
+                if old_name and old_name not in grp_name_set:
+                    grp_name = old_name
+                    break
+            if not grp_name:
+                grp_name = 'grp_%d' % next(self._grp_id)
+            grp_name_set.add(grp_name)
+            grp_lst.append(ServerGroup(grp_idx, srv_lst, grp_name))
+        self._srv_map = srv_map
+        return grp_lst
+
+    def _reset_srv_cache(self):
+        """Remove all cached ports, floating IPs and stack outputs"""
+        self._port_idx = None
+        self._srv_fip_map = None
+        self._topo = None
+        for srv in self._srv_map.values():
+            srv.reset()
+
+    def get_srv(self, srv_name):
+        """Get a server with its name
+
+        :retype: SFServer
+        """
+        srv = self._srv_map.get(srv_name, None)
+        if not srv:
+            raise ServerChainError('Can not find server with name: %s' %
+                                   srv_name)
+        return srv
+
+    def get_srv_grp(self, grp_idx):
+        """Get a server group with its index
+
+        :retype: ServerGroup
+        """
+        return self.srv_grp_lst[grp_idx]
+
     #  --- HEAT helper func ---
 
+    def _get_last_event_id(self, stack_name):
+        """Get the ID of the latest event of a stack, None if no events"""
+        return get_last_event_id(self.heat_client, stack_name)
+
+    def _wait_stack_complete(self, stack_name, action, marker=None,
+                             timeout=300, min_interval=0.1, max_interval=1.0):
+        """Wait for a stack action, see wait_stack_complete"""
+        return wait_stack_complete(self.conn, self.heat_client, stack_name,
+                                   action, marker, timeout, min_interval,
+                                   max_interval)
+
     def _wait_creation_complete(self, stack_name, status='CREATE_COMPLETE',
-                                timeout=300, interval=3):
-        total_time = 0
-        while total_time < timeout:
-            stack = self.conn.orchestration.find_stack(stack_name)
-            # Not created in the db
-            if not stack:
-                time.sleep(interval)
-                total_time += interval
-                continue
-            elif stack.status == status:
-                return
-            # Create in process
-            else:
-                logger.debug(
-                    'Stack: %s creation is in progress.' % stack_name
-                )
-                time.sleep(interval)
-                total_time += interval
-        raise ServerChainError(
-            'Stack: %s creation timeout!' % stack_name)
-
-    def _wait_deletion_complete(self, stack_name, timeout=300, interval=3):
-        total_time = 0
-        while total_time < timeout:
-            stack = self.conn.orchestration.find_stack(stack_name)
-            # Delete in progress
-            if stack:
-                time.sleep(interval)
-                total_time += interval
-            else:
-                return
-        raise ServerChainError(
-            'Stack: %s deletion timeout!' % stack_name)
+                                timeout=300, marker=None):
+        return self._wait_stack_complete(stack_name, status.split('_')[0],
+                                         marker, timeout)
+
+    def _wait_deletion_complete(self, stack_name, timeout=300, marker=None):
+        return self._wait_stack_complete(stack_name, 'DELETE', marker,
+                                         timeout)
 
     # --- Get server chain info ---
 
@@ -182,30 +490,82 @@ class ServerChain(object):
             'subnet': subnet.id
         }
 
+    def _get_port_index(self, refresh=False):
+        """Get a index of all ports on the chain's network
+
+        :param refresh (Bool): If True, the index is rebuilt
+        :retype: dict
+        """
+        if self._port_idx is None or refresh:
+            self._port_idx = {
+                port.name: port for port in
+                self.conn.network.ports(network_id=self.network_id['net'])
+            }
+        return self._port_idx
+
+    def _get_port(self, port_name):
+        """Get a port of the server chain with its name"""
+        port = self._get_port_index().get(port_name, None)
+        if not port:
+            # MARK: The port MAY be created after the index is built
+            port = self._get_port_index(refresh=True).get(port_name, None)
+        if not port:
+            raise ServerChainError('Can not find port with name: %s' %
+                                   port_name)
+        return port
+
+    def _get_srv_fip_map(self):
+        """Get floating IPs of all servers from a single floating IP listing
+
+        :retype: dict
+        """
+        if self._srv_fip_map is None:
+            self.topology()
+            if all(srv.fip for srv in self._srv_map.values()):
+                self._srv_fip_map = {
+                    srv.name: srv.fip for srv in self._srv_map.values()
+                }
+                return self._srv_fip_map
+
+            # MARK: Stacks created without topology outputs
+            fip_idx = {
+                fip.port_id: fip.floating_ip_address for fip in
+                self.conn.network.ips(
+                    floating_network_id=self.network_id['public'])
+                if fip.port_id
+            }
+            srv_fip_map = dict()
+            for srv in self._srv_map.values():
+                fip_pt = self._get_port(srv.port_name[self.fip_port])
+                if fip_pt.id not in fip_idx:
+                    raise ServerChainError(
+                        'Can not find floating IP of server: %s' % srv.name)
+                srv.fip = fip_idx[fip_pt.id]
+                srv_fip_map[srv.name] = srv.fip
+            self._srv_fip_map = srv_fip_map
+        return self._srv_fip_map
+
     def get_srv_num(self):
         """Get number of all servers in the chain"""
-        srv_num = 0
-        for srv_grp in self.srv_grp_lst:
-            srv_num += len(srv_grp)
-        return srv_num
+        return len(self._srv_map)
 
-    def get_srv_fips(self, no_grp=False):
+    def get_srv_fips(self, no_grp=False, with_claimed=True):
         """Get a list of floating IPs of all server instances
 
         Used by SFC manager for SF checking and remote access
 
+        :param with_claimed (Bool): If False, servers claimed from the pool are
+                                    excluded
         :retype: list
         """
+        srv_fip_map = self._get_srv_fip_map()
         fip_lst = list()
         for srv_grp in self.srv_grp_lst:
             grp_fip_lst = list()
             for srv in srv_grp:
-                fip_pt = self.conn.network.find_port(
-                    srv['name'] + '_%s' % self.fip_port
-                )
-                fip = list(
-                    self.conn.network.ips(port_id=fip_pt.id))[0].floating_ip_address
-                grp_fip_lst.append(fip)
+                if not with_claimed and srv['name'] in self.claimed_srv:
+                    continue
+                grp_fip_lst.append(srv_fip_map[srv['name']])
             fip_lst.append(grp_fip_lst)
 
         if no_grp:
@@ -216,21 +576,39 @@ class ServerChain(object):
 
         return fip_lst
 
+    def get_srv_addrs(self, with_claimed=True):
+        """Get a list of IP address sets of all server instances
+
+        Used by SFC manager to identify the sender of ready-packets. Each set
+        contains the floating IP and fixed IPs of a server.
+
+        :param with_claimed (Bool): If False, servers claimed from the pool are
+                                    excluded
+        :retype: list
+        """
+        self._get_srv_fip_map()
+        addr_lst = list()
+        for srv_grp in self.srv_grp_lst:
+            for srv in srv_grp:
+                if not with_claimed and srv.name in self.claimed_srv:
+                    continue
+                addrs = {srv.fip}
+                addrs.update(srv.port_ip.values())
+                addr_lst.append(addrs)
+        return addr_lst
+
     def get_srv_ssh_tuple(self, no_grp=False):
         """Get a list of SSH tuples for all server instances
 
         SSH Tuple: (fip, username, pvt_key)
         """
+        srv_fip_map = self._get_srv_fip_map()
         ssh_tuple_lst = list()
         for srv_grp in self.srv_grp_lst:
             grp_ssh_tuple_lst = list()
             for srv in srv_grp:
                 srv_ssh = srv['ssh']
-                fip_pt = self.conn.network.find_port(
-                    srv['name'] + '_%s' % self.fip_port
-                )
-                fip = list(
-                    self.conn.network.ips(port_id=fip_pt.id))[0].floating_ip_address
+                fip = srv_fip_map[srv['name']]
                 grp_ssh_tuple_lst.append(
                     (fip, srv_ssh['user_name'], srv_ssh['pvt_key_file'])
                 )
@@ -253,14 +631,11 @@ class ServerChain(object):
 
         :retype: list
         """
-        pp_grp_name_lst = list()
-        for srv_grp in self.srv_grp_lst:
-            pp_grp = list()
-            for srv in srv_grp:
-                pp_grp.append(
-                    (srv['name'] + '_pt_in', srv['name'] + '_pt_out'))
-            pp_grp_name_lst.append(pp_grp)
-        return pp_grp_name_lst
+        return [
+            [(srv.port_name['pt_in'], srv.port_name['pt_out'])
+             for srv in srv_grp]
+            for srv_grp in self.srv_grp_lst
+        ]
 
     def get_srv_ppgrp_id(self):
         """Get IDs of port pair groups
@@ -272,102 +647,277 @@ class ServerChain(object):
 
         :retype: list
         """
+        self.topology()
         pp_grp_id_lst = list()
         for srv_grp in self.srv_grp_lst:
             pp_grp_id = list()
             for srv in srv_grp:
-                pp_id = (
-                    self.conn.network.find_port(srv['name'] + '_pt_in').id,
-                    self.conn.network.find_port(srv['name'] + '_pt_out').id
-                )
-                pp_grp_id.append(pp_id)
+                # MARK: Stacks created without topology outputs
+                for suffix in ('pt_in', 'pt_out'):
+                    if suffix not in srv.port_id:
+                        srv.port_id[suffix] = self._get_port(
+                            srv.port_name[suffix]).id
+                pp_grp_id.append((srv.port_id['pt_in'],
+                                  srv.port_id['pt_out']))
             pp_grp_id_lst.append(pp_grp_id)
         return pp_grp_id_lst
 
+    def get_srv_ppgrp_param(self):
+        """Get port pair group parameters of server groups
+
+        Format:
+            [ {'lb_fields': [field, ...]}, {...} ]
+
+        An empty dict means default parameters of networking-sfc.
+
+        :retype: list
+        """
+        return [{'lb_fields': srv_grp.lb_fields} if srv_grp.lb_fields
+                else dict() for srv_grp in self.srv_grp_lst]
+
     # --- CR of server chain ---
 
+    def _get_srv_topo_output(self, srv, port_suffix):
+        """Get the value of the topology output of a server"""
+        topo = dict()
+        for suffix in port_suffix:
+            port_name = '_'.join((srv['name'], suffix))
+            topo[suffix + '_id'] = '{ get_resource: %s }' % port_name
+            topo[suffix + '_ip'] = (
+                '{ get_attr: [%s, fixed_ips, 0, ip_address] }' % port_name)
+        if self.fip_port:
+            topo['fip'] = '{ get_attr: [%s_fip, floating_ip_address] }' % (
+                srv['name'])
+        return topo
+
+    def topology(self, refresh=False):
+        """Get the topology of the server chain from the stack outputs
+
+        All outputs are fetched with one stack-show call and memoized.
+
+        Format:
+            { server_name: {'pt_in_id': ..., 'pt_in_ip': ..., 'pt_out_id': ...,
+                            'pt_out_ip': ..., 'fip': ...} }
+
+        :param refresh (Bool): If True, the outputs are fetched again
+        :retype: dict
+        """
+        if self._topo is None or refresh:
+            stack = self.heat_client.stacks.get(self.name)
+            topo = dict()
+            for output in getattr(stack, 'outputs', None) or []:
+                key = output['output_key']
+                if key.endswith('_topo') and output.get('output_value'):
+                    topo[key[:-len('_topo')]] = output['output_value']
+            for srv_name, spare in self.claimed_srv.items():
+                topo[srv_name] = spare.topo
+            for srv_name, srv_topo in topo.items():
+                if srv_name in self._srv_map:
+                    self._srv_map[srv_name].set_topo(srv_topo)
+            self._topo = topo
+        return self._topo
+
+    def _get_port_suffix(self):
+        if self.sep_access_port:
+            return ('pt', 'pt_in', 'pt_out')
+        return ('pt_in', 'pt_out')
+
+    @staticmethod
+    def _add_init_cfg(hot_cont, init_script, cfg_set):
+        """Add a software config of a init script, shared by all servers using
+        the same script in the template
+
+        :param cfg_set (set): Names of already added software configs
+        :return: Name of the software config resource
+        """
+        script = utils.read_cached(init_script)
+        # MARK: Named by the content, so the server is only replaced if the
+        # content of its script changes
+        cfg_name = 'init_cfg_%s' % hashlib.sha1(
+            script.encode('utf-8')).hexdigest()[:12]
+        if cfg_name not in cfg_set:
+            cfg_set.add(cfg_name)
+            hot_cont.resource_lst.append(
+                hot.Resource(cfg_name, 'software_config', {
+                    'group': 'ungrouped',
+                    # MARK: | is needed after config
+                    'config': '|\n' + script
+                })
+            )
+        return cfg_name
+
+    def _add_grp_hot(self, hot_cont, srv_grp, only_network, cfg_set=None):
+        """Add resources and topology outputs of a server group to a HOT
+
+        :param cfg_set (set): Names of software configs already in the HOT
+        """
+        port_suffix = self._get_port_suffix()
+        if cfg_set is None:
+            cfg_set = set()
+        for srv in srv_grp:
+            # MARK: Claimed servers live in the stacks of the pool
+            if srv['name'] in self.claimed_srv:
+                continue
+            networks = list()
+            # Remote access, ingress and egress ports
+            for suffix in port_suffix:
+                port_name = '_'.join((srv['name'], suffix))
+                prop = {
+                    'name': srv.port_name[suffix],
+                    'network_id': self.network_id['net'],
+                    # A list of subnet IDs
+                    'fixed_ips': [{'subnet_id': self.network_id['subnet']}],
+                    # TODO: Add support for security group
+                    # 'security_groups': [self.network_id['sec_grp']]
+                }
+                networks.append(
+                    {'port': '{ get_resource: %s }' % port_name})
+                hot_cont.resource_lst.append(
+                    hot.Resource(port_name, 'port', prop))
+
+            if self.fip_port:
+                prop = {
+                    'floating_network': self.network_id['public'],
+                }
+                if self.fip_port == 'pt':
+                    prop['port_id'] = '{ get_resource: %s }' % (
+                        srv['name'] + '_pt')
+                elif self.fip_port == 'pt_in':
+                    prop['port_id'] = '{ get_resource: %s }' % (
+                        srv['name'] + '_pt_in')
+                elif self.fip_port == 'pt_out':
+                    prop['port_id'] = '{ get_resource: %s }' % (
+                        srv['name'] + '_pt_out')
+                else:
+                    raise ServerChainError('Invalid floating IP port!')
+
+                hot_cont.resource_lst.append(
+                    hot.Resource(srv['name'] + '_fip', 'fip', prop))
+
+            # Export port IDs, fixed IPs and the floating IP
+            hot_cont.output_lst.append(
+                hot.Output(srv['name'] + '_topo',
+                           self._get_srv_topo_output(srv, port_suffix))
+            )
+
+            # Add server instances
+            if not only_network:
+                prop = {
+                    'name': srv.cloud_name,
+                    'image': srv['image'],
+                    'flavor': srv['flavor'],
+                    'networks': networks
+                }
+
+                if srv.get('ssh', None):
+                    prop['key_name'] = srv['ssh']['pub_key_name']
+
+                if srv.get('availability_zone', None):
+                    prop['availability_zone'] = srv['availability_zone']
+                    logger.debug('%s, availability zone: %s'
+                                 % (srv['name'], srv['availability_zone']))
+
+                # MARK: Only test RAW bash script
+                if srv.get('init_script', None):
+                    logger.debug('%s, init bash script, path: %s'
+                                 % (srv['name'], srv['init_script']))
+                    cfg_name = self._add_init_cfg(
+                        hot_cont, srv['init_script'], cfg_set)
+                    prop.update({
+                        'user_data_format': 'RAW',
+                        'user_data': '{ get_resource: %s }' % cfg_name
+                    })
+
+                hot_cont.resource_lst.append(
+                    hot.Resource(srv['name'], 'server', prop))
+
+    @staticmethod
+    def _get_grp_rsc_name(srv_grp):
+        """Get the name of the nested stack resource of a server group
+
+        MARK: The group name is kept over updates, so reordering groups or
+        removing servers does not replace the nested stacks
+        """
+        return srv_grp.name
+
+    def get_stack_args(self, only_network=False):
+        """Get the template and files arguments of stack creation and update
+
+        If nested is True, each server group is a template resource of the
+        parent stack and its template is added to the files.
+
+        :param only_network (Bool): If True, only add networking resources
+        :retype: dict
+        """
+        if not self.nested:
+            return {'template': self.get_output_hot(only_network),
+                    'files': dict()}
+
+        hot_cont = hot.HOT()
+        files = dict()
+        for srv_grp in self.srv_grp_lst:
+            srv_lst = [srv for srv in srv_grp
+                       if srv['name'] not in self.claimed_srv]
+            if not srv_lst:
+                continue
+            rsc_name = self._get_grp_rsc_name(srv_grp)
+            grp_hot = hot.HOT(desc='Server group of chain %s' % self.name)
+            self._add_grp_hot(grp_hot, srv_lst, only_network, set())
+            files[rsc_name + '.yaml'] = grp_hot.output_yaml_str()
+            hot_cont.resource_lst.append(
+                hot.Resource(rsc_name, rsc_name + '.yaml'))
+            # Re-export the topology of servers in the group
+            for srv in srv_lst:
+                hot_cont.output_lst.append(
+                    hot.Output(srv['name'] + '_topo',
+                               '{ get_attr: [%s, %s_topo] }' % (
+                                   rsc_name, srv['name']))
+                )
+        return {'template': hot_cont.output_yaml_str(), 'files': files}
+
     def get_output_hot(self, only_network=False):
         """Output essential resources as a HOT template
 
         :param only_network (Bool): If True, only add networking resources
         """
         hot_cont = hot.HOT()
-        prop = dict()
-
-        if self.sep_access_port:
-            port_suffix = ('pt', 'pt_in', 'pt_out')
-        else:
-            port_suffix = ('pt_in', 'pt_out')
+        cfg_set = set()
         for srv_grp in self.srv_grp_lst:
-            for srv in srv_grp:
-                networks = list()
-                # Remote access, ingress and egress ports
-                for suffix in port_suffix:
-                    port_name = '_'.join((srv['name'], suffix))
-                    prop = {
-                        'name': port_name,
-                        'network_id': self.network_id['net'],
-                        # A list of subnet IDs
-                        'fixed_ips': [{'subnet_id': self.network_id['subnet']}],
-                        # TODO: Add support for security group
-                        # 'security_groups': [self.network_id['sec_grp']]
-                    }
-                    networks.append(
-                        {'port': '{ get_resource: %s }' % port_name})
-                    hot_cont.resource_lst.append(
-                        hot.Resource(port_name, 'port', prop))
-
-                if self.fip_port:
-                    prop = {
-                        'floating_network': self.network_id['public'],
-                    }
-                    if self.fip_port == 'pt':
-                        prop['port_id'] = '{ get_resource: %s }' % (
-                            srv['name'] + '_pt')
-                    elif self.fip_port == 'pt_in':
-                        prop['port_id'] = '{ get_resource: %s }' % (
-                            srv['name'] + '_pt_in')
-                    elif self.fip_port == 'pt_out':
-                        prop['port_id'] = '{ get_resource: %s }' % (
-                            srv['name'] + '_pt_out')
-                    else:
-                        raise ServerChainError('Invalid floating IP port!')
-
-                    hot_cont.resource_lst.append(
-                        hot.Resource(srv['name'] + '_fip', 'fip', prop))
-
-                # Add server instances
-                if not only_network:
-                    prop = {
-                        'name': srv['name'],
-                        'image': srv['image'],
-                        'flavor': srv['flavor'],
-                        'networks': networks
-                    }
-
-                    if srv.get('ssh', None):
-                        prop['key_name'] = srv['ssh']['pub_key_name']
-
-                    if srv.get('availability_zone', None):
-                        prop['availability_zone'] = srv['availability_zone']
-                        logger.debug('%s, availability zone: %s'
-                                     % (srv['name'], srv['availability_zone']))
-
-                    # MARK: Only test RAW bash script
-                    if srv.get('init_script', None):
-                        logger.debug('%s, read init bash script, path: %s'
-                                     % (srv['name'], srv['init_script']))
-                        with open(srv['init_script'], 'r') as init_file:
-                            # MARK: | is needed after user_data
-                            prop.update(
-                                {'user_data': '|\n' + init_file.read()}
-                            )
-
-                    hot_cont.resource_lst.append(
-                        hot.Resource(srv['name'], 'server', prop))
-
+            self._add_grp_hot(hot_cont, srv_grp, only_network, cfg_set)
         return hot_cont.output_yaml_str()
 
+    def _claim_srv(self, srv_lst):
+        """Claim servers from the pool, servers without spares are booted"""
+        if not self.pool:
+            return
+        for srv in srv_lst:
+            spare = self.pool.claim(srv, srv.cloud_name, self)
+            if spare:
+                self.claimed_srv[srv['name']] = spare
+                if self.journal:
+                    self.journal.add('stack', [spare.name])
+        logger.info('Claim %d server(s) from the pool for server chain: %s',
+                    len(self.claimed_srv), self.name)
+
+    def _release_srv(self, srv_name_lst, wait_complete=False):
+        """Release claimed servers to the pool
+
+        Spares are removed from the journal after their stacks are deleted,
+        so they are kept in the journal if wait_complete is False.
+        """
+        spare_lst = [self.claimed_srv.pop(srv_name) for srv_name in
+                     srv_name_lst if srv_name in self.claimed_srv]
+        if not spare_lst:
+            return
+        with ThreadPoolExecutor(len(spare_lst)) as executor:
+            future_map = {
+                executor.submit(self.pool.release, spare, wait_complete):
+                spare for spare in spare_lst
+            }
+        for future, spare in future_map.items():
+            if future.result() and wait_complete and self.journal:
+                self.journal.remove('stack', [spare.name])
+
     def create_network(self):
         """Create networking resources"""
 
@@ -375,21 +925,28 @@ class ServerChain(object):
             'Create networking resources for server chain: %s, stack name: %s',
             self.name, self.name
         )
-        hot_tpl = self.get_output_hot(only_network=True)
-        self.heat_client.stacks.create(stack_name=self.name,
-                                       template=hot_tpl)
-        self._wait_creation_complete(self.name)
+        self._claim_srv([srv for srv_grp in self.srv_grp_lst
+                         for srv in srv_grp])
+        stack_args = self.get_stack_args(only_network=True)
+        # MARK: Recorded before the request, a crash MAY happen before the
+        # response is received
+        if self.journal:
+            self.journal.add('stack', [self.name])
+        self.heat_client.stacks.create(stack_name=self.name, **stack_args)
+        self.stack_time_info['create_network'] = \
+            self._wait_creation_complete(self.name)
 
     # MARK: Use HEAT updating function
     def create_instance(self, wait_complete=True):
         """Create all instances in the server chain"""
-        hot_tpl = self.get_output_hot(only_network=False)
+        stack_args = self.get_stack_args(only_network=False)
         sc_stack = self.conn.orchestration.find_stack(self.name)
-        self.heat_client.stacks.update(stack_id=sc_stack.id,
-                                       template=hot_tpl)
+        marker = self._get_last_event_id(self.name)
+        self.heat_client.stacks.update(stack_id=sc_stack.id, **stack_args)
         if wait_complete:
-            self._wait_creation_complete(
-                self.name, status='UPDATE_COMPLETE'
+            self.stack_time_info['create_instance'] = \
+                self._wait_creation_complete(
+                    self.name, status='UPDATE_COMPLETE', marker=marker
             )
 
     @utils.deprecated
@@ -402,6 +959,8 @@ class ServerChain(object):
             'Create server chain: %s.' % self.name
         )
         hot_str = self.get_output_hot()
+        if self.journal:
+            self.journal.add('stack', [self.name])
         self.heat_client.stacks.create(stack_name=self.name,
                                        template=hot_str)
         if wait_complete:
@@ -426,7 +985,94 @@ class ServerChain(object):
             raise SFCRscError(
                 'Creation of server chain:%s timeout!' % self.name)
 
-    def delete(self, wait_complete=True, interval=3, timeout=600):
+    # --- U of server chain ---
+
+    @staticmethod
+    def _get_srv_diff(old_srv_grp_lst, new_srv_grp_lst):
+        """Get the difference of servers between two lists of server groups
+
+        Servers are identified by their names, a server with changed properties
+        is replaced.
+
+        :retype: dict
+        """
+        old_srv_map = {srv['name']: _get_srv_conf(srv)
+                       for srv_grp in old_srv_grp_lst for srv in srv_grp}
+        new_srv_map = {srv['name']: _get_srv_conf(srv)
+                       for srv_grp in new_srv_grp_lst for srv in srv_grp}
+        return {
+            'add': [name for name in new_srv_map if name not in old_srv_map],
+            'remove': [name for name in old_srv_map
+                       if name not in new_srv_map],
+            'replace': [name for name, srv in new_srv_map.items()
+                        if old_srv_map.get(name, srv) != srv]
+        }
+
+    @staticmethod
+    def _get_moved_srv(old_srv_grp_lst, new_srv_grp_lst):
+        """Get names of servers moved to a group with another name
+
+        :retype: list
+        """
+        old_grp_map = {srv.name: srv_grp.name
+                       for srv_grp in old_srv_grp_lst for srv in srv_grp}
+        return [srv.name for srv_grp in new_srv_grp_lst for srv in srv_grp
+                if old_grp_map.get(srv.name, srv_grp.name) != srv_grp.name]
+
+    def update(self, new_srv_grp_lst, wait_complete=True):
+        """Update the server groups of the server chain
+
+        The stack is updated with the template of the new server groups. Heat
+        only adds, removes or replaces ports, floating IPs and servers whose
+        definitions are changed, unchanged server instances keep running. If
+        nested is True, servers moved to another group are replaced, since
+        each group is a nested stack.
+
+        :param new_srv_grp_lst (list): A list of new server groups
+        :param wait_complete (Bool): Block until the stack is updated
+        :return: Names of added, removed and replaced servers
+        :retype: dict
+        """
+        old_srv_grp_lst = self.srv_grp_lst
+        srv_diff = self._get_srv_diff(old_srv_grp_lst, new_srv_grp_lst)
+        self.srv_grp_lst = self._get_srv_grp_lst(new_srv_grp_lst)
+        if self.nested:
+            # MARK: A moved server is re-created in the nested stack of the
+            # new group
+            srv_diff['replace'].extend(
+                name for name in self._get_moved_srv(old_srv_grp_lst,
+                                                     self.srv_grp_lst)
+                if name not in srv_diff['replace'])
+        logger.debug('Update server chain: %s, added: %s, removed: %s, '
+                     'replaced: %s', self.name, srv_diff['add'],
+                     srv_diff['remove'], srv_diff['replace'])
+        # MARK: Reordering server groups does not change the stack
+        if not any(srv_diff.values()):
+            return srv_diff
+
+        self._release_srv(srv_diff['remove'] + srv_diff['replace'])
+        self._claim_srv([self._srv_map[name] for name in
+                         srv_diff['add'] + srv_diff['replace']])
+
+        stack_args = self.get_stack_args(only_network=False)
+        sc_stack = self.conn.orchestration.find_stack(self.name)
+        if not sc_stack:
+            raise ServerChainError('Can not find server chain with name: %s' %
+                                   self.name)
+        marker = self._get_last_event_id(self.name)
+        self.heat_client.stacks.update(stack_id=sc_stack.id, **stack_args)
+        self._reset_srv_cache()
+        if wait_complete:
+            self.stack_time_info['update'] = self._wait_creation_complete(
+                self.name, status='UPDATE_COMPLETE', marker=marker)
+        return srv_diff
+
+    def delete(self, wait_complete=True, interval=1.0, timeout=600):
+        """Delete the stack of the server chain
+
+        The stack is removed from the journal after it is deleted, so it is
+        kept in the journal if wait_complete is False.
+        """
         logger.debug(
             'Delete server chain: %s' % self.name
         )
@@ -434,20 +1080,16 @@ class ServerChain(object):
         if not sc_stack:
             raise SFCRscError('Can not find server chain with name: %s' %
                               self.name)
+        marker = self._get_last_event_id(self.name)
         self.conn.orchestration.delete_stack(sc_stack)
+        self._release_srv(list(self.claimed_srv.keys()), wait_complete)
+        self._reset_srv_cache()
 
         if wait_complete:
-            total_time = 0
-            while total_time < timeout:
-                sc_stack = self.conn.orchestration.find_stack(self.name)
-                # Delete in progress
-                if sc_stack:
-                    time.sleep(interval)
-                    total_time += interval
-                else:
-                    return
-            raise SFCRscError(
-                'Deletion of server chain:%s timeout!' % self.name)
+            self.stack_time_info['delete'] = self._wait_stack_complete(
+                self.name, 'DELETE', marker, timeout, max_interval=interval)
+            if self.journal:
+                self.journal.remove('stack', [self.name])
 
 
 class PortChain(object):
@@ -466,25 +1108,44 @@ class PortChain(object):
 
         - Creation:
             In order to reduce the latency of packets(the time difference between
-            last SFC-modified packet and the first SFC-modified packet), the flow
-            classifier is created after finishing creation of all port pairs and
-            port pair groups. The port chain is created finally, which depends on
-            flow classifier.
+            last SFC-modified packet and the first SFC-modified packet), the port
+            chain is created after finishing creation of all port pairs, port
+            pair groups and the flow classifier. Groups and the flow classifier
+            are created concurrently.
 
         - Deletion:
             Similar to the creation, the flow classifier will be deleted after
-            finishing deleting the port chain.
+            finishing deleting the port chain. Resources are deleted by their
+            remembered IDs: the port chain, then the flow classifier and port
+            pair groups in parallel, then all port pairs in parallel.
 
 
     Naming Pattern:
 
-        Port Pair: pp_(port pair group index)_(port pair index) e.g. pp_1_1
-        Port Pair Group: pp_grp_(port pair group index) e.g. pp_grp_1
+        Port Pair: (port chain name)_pp_(port pair group index)_(port pair
+                   index) e.g. chn1_pp_1_1
+        Port Pair Group: (port chain name)_pp_grp_(port pair group index)
+                         e.g. chn1_pp_grp_1
         Port Chain: Get name from user config
+
+        Names of port pairs and groups are prefixed with the port chain name,
+        so multiple port chains can be created concurrently. Port pairs and
+        groups created by a update get the generation of the update as suffix,
+        e.g. chn1_pp_grp_1_g2, so their names do not collide with kept items.
+
+    Load Balancing:
+
+        Each server group is mapped to a port pair group with one port pair
+        per server instance. The lb_fields of the server group are used as the
+        port_pair_group_parameters, otherwise networking-sfc defaults are used.
     """
 
+    # Resources in deletion order, resources in the same step are independent
+    RSC_DEL_ORDER = (('port_chain', ), ('flow_classifier', 'port_pair_group'),
+                     ('port_pair', ))
+
     def __init__(self, auth_args, name, desc,
-                 srv_chain, flow_conf):
+                 srv_chain, flow_conf, sess_reg=None, journal=None):
         """Init a port chain object
 
         :param auth_args:
@@ -492,96 +1153,529 @@ class PortChain(object):
         :param desc:
         :param srv_chain (ServerChain):
         :param flow_conf:
+        :param sess_reg (cloud.SessionRegistry):
+        :param journal (journal.Journal): Resource journal of the SFC, IDs of
+                                          created items are recorded in it
         """
-        self.conn = connection.Connection(**auth_args)
-        self.pc_client = netsfc_clt.SFCClient(auth_args, logger)
+        sess_reg = sess_reg or cloud.default_registry
+        self.conn = sess_reg.get_connection(auth_args)
+        self.pc_client = sess_reg.get_sfc_client(auth_args)
 
         self.name = name
         self.desc = desc
         self.srv_chain = srv_chain
         self.flow_conf = flow_conf
 
-    def create(self):
-        """Create port chain"""
-        logger.debug('Create port pairs and port pair groups for %s.'
-                     % self.name)
-        srv_ppgrp_lst = self.srv_chain.get_srv_ppgrp_id()
-        pp_grp_id_lst = list()
-        for grp_idx, pp_grp in enumerate(srv_ppgrp_lst):
-            pp_id_lst = list()
-            for pp_idx, pp in enumerate(pp_grp):
-                pp_args = {
-                    'name': 'pp_%s_%s' % (grp_idx, pp_idx),
-                    'description': '',
-                    'ingress': pp[0],
-                    'egress': pp[1]
-                }
-                self.pc_client.create('port_pair', pp_args)
-                pp_id = self.pc_client.get_id('port_pair', pp_args['name'])
-                pp_id_lst.append(pp_id)
-            pp_grp_args = {
-                'name': 'pp_grp_%s' % grp_idx,
-                'description': '',
-                'port_pairs': pp_id_lst
-            }
-            self.pc_client.create('port_pair_group', pp_grp_args)
-            pp_grp_id = self.pc_client.get_id('port_pair_group',
-                                              pp_grp_args['name'])
-            pp_grp_id_lst.append(pp_grp_id)
+        # Resource name -> IDs of created items, also of partial creations
+        self.rsc_id_map = {rsc: list() for rsc in
+                           ('port_chain', 'flow_classifier',
+                            'port_pair_group', 'port_pair')}
+        self._id_lock = threading.Lock()
+        # Remembered result of _get_chain_state after creation and update
+        self._chain_state = None
+        # Port pair group ID -> lb_fields
+        self._grp_lb_map = dict()
+        # Generation of the port chain, incremented by each update
+        self._gen = 0
+        self.journal = journal
+
+    def _record_id(self, rsc_name, id_lst):
+        with self._id_lock:
+            self.rsc_id_map[rsc_name].extend(id_lst)
+        if self.journal:
+            self.journal.add(rsc_name, id_lst)
+
+    def _forget_id(self, rsc_name, id_lst):
+        id_set = set(id_lst)
+        with self._id_lock:
+            self.rsc_id_map[rsc_name] = [
+                item_id for item_id in self.rsc_id_map[rsc_name]
+                if item_id not in id_set]
+        if self.journal:
+            self.journal.remove(rsc_name, id_lst)
+
+    def _get_gen_suffix(self):
+        if not self._gen:
+            return ''
+        return '_g%d' % self._gen
+
+    @staticmethod
+    def _get_name_gen(name):
+        """Get the generation from the name of a port pair or group"""
+        match = re.search(r'_g(\d+)$', name or '')
+        return int(match.group(1)) if match else 0
+
+    def _get_pp_name(self, grp_idx, pp_idx):
+        return '%s_pp_%s_%s%s' % (self.name, grp_idx, pp_idx,
+                                  self._get_gen_suffix())
+
+    def _get_pp_grp_name(self, grp_idx):
+        return '%s_pp_grp_%s%s' % (self.name, grp_idx, self._get_gen_suffix())
+
+    def _create_rsc(self, rsc_name, item_args):
+        """Create a SFC resource item and return its ID"""
+        item = self.pc_client.create(rsc_name, item_args)
+        if not item:
+            raise PortChainError('Failed to create %s: %s' %
+                                 (rsc_name, item_args['name']))
+        self._record_id(rsc_name, [item['id']])
+        return item['id']
+
+    def _create_rsc_bulk(self, rsc_name, item_args_lst):
+        """Create SFC resource items in one request and return their IDs"""
+        item_lst = self.pc_client.create_bulk(rsc_name, item_args_lst)
+        if item_lst is None:
+            raise PortChainError('Failed to create %d %s(s) in bulk' %
+                                 (len(item_args_lst), rsc_name))
+        id_lst = [item['id'] for item in item_lst]
+        self._record_id(rsc_name, id_lst)
+        return id_lst
+
+    def _create_pp(self, grp_idx, pp_grp, pp_key_map=None):
+        """Create missing port pairs of a group with one bulk request
+
+        :param pp_grp (list): A list of (ingress_port_id, egress_port_id)
+        :param pp_key_map (dict): (ingress, egress) -> ID of existing port
+                                  pairs, which are re-used
+        :return: IDs of port pairs in the group order
+        :retype: list
+        """
+        pp_key_map = pp_key_map or dict()
+        pp_args_lst = [{
+            'name': self._get_pp_name(grp_idx, pp_idx),
+            'description': '',
+            'ingress': pp[0],
+            'egress': pp[1]
+        } for pp_idx, pp in enumerate(pp_grp) if tuple(pp) not in pp_key_map]
+        pp_id_iter = iter(self._create_rsc_bulk('port_pair', pp_args_lst))
+        return [pp_key_map[tuple(pp)] if tuple(pp) in pp_key_map
+                else next(pp_id_iter) for pp in pp_grp]
+
+    def _create_pp_grp(self, grp_idx, pp_grp, grp_param=None,
+                       pp_key_map=None):
+        """Create port pairs of a group with one bulk request, then the group
+
+        :param pp_grp (list): A list of (ingress_port_id, egress_port_id)
+        :param grp_param (dict): Port pair group parameters, e.g. lb_fields
+        :param pp_key_map (dict): See _create_pp
+        :return: ID of the port pair group and IDs of its port pairs
+        :retype: tuple
+        """
+        pp_id_lst = self._create_pp(grp_idx, pp_grp, pp_key_map)
+        grp_args = {
+            'name': self._get_pp_grp_name(grp_idx),
+            'description': '',
+            'port_pairs': pp_id_lst
+        }
+        if grp_param:
+            grp_args['port_pair_group_parameters'] = grp_param
+        grp_id = self._create_rsc('port_pair_group', grp_args)
+        self._grp_lb_map[grp_id] = self._get_lb_fields(grp_param)
+        return grp_id, pp_id_lst
 
-        # Get logical src and dest port id
+    @staticmethod
+    def _get_lb_fields(grp_param):
+        """Get lb_fields of port pair group parameters, comparable"""
+        return tuple((grp_param or dict()).get('lb_fields', None) or ())
+
+    def _create_flow_classifier(self):
+        """Get logical source and destination port IDs and create the flow
+        classifier
+
+        MARK: self.flow_conf is not modified, so it can be compared with the
+        flow_conf of a update
+
+        :return: ID of the flow classifier
+        """
         src_pt = self.conn.network.find_port(
             self.flow_conf['logical_source_port']
         )
         dst_pt = self.conn.network.find_port(
             self.flow_conf['logical_destination_port']
         )
-        self.flow_conf['logical_source_port'] = src_pt.id
-        self.flow_conf['logical_destination_port'] = dst_pt.id
+        fc_args = dict(self.flow_conf)
+        fc_args['logical_source_port'] = src_pt.id
+        fc_args['logical_destination_port'] = dst_pt.id
         logger.debug('Create the flow classifier.')
-        self.pc_client.create('flow_classifier', self.flow_conf)
-        fc_id = self.pc_client.get_id(
-            'flow_classifier', self.flow_conf['name'])
+        return self._create_rsc('flow_classifier', fc_args)
+
+    def create(self, max_workers=8):
+        """Create port chain
+
+        Port pair groups are independent, each group is created on a worker
+        pool as soon as its port pairs are created with one bulk request. The
+        flow classifier is created in parallel. The port chain is created after
+        all of them, so the creation time follows the slowest group.
+
+        :param max_workers (int): Maximal number of concurrent requests
+        """
+        logger.debug('Create port pairs and port pair groups for %s.'
+                     % self.name)
+        srv_ppgrp_lst = self.srv_chain.get_srv_ppgrp_id()
+        grp_param_lst = self.srv_chain.get_srv_ppgrp_param()
+        with ThreadPoolExecutor(max_workers) as executor:
+            fc_future = executor.submit(
+                netsfc_clt.bind_captures(self._create_flow_classifier))
+            grp_future_lst = [
+                executor.submit(netsfc_clt.bind_captures(self._create_pp_grp),
+                                grp_idx, pp_grp, grp_param)
+                for grp_idx, (pp_grp, grp_param) in enumerate(
+                    zip(srv_ppgrp_lst, grp_param_lst))
+            ]
+            # MARK: The executor waits for all futures, errors are raised
+            # after all requests are finished
+        grp_lst = [future.result() for future in grp_future_lst]
+        fc_id = fc_future.result()
 
         pc_args = {
             'name': self.name,
             'description': self.desc,
-            'port_pair_groups': pp_grp_id_lst,
+            'port_pair_groups': [grp_id for grp_id, _ in grp_lst],
             'flow_classifiers': [fc_id]
         }
         logger.debug('Create the port chain: %s.' % self.name)
-        self.pc_client.create('port_chain', pc_args)
+        pc_args['id'] = self._create_rsc('port_chain', pc_args)
+        self._set_chain_state(pc_args, grp_lst, srv_ppgrp_lst)
+
+    def _set_chain_state(self, pc, grp_lst, srv_ppgrp_lst):
+        """Remember the port chain state, see _get_chain_state"""
+        pp_map = dict()
+        for (_, pp_id_lst), pp_grp in zip(grp_lst, srv_ppgrp_lst):
+            for pp_id, pp in zip(pp_id_lst, pp_grp):
+                pp_map[pp_id] = tuple(pp)
+        self._chain_state = (pc, grp_lst, pp_map)
+
+    def _get_chain_state(self):
+        """Get the port chain and its port pair groups and port pairs
+
+        The remembered state is used if the port chain is created or updated
+        by this object.
+
+        :return: The port chain item, a list of (group ID, list of port pair
+                 IDs) in the chain order and a dict of port pair ID ->
+                 (ingress, egress), None if the port chain does not exist
+        :retype: tuple
+        """
+        if self._chain_state:
+            return self._chain_state
+        pc = self.pc_client.find('port_chain', self.name)
+        if not pc:
+            return None
+        grp_item_lst = self.pc_client.list(
+            'port_pair_group', filters={'id': pc['port_pair_groups']},
+            fields=['id', 'name', 'port_pairs', 'port_pair_group_parameters']
+        ) if pc['port_pair_groups'] else list()
+        grp_map = dict()
+        for grp in grp_item_lst:
+            grp_map[grp['id']] = grp['port_pairs']
+            self._grp_lb_map[grp['id']] = self._get_lb_fields(
+                grp.get('port_pair_group_parameters', None))
+        grp_lst = [(grp_id, grp_map[grp_id])
+                   for grp_id in pc['port_pair_groups']]
+        pp_id_lst = [pp_id for _, pp_ids in grp_lst for pp_id in pp_ids]
+        pp_item_lst = self.pc_client.list(
+            'port_pair', filters={'id': pp_id_lst},
+            fields=['id', 'name', 'ingress', 'egress']
+        ) if pp_id_lst else list()
+        pp_map = {pp['id']: (pp['ingress'], pp['egress'])
+                  for pp in pp_item_lst}
+        # MARK: Continue with the latest generation of existing items
+        self._gen = max([self._gen] + [
+            self._get_name_gen(item.get('name', None))
+            for item in grp_item_lst + pp_item_lst])
+        return pc, grp_lst, pp_map
+
+    def _record_chain_state(self, chain_state):
+        """Record IDs of a port chain not created by this object"""
+        pc, grp_lst, pp_map = chain_state
+        self._record_id('port_chain', [pc['id']])
+        self._record_id('flow_classifier', pc['flow_classifiers'])
+        self._record_id('port_pair_group', [grp_id for grp_id, _ in grp_lst])
+        self._record_id('port_pair', list(pp_map.keys()))
+
+    def _update_pp_grp(self, grp_idx, grp_id, pp_grp, pp_key_map):
+        """Update the port pairs of a existing port pair group
+
+        :param pp_key_map (dict): See _create_pp
+        """
+        pp_id_lst = self._create_pp(grp_idx, pp_grp, pp_key_map)
+        if not self.pc_client.update('port_pair_group', grp_id,
+                                     {'port_pairs': pp_id_lst}):
+            raise PortChainError('Failed to update port_pair_group: %s' %
+                                 grp_id)
+        return grp_id, pp_id_lst
+
+    @staticmethod
+    def _match_old_grp(pp_grp, old_grp_lst, pp_map, used_grp):
+        """Get the not used old group sharing most port pairs with a group
+
+        :return: (group ID, list of port pair IDs), None if no old group
+                 shares port pairs with the group
+        """
+        pp_key_set = set(tuple(pp) for pp in pp_grp)
+        best_grp, best_num = None, 0
+        for grp_id, pp_ids in old_grp_lst:
+            if grp_id in used_grp:
+                continue
+            share_num = len(pp_key_set & set(pp_map[pp_id]
+                                             for pp_id in pp_ids))
+            if share_num > best_num:
+                best_grp, best_num = (grp_id, pp_ids), share_num
+        return best_grp
+
+    def _plan_update(self, old_grp_lst, pp_map, new_ppgrp_lst,
+                     grp_param_lst):
+        """Match new port pair groups with old groups by shared port pairs
+
+        :return: A list of (operation, group index, port pairs, old group) in
+                 the chain order, operation is add, update or keep
+        :retype: list
+        """
+        used_grp = set()
+        grp_plan = list()
+        for grp_idx, pp_grp in enumerate(new_ppgrp_lst):
+            old_grp = self._match_old_grp(pp_grp, old_grp_lst, pp_map,
+                                          used_grp)
+            if not old_grp:
+                grp_plan.append(('add', grp_idx, pp_grp, None))
+                continue
+            lb_fields = self._get_lb_fields(grp_param_lst[grp_idx])
+            if self._grp_lb_map.get(old_grp[0], ()) != lb_fields:
+                raise PortChainError(
+                    'Can not change lb_fields of port pair group: %s' %
+                    old_grp[0])
+            used_grp.add(old_grp[0])
+            old_key_lst = [pp_map[pp_id] for pp_id in old_grp[1]]
+            if old_key_lst == [tuple(pp) for pp in pp_grp]:
+                grp_plan.append(('keep', grp_idx, pp_grp, old_grp))
+            else:
+                grp_plan.append(('update', grp_idx, pp_grp, old_grp))
+        return grp_plan
 
-    def delete(self):
-        """Delete the port chain"""
-        logger.debug('Delete the port chain: %s' % self.name)
-        # Delete port chain
-        self.pc_client.delete('port_chain', self.name)
+    def _detach_moved_pp(self, old_grp_lst, pp_map, grp_plan):
+        """Remove port pairs moved to other groups from their old groups
 
-        logger.debug('Delete the flow classifier.')
-        self.pc_client.delete('flow_classifier', self.flow_conf['name'])
+        MARK: A port pair can only be in one port pair group, so moved port
+        pairs are detached before any group is created or updated. Port pairs
+        to be deleted are kept until their group is updated or deleted.
+        """
+        # Port pair key -> ID of the old group re-used by its new group
+        new_grp_map = {
+            tuple(pp): old_grp[0] if old_grp else None
+            for _, _, pp_grp, old_grp in grp_plan for pp in pp_grp
+        }
+        for grp_id, pp_ids in old_grp_lst:
+            remain_lst = [pp_id for pp_id in pp_ids
+                          if new_grp_map.get(pp_map[pp_id], grp_id) == grp_id]
+            if len(remain_lst) == len(pp_ids):
+                continue
+            logger.debug('Detach %d moved port pair(s) from group: %s',
+                         len(pp_ids) - len(remain_lst), grp_id)
+            if not self.pc_client.update('port_pair_group', grp_id,
+                                         {'port_pairs': remain_lst}):
+                raise PortChainError('Failed to update port_pair_group: %s'
+                                     % grp_id)
+
+    def _apply_update(self, grp_plan, grp_param_lst, pp_key_map,
+                      flow_conf_changed, max_workers):
+        """Create and update port pair groups and the flow classifier
+
+        :param pp_key_map (dict): (ingress, egress) -> ID of all old port pairs
+        :return: A list of (group ID, list of port pair IDs) in the chain order
+                 and the ID of the new flow classifier, None if not changed
+        :retype: tuple
+        """
+        fc_future = None
+        future_lst = list()
+        with ThreadPoolExecutor(max_workers) as executor:
+            if flow_conf_changed:
+                fc_future = executor.submit(
+                    netsfc_clt.bind_captures(self._create_flow_classifier))
+            for opt, grp_idx, pp_grp, old_grp in grp_plan:
+                if opt == 'add':
+                    future_lst.append(executor.submit(
+                        netsfc_clt.bind_captures(self._create_pp_grp),
+                        grp_idx, pp_grp, grp_param_lst[grp_idx], pp_key_map))
+                elif opt == 'update':
+                    future_lst.append(executor.submit(
+                        netsfc_clt.bind_captures(self._update_pp_grp),
+                        grp_idx, old_grp[0], pp_grp, pp_key_map))
+                else:
+                    future_lst.append(None)
+        grp_lst = [
+            future.result() if future else plan[3]
+            for future, plan in zip(future_lst, grp_plan)
+        ]
+        return grp_lst, fc_future.result() if fc_future else None
+
+    def _delete_ids(self, id_map, max_workers=8):
+        """Delete items by ID in the order of RSC_DEL_ORDER
+
+        Items of the same step are deleted concurrently. IDs of failed
+        deletions are kept in rsc_id_map and the journal for a retry.
+
+        :param id_map (dict): Resource name -> list of item IDs
+        :param max_workers (int): Maximal number of concurrent requests
+        :return: Resource name -> list of deleted item IDs
+        :retype: dict
+        """
+        delete_by_id = netsfc_clt.bind_captures(self.pc_client.delete_by_id)
+        del_map = {rsc_name: list() for rsc_lst in self.RSC_DEL_ORDER
+                   for rsc_name in rsc_lst}
+        with ThreadPoolExecutor(max_workers) as executor:
+            for rsc_lst in self.RSC_DEL_ORDER:
+                future_map = {
+                    executor.submit(delete_by_id,
+                                    rsc_name, item_id): (rsc_name, item_id)
+                    for rsc_name in rsc_lst
+                    for item_id in list(id_map.get(rsc_name, ()))
+                }
+                # Wait for the current step
+                for future, (rsc_name, item_id) in future_map.items():
+                    if future.result():
+                        del_map[rsc_name].append(item_id)
+                    else:
+                        logger.error('Failed to delete %s: %s',
+                                     rsc_name, item_id)
+                for rsc_name in rsc_lst:
+                    self._forget_id(rsc_name, del_map[rsc_name])
+        return del_map
 
-        # Delete all port pair groups
-        logger.debug('Delete port pair groups and port pairs for %s'
-                     % self.name)
-        srv_ppgrp_lst = self.srv_chain.get_srv_ppgrp_id()
-        for grp_idx in range(len(srv_ppgrp_lst)):
-            pp_grp_name = 'pp_grp_%s' % grp_idx
-            self.pc_client.delete('port_pair_group', pp_grp_name)
+    def _cleanup_update(self, pc, old_grp_lst, pp_map, grp_plan,
+                        flow_conf_changed, max_workers=8):
+        """Delete orphaned groups, port pairs and the old flow classifier
+
+        Items failed to be deleted are kept in rsc_id_map, they are deleted
+        together with the port chain.
+
+        :return: Number of deleted port pair groups
+        :retype: int
+        """
+        used_grp = set(old_grp[0] for _, _, _, old_grp in grp_plan
+                       if old_grp)
+        orphan_grp_lst = [grp_id for grp_id, _ in old_grp_lst
+                          if grp_id not in used_grp]
+        new_key_set = set(tuple(pp) for _, _, pp_grp, _ in grp_plan
+                          for pp in pp_grp)
+        orphan_pp_lst = [pp_id for pp_id, key in pp_map.items()
+                         if key not in new_key_set]
+        id_map = {
+            'port_pair_group': orphan_grp_lst,
+            'port_pair': orphan_pp_lst,
+            'flow_classifier': (pc['flow_classifiers'] if flow_conf_changed
+                                else list())
+        }
+        del_map = self._delete_ids(id_map, max_workers)
+        for grp_id in del_map['port_pair_group']:
+            self._grp_lb_map.pop(grp_id, None)
+        return len(del_map['port_pair_group'])
+
+    def update(self, srv_chain=None, flow_conf=None, max_workers=8):
+        """Update port pair groups and the flow classifier of the port chain
+
+        The port chain is modified in place with one update request, traffic
+        is steered by the old groups until then:
+
+            - Groups with unchanged port pairs are re-used.
+            - A changed group is updated if it shares port pairs with a old
+              group, otherwise a new group is created.
+            - Port pairs are re-used by their ingress and egress ports, also
+              if they are moved to another group.
+            - lb_fields of a existing group can not be changed, since
+              port_pair_group_parameters are immutable in networking-sfc.
+            - The flow classifier is only replaced if flow_conf is changed.
+            - Orphaned groups, port pairs and the flow classifier are deleted
+              after the port chain is updated.
+
+        :param srv_chain (ServerChain): The server chain with updated server
+                                        groups, e.g. after reordering
+        :param flow_conf (dict): New flow classifier conf
+        :return: Number of added, updated, kept and removed groups and if the
+                 flow classifier is replaced
+        :retype: dict
+        """
+        if srv_chain:
+            self.srv_chain = srv_chain
+        adopt = self._chain_state is None
+        chain_state = self._get_chain_state()
+        if not chain_state:
+            raise PortChainError('Can not find port chain with name: %s' %
+                                 self.name)
+        if adopt:
+            # MARK: Not created by this object, remember all IDs for delete
+            self._record_chain_state(chain_state)
+        pc, old_grp_lst, pp_map = chain_state
+        new_ppgrp_lst = self.srv_chain.get_srv_ppgrp_id()
+        grp_param_lst = self.srv_chain.get_srv_ppgrp_param()
+        grp_plan = self._plan_update(old_grp_lst, pp_map, new_ppgrp_lst,
+                                     grp_param_lst)
+
+        flow_conf_changed = flow_conf is not None and \
+            flow_conf != self.flow_conf
+        if flow_conf_changed:
+            self.flow_conf = flow_conf
+        # New port pairs and groups are named with the next generation
+        self._gen += 1
+        self._detach_moved_pp(old_grp_lst, pp_map, grp_plan)
+        grp_lst, fc_id = self._apply_update(
+            grp_plan, grp_param_lst,
+            {key: pp_id for pp_id, key in pp_map.items()},
+            flow_conf_changed, max_workers)
+        pp_grp_id_lst = [grp_id for grp_id, _ in grp_lst]
+
+        pc_args = dict()
+        if pp_grp_id_lst != pc['port_pair_groups']:
+            pc_args['port_pair_groups'] = pp_grp_id_lst
+        if flow_conf_changed:
+            pc_args['flow_classifiers'] = [fc_id]
+        if pc_args:
+            logger.debug('Update the port chain: %s, %s', self.name,
+                         ', '.join(pc_args.keys()))
+            if not self.pc_client.update('port_chain', pc['id'], pc_args):
+                raise PortChainError('Failed to update port chain: %s' %
+                                     self.name)
+        self._set_chain_state(dict(pc, **pc_args), grp_lst, new_ppgrp_lst)
+        remove_num = self._cleanup_update(pc, old_grp_lst, pp_map, grp_plan,
+                                          flow_conf_changed, max_workers)
+
+        plan_opt_lst = [plan[0] for plan in grp_plan]
+        return {
+            'add': plan_opt_lst.count('add'),
+            'update': plan_opt_lst.count('update'),
+            'keep': plan_opt_lst.count('keep'),
+            'remove': remove_num,
+            'flow_classifier': flow_conf_changed
+        }
+
+    def delete(self, max_workers=8):
+        """Delete the port chain
+
+        IDs of items failed to be deleted are kept in rsc_id_map and the
+        journal, so the deletion can be retried.
+
+        :param max_workers (int): Maximal number of concurrent requests
+        """
+        logger.debug('Delete the port chain: %s' % self.name)
+        if not any(self.rsc_id_map.values()):
+            # MARK: Not created by this object, follow the port chain
+            chain_state = self._get_chain_state()
+            if not chain_state:
+                raise PortChainError('Can not find port chain with name: %s'
+                                     % self.name)
+            self._record_chain_state(chain_state)
 
-        # Delete all port pairs
-        for grp_idx, pp_grp in enumerate(srv_ppgrp_lst):
-            for pp_idx in range(len(pp_grp)):
-                pp_name = 'pp_%s_%s' % (grp_idx, pp_idx)
-                self.pc_client.delete('port_pair', pp_name)
+        self._delete_ids(self.rsc_id_map, max_workers)
+        self._chain_state = None
+        self._grp_lb_map = dict()
 
 
 class SFC(object):
 
     """Service Function Chain"""
 
-    def __init__(self, name, desc, srv_chn, port_chn):
+    def __init__(self, name, desc, srv_chn, port_chn, journal=None):
         self.name = name
         self.desc = desc
         self.srv_chn = srv_chn
         self.port_chn = port_chn
+        self.journal = journal
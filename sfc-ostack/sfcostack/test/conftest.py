@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+
+"""
+About: Shared fakes and fixtures for tests
+"""
+
+import itertools
+import types
+import unittest.mock
+
+import pytest
+from keystoneauth1 import exceptions as ks_exc
+
+from context import sfc
+from sfc import netsfc_clt, resource
+
+NET_CONF = {'pubnet_name': 'public', 'net_name': 'net1',
+            'subnet_name': 'subnet1'}
+
+AUTH_ARGS = {
+    'auth_url': 'http://127.0.0.1/identity/v3',
+    'project_name': 'admin',
+    'project_domain_name': 'default',
+    'username': 'admin',
+    'user_domain_name': 'default',
+    'password': 'stack'
+}
+
+
+class FakeResponse(object):
+
+    def __init__(self, body):
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+class FakeNeutron(object):
+
+    """Fake keystoneauth adapter serving networking-sfc collections
+
+    Like networking-sfc, port pairs with the same ingress and egress ports,
+    port pairs in multiple groups and deleting port pairs in use are
+    rejected.
+    """
+
+    def __init__(self, *args, **kargs):
+        self.rsc = {para.url: para for para in
+                    netsfc_clt.SFCClient.rsc_dict.values()}
+        self.items = {url: list() for url in self.rsc}
+        self.req_lst = list()
+        self._id_gen = itertools.count()
+
+    def get_user_id(self):
+        return 'user'
+
+    def get_project_id(self):
+        return 'project'
+
+    def get_endpoint(self):
+        return 'http://127.0.0.1:9696/v2.0'
+
+    def get(self, url, params=None, **kargs):
+        self.req_lst.append(('GET', url))
+        para = self.rsc[url]
+        params = dict(params or {})
+        fields = params.pop('fields', None)
+        limit = params.pop('limit', None)
+        marker = params.pop('marker', None)
+        item_lst = [item for item in self.items[url]
+                    if all(item.get(key) in value if isinstance(value, list)
+                           else item.get(key) == value
+                           for key, value in params.items())]
+        if marker:
+            marker_idx = [item['id'] for item in item_lst].index(marker)
+            item_lst = item_lst[marker_idx + 1:]
+        if limit:
+            item_lst = item_lst[:limit]
+        if fields:
+            item_lst = [{key: item[key] for key in fields if key in item}
+                        for item in item_lst]
+        return FakeResponse({para.plural_name: item_lst})
+
+    def post(self, url, json, **kargs):
+        self.req_lst.append(('POST', url))
+        para = self.rsc[url]
+        if para.plural_name in json:
+            return FakeResponse({para.plural_name: [
+                self._add_item(url, args) for args in json[para.plural_name]
+            ]})
+        return FakeResponse({para.name: self._add_item(url, json[para.name])})
+
+    def _check_item(self, url, item_id, item_args):
+        para = self.rsc[url]
+        other_lst = [item for item in self.items[url] if item['id'] != item_id]
+        if para.name == 'port_pair':
+            key = (item_args.get('ingress'), item_args.get('egress'))
+            if None in key:
+                return
+            if any((item.get('ingress'), item.get('egress')) == key
+                   for item in other_lst):
+                raise ks_exc.Conflict('PortPairIngressEgressInUse')
+        elif para.name == 'port_pair_group':
+            used_pp = set(pp_id for item in other_lst
+                          for pp_id in item.get('port_pairs', ()))
+            if used_pp & set(item_args.get('port_pairs', ())):
+                raise ks_exc.Conflict('PortPairInUse')
+
+    def _add_item(self, url, item_args):
+        self._check_item(url, None, item_args)
+        item = dict(item_args)
+        item['id'] = 'id-%d' % next(self._id_gen)
+        self.items[url].append(item)
+        return item
+
+    def put(self, url, json, **kargs):
+        self.req_lst.append(('PUT', url))
+        rsc_url, item_id = url.rsplit('/', 1)
+        para = self.rsc[rsc_url]
+        for item in self.items[rsc_url]:
+            if item['id'] == item_id:
+                self._check_item(rsc_url, item_id, json[para.name])
+                item.update(json[para.name])
+                return FakeResponse({para.name: item})
+
+    def delete(self, url, **kargs):
+        self.req_lst.append(('DELETE', url))
+        rsc_url, item_id = url.rsplit('/', 1)
+        if self.rsc[rsc_url].name == 'port_pair':
+            grp_url = netsfc_clt.SFCClient.rsc_dict['port_pair_group'].url
+            if any(item_id in item.get('port_pairs', ())
+                   for item in self.items[grp_url]):
+                raise ks_exc.Conflict('PortPairInUse')
+        self.items[rsc_url] = [item for item in self.items[rsc_url]
+                               if item['id'] != item_id]
+        return FakeResponse(None)
+
+    def count(self, method):
+        return len([req for req in self.req_lst if req[0] == method])
+
+
+class FakeNetwork(object):
+
+    """Fake network proxy of a openstacksdk connection"""
+
+    def __init__(self):
+        self.port_lst = list()
+        self.fip_lst = list()
+        self.req_lst = list()
+
+    def ports(self, **query):
+        self.req_lst.append(('ports', query))
+        return iter(list(self.port_lst))
+
+    def ips(self, **query):
+        self.req_lst.append(('ips', query))
+        return iter(list(self.fip_lst))
+
+    def count(self, method):
+        return len([req for req in self.req_lst if req[0] == method])
+
+
+def get_sfc_client():
+    """Get a SFCClient served by a FakeNeutron"""
+    with unittest.mock.patch.object(netsfc_clt.adapter, 'Adapter',
+                                    FakeNeutron), \
+            unittest.mock.patch.object(netsfc_clt.SFCClient,
+                                       '_construct_session'):
+        return netsfc_clt.SFCClient(AUTH_ARGS)
+
+
+@pytest.fixture
+def sfc_clt():
+    return get_sfc_client()
+
+
+def get_srv(name):
+    return {'name': name, 'image': 'ubuntu-cloud', 'flavor': 'm.test'}
+
+
+def get_srv_chn(srv_grp_lst, sep_access_port=True, fip_port='pt'):
+    sess_reg = unittest.mock.MagicMock()
+    conn = sess_reg.get_connection.return_value
+    conn.network.find_network.return_value.id = 'net_id'
+    conn.network.find_subnet.return_value.id = 'subnet_id'
+    return resource.ServerChain({}, 'test_srv_chn', '', NET_CONF,
+                                srv_grp_lst, sep_access_port, fip_port,
+                                sess_reg=sess_reg)
+
+
+def get_srv_ports(srv_name_lst, chn_name='test_srv_chn'):
+    """Get fake ingress and egress ports of servers"""
+    return [types.SimpleNamespace(id=name + '_id',
+                                  name='%s_%s' % (chn_name, name))
+            for srv_name in srv_name_lst
+            for name in (srv_name + '_pt_in', srv_name + '_pt_out')]
+
+
+def get_port_chn(srv_chn):
+    sess_reg = unittest.mock.MagicMock()
+    pc_client = sess_reg.get_sfc_client.return_value
+    pc_client.create.side_effect = lambda rsc, args: {
+        'id': '%s_id' % args['name'], 'name': args['name']}
+    pc_client.create_bulk.side_effect = lambda rsc, args_lst: [
+        {'id': '%s_id' % args['name'], 'name': args['name']}
+        for args in args_lst]
+    flow_conf = {'name': 'fc', 'logical_source_port': 'src',
+                 'logical_destination_port': 'dst'}
+    return resource.PortChain({}, 'pc', '', srv_chn, flow_conf,
+                              sess_reg=sess_reg)
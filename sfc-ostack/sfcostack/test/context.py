@@ -14,5 +14,7 @@ import sys
 sys.path.insert(0, os.path.abspath(
     os.path.join(os.path.dirname(__file__), '..')))
 
+import cloud
 import conf
+import dev
 import sfc
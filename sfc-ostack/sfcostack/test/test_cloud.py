@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+
+"""
+About: Unit test for sfc-ostack.cloud
+"""
+
+from addict import Dict as ADict
+
+from conftest import AUTH_ARGS
+from context import cloud
+
+
+def test_session_registry():
+    sess_reg = cloud.SessionRegistry()
+    sess = sess_reg.get_session(AUTH_ARGS)
+    assert sess_reg.get_session(ADict(AUTH_ARGS)) is sess
+
+    other_args = dict(AUTH_ARGS, project_name='demo')
+    assert sess_reg.get_session(other_args) is not sess
+
+    sess_reg.clear()
+    assert sess_reg.get_session(AUTH_ARGS) is not sess
@@ -8,6 +8,9 @@ About: Unit test for sfc-ostack.conf
 
 import os
 
+import pytest
+import yaml
+
 from context import conf
 
 conf_sample_path = os.path.join(
@@ -35,3 +38,23 @@ def test_SFCConf():
     assert sfc_conf.sfc_mgr_conf.typ == 'static'
     assert sfc_conf.sfc_mgr_conf.mgr_ip == '192.168.0.1'
     assert sfc_conf.sfc_mgr_conf.mgr_port == 6666
+
+
+def test_SFCConf_srv_grp():
+    """Test server groups of the server chain"""
+    with open(conf_sample_path, 'r') as conf_file:
+        conf_dict = yaml.safe_load(conf_file)
+    srv_chn_conf = conf_dict['SFC']['server_chain']
+    srv_chn_conf['sf3'] = dict(srv_chn_conf['sf2'], lb_fields='ip_src&ip_dst')
+    sfc_conf = conf.SFCConf(conf_dict)
+    srv_chn = sfc_conf.server_chain
+    assert [[srv['name'] for srv in srv_grp] for srv_grp in srv_chn] == [
+        ['sf1'], ['sf2', 'sf3']]
+    # lb_fields is shared by all servers of the group
+    assert srv_chn[1][0]['lb_fields'] == ['ip_src', 'ip_dst']
+    assert 'lb_fields' not in srv_chn[0][0]
+
+    srv_chn_conf['sf3']['lb_fields'] = ['udp_src']
+    srv_chn_conf['sf2']['lb_fields'] = ['ip_src']
+    with pytest.raises(conf.ConfigError):
+        conf.SFCConf(conf_dict)
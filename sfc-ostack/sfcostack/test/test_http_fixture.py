@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+
+"""
+About: Unit test for sfc-ostack.dev.http_fixture
+"""
+
+import json
+import unittest.mock
+
+import pytest
+import requests
+from keystoneauth1 import session
+from keystoneauth1.identity import v3
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from context import dev
+from dev import http_fixture
+
+
+def _write_fixture(path, record_lst):
+    with open(path, 'w+') as fixture_file:
+        for record in record_lst:
+            fixture_file.write(json.dumps(record) + '\n')
+
+
+def _record(method, url, status, body):
+    return {
+        'method': method, 'url': url, 'body': '', 'status': status,
+        'reason': 'OK', 'headers': {'Content-Type': 'application/json'},
+        'content': {'text': json.dumps(body)}, 'latency': 0.5
+    }
+
+
+def test_replay(tmpdir):
+    path = str(tmpdir.join('fixture.jsonl'))
+    url = 'http://127.0.0.1:8004/v1/stacks?name=sc&type=x'
+    _write_fixture(path, [
+        _record('GET', url, 200, {'status': 'CREATE_IN_PROGRESS'}),
+        _record('GET', url, 200, {'status': 'CREATE_COMPLETE'})
+    ])
+    http_sess = requests.Session()
+    http_sess.mount('http://', http_fixture.ReplayAdapter(path, latency=0))
+
+    # Query parameters are normalized
+    url = 'http://127.0.0.1:8004/v1/stacks?type=x&name=sc'
+    assert http_sess.get(url).json()['status'] == 'CREATE_IN_PROGRESS'
+    assert http_sess.get(url).json()['status'] == 'CREATE_COMPLETE'
+    # The last response is repeated
+    assert http_sess.get(url).json()['status'] == 'CREATE_COMPLETE'
+
+    with pytest.raises(http_fixture.FixtureError):
+        http_sess.get('http://127.0.0.1:8004/v1/stacks')
+
+
+def test_replay_expired_token(tmpdir):
+    path = str(tmpdir.join('fixture.jsonl'))
+    auth_url = 'http://127.0.0.1/identity/v3'
+    token_rec = _record('POST', auth_url + '/auth/tokens', 201, {'token': {
+        'expires_at': '2018-01-01T00:00:00.000000Z',
+        'issued_at': '2018-01-01T00:00:00.000000Z',
+        'methods': ['password'],
+        'user': {'id': 'user', 'name': 'admin',
+                 'domain': {'id': 'default', 'name': 'Default'}},
+        'project': {'id': 'project', 'name': 'admin',
+                    'domain': {'id': 'default', 'name': 'Default'}},
+        'catalog': []
+    }})
+    token_rec['headers']['X-Subject-Token'] = 'token'
+    url = 'http://127.0.0.1:9696/v2.0/sfc/port_pairs'
+    _write_fixture(path, [token_rec,
+                          _record('GET', url, 200, {'port_pairs': []})])
+
+    adapter = http_fixture.ReplayAdapter(path, latency=0)
+    send = adapter.send
+    req_lst = list()
+
+    def count_send(request, **kargs):
+        req_lst.append(request.method)
+        return send(request, **kargs)
+
+    adapter.send = count_send
+    http_sess = requests.Session()
+    http_sess.mount('http://', adapter)
+    auth = v3.Password(auth_url=auth_url, username='admin', password='stack',
+                       project_name='admin', user_domain_name='default',
+                       project_domain_name='default')
+    sess = session.Session(auth=auth, session=http_sess)
+    for _ in range(3):
+        assert sess.get(url).json() == {'port_pairs': []}
+    # The recorded token is only requested once
+    assert req_lst == ['POST', 'GET', 'GET', 'GET']
+
+
+def test_record_scrub_token(tmpdir):
+    path = str(tmpdir.join('fixture.jsonl'))
+    resp = requests.Response()
+    resp.status_code = 201
+    resp.reason = 'Created'
+    resp.headers = CaseInsensitiveDict({
+        'Content-Type': 'application/json',
+        'x-subject-token': 'secret-subject-token',
+        'X-Auth-Token': 'secret-auth-token'})
+    resp._content = json.dumps({'token': {'methods': ['password']}}).encode()
+
+    http_sess = requests.Session()
+    http_sess.mount('http://', http_fixture.RecordAdapter(path))
+    with unittest.mock.patch.object(HTTPAdapter, 'send', return_value=resp):
+        http_sess.post('http://127.0.0.1/identity/v3/auth/tokens',
+                       json={'auth': {}})
+
+    with open(path, 'r') as fixture_file:
+        fixture = fixture_file.read()
+    assert 'secret' not in fixture
+    headers = CaseInsensitiveDict(json.loads(fixture)['headers'])
+    assert headers['X-Subject-Token'] == http_fixture.TOKEN_PLACEHOLDER
+    assert headers['X-Auth-Token'] == http_fixture.TOKEN_PLACEHOLDER
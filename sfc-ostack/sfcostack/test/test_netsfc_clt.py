@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+
+"""
+About: Unit test for sfc-ostack.sfc.netsfc_clt
+"""
+
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import AUTH_ARGS
+from context import sfc
+from sfc import netsfc_clt
+
+
+def test_name_index(sfc_clt):
+    neutron = sfc_clt._httpclient
+    sfc_clt.list('port_pair')
+    for idx in range(10):
+        sfc_clt.create('port_pair', {'name': 'pp_0_%d' % idx})
+        sfc_clt.get_id('port_pair', 'pp_0_%d' % idx)
+    # Only the first lookup lists the collection
+    assert neutron.count('GET') == 1
+
+    sfc_clt.delete('port_pair', 'pp_0_0')
+    assert sfc_clt.find('port_pair', 'pp_0_0') is None
+    assert neutron.count('GET') == 1
+
+    sfc_clt.invalidate('port_pair')
+    assert sfc_clt.find('port_pair', 'pp_0_1')['id'] == 'id-1'
+    assert neutron.count('GET') == 2
+
+
+def test_filtered_lookup(sfc_clt):
+    for idx in range(3):
+        sfc_clt.create('port_pair', {'name': 'pp_0_%d' % idx,
+                                     'ingress': 'in-%d' % idx})
+    item = sfc_clt.find('port_pair', 'pp_0_2', fields=['id', 'name'])
+    assert item == {'id': 'id-2', 'name': 'pp_0_2'}
+    assert sfc_clt.find_by_id('port_pair', 'id-1')['ingress'] == 'in-1'
+    assert sfc_clt.find('port_pair', 'pp_1_0') is None
+    with pytest.raises(netsfc_clt.SFCClientException):
+        sfc_clt.get_id('port_pair', 'pp_1_0')
+
+    item_lst = sfc_clt.list('port_pair', fields=['id'])
+    assert item_lst == [{'id': 'id-%d' % idx} for idx in range(3)]
+
+
+def test_name_index_ttl(sfc_clt):
+    neutron = sfc_clt._httpclient
+    sfc_clt.cache_ttl = 0
+    sfc_clt.create('port_pair', {'name': 'pp_0_0'})
+    sfc_clt.get_id('port_pair', 'pp_0_0')
+    sfc_clt.get_id('port_pair', 'pp_0_0')
+    assert neutron.count('GET') == 2
+
+
+def test_create_return(sfc_clt):
+    neutron = sfc_clt._httpclient
+    item = sfc_clt.create('port_pair', {'name': 'pp_0_0', 'ingress': 'in'})
+    assert item['id'] == 'id-0'
+    assert item['ingress'] == 'in'
+    assert neutron.count('GET') == 0
+
+
+def test_create_bulk(sfc_clt):
+    neutron = sfc_clt._httpclient
+    item_lst = sfc_clt.create_bulk(
+        'port_pair', [{'name': 'pp_0_%d' % idx} for idx in range(5)])
+    assert [item['name'] for item in item_lst] == \
+        ['pp_0_%d' % idx for idx in range(5)]
+    assert neutron.count('POST') == 1
+    assert sfc_clt.create_bulk('port_pair', []) == []
+    assert neutron.count('POST') == 1
+
+
+def test_async_client(sfc_clt):
+    async_clt = netsfc_clt.AsyncSFCClient(AUTH_ARGS, max_concurrency=4,
+                                          sfc_client=sfc_clt)
+
+    async def create_all():
+        return await asyncio.gather(*[
+            async_clt.create('port_pair', {'name': 'pp_%d_0' % idx})
+            for idx in range(8)
+        ])
+
+    item_lst = asyncio.run(create_all())
+    async_clt.close()
+    assert sorted(item['name'] for item in item_lst) == \
+        sorted('pp_%d_0' % idx for idx in range(8))
+    assert len(sfc_clt.list('port_pair')) == 8
+
+
+def test_wait_many(sfc_clt):
+    neutron = sfc_clt._httpclient
+    sfc_clt.create_bulk('port_pair', [{'name': 'pp_0_0'}, {'name': 'pp_1_0'}])
+    sfc_clt.create('port_pair_group', {'name': 'pp_grp_0'})
+    targets = [('port_pair', 'pp_0_0', 'create'),
+               ('port_pair', 'pp_1_0', 'create'),
+               ('port_pair_group', 'pp_grp_0', 'create'),
+               ('port_chain', 'pc', 'delete')]
+    latency = sfc_clt.wait_many(targets, timeout=1)
+    assert set(latency) == set(targets)
+    # One listing per resource
+    assert neutron.count('GET') == 3
+
+    with pytest.raises(netsfc_clt.RscOptTimeout):
+        sfc_clt.wait('port_chain', 'pc', 'create', 0.05, 0.2)
+    with pytest.raises(RuntimeError):
+        sfc_clt.wait('port_chain', 'pc', 'update', 0.05, 0.2)
+
+
+def test_iter_list(sfc_clt):
+    neutron = sfc_clt._httpclient
+    sfc_clt.create_bulk('port_pair',
+                        [{'name': 'pp_%d_0' % idx} for idx in range(25)])
+    item_lst = list(sfc_clt.iter_list('port_pair', fields=['name'],
+                                      page_size=10))
+    assert [item['name'] for item in item_lst] == \
+        ['pp_%d_0' % idx for idx in range(25)]
+    assert neutron.count('GET') == 3
+
+    # Stop early after the first page
+    item_iter = sfc_clt.iter_list('port_pair', page_size=10)
+    assert next(item_iter)['name'] == 'pp_0_0'
+    assert neutron.count('GET') == 4
+
+
+def test_iter_list_no_pagination(sfc_clt):
+    neutron = sfc_clt._httpclient
+    sfc_clt.create_bulk('port_pair',
+                        [{'name': 'pp_%d_0' % idx} for idx in range(10)])
+    get = neutron.get
+    # Limit and marker are ignored
+    neutron.get = lambda url, params=None, **kargs: get(url, **kargs)
+    assert len(list(sfc_clt.iter_list('port_pair', page_size=10))) == 10
+    assert neutron.count('GET') == 2
+    assert len(list(sfc_clt.iter_list('port_pair', page_size=4))) == 10
+    assert neutron.count('GET') == 3
+
+
+def test_req_stats(sfc_clt):
+    sfc_clt.create('port_pair', {'name': 'pp_0_0'})
+    with sfc_clt.capture() as stats:
+        sfc_clt.create_bulk('port_pair', [{'name': 'pp_1_0'}])
+        sfc_clt.list('port_pair')
+        sfc_clt.delete('port_pair', 'pp_0_0')
+    sfc_clt.list('port_pair_group')
+
+    report = json.loads(stats.to_json())
+    assert report['count'] == 3
+    assert set(report['requests']) == {'port_pair POST', 'port_pair GET',
+                                       'port_pair DELETE'}
+    assert sum(report['requests']['port_pair GET']['hist']) == 1
+    assert sfc_clt.stats.report()['count'] == 5
+
+
+def test_req_stats_per_thread(sfc_clt):
+    barrier = threading.Barrier(2)
+
+    def create_pp(name):
+        with sfc_clt.capture() as stats:
+            barrier.wait()
+            sfc_clt.create('port_pair', {'name': name})
+            barrier.wait()
+            return stats.report()['count']
+
+    with ThreadPoolExecutor(2) as executor:
+        count_lst = list(executor.map(create_pp, ['pp_0_0', 'pp_1_0']))
+    # Requests of the other thread are not captured
+    assert count_lst == [1, 1]
+
+    with sfc_clt.capture() as stats:
+        with ThreadPoolExecutor(1) as executor:
+            executor.submit(sfc_clt.list, 'port_pair').result()
+            executor.submit(netsfc_clt.bind_captures(sfc_clt.list),
+                            'port_pair').result()
+    assert stats.report()['count'] == 1
+
+
+def test_update_delete_by_id(sfc_clt):
+    sfc_clt.list('port_chain')
+    item = sfc_clt.create('port_chain', {'name': 'pc',
+                                         'port_pair_groups': ['g0']})
+    sfc_clt.update('port_chain', item['id'], {'port_pair_groups': ['g1']})
+    assert sfc_clt.find('port_chain', 'pc')['port_pair_groups'] == ['g1']
+    assert sfc_clt.delete_by_id('port_chain', item['id'])
+    assert sfc_clt.find('port_chain', 'pc') is None
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+
+"""
+About: Unit test for sfc-ostack.sfc.journal
+"""
+
+import os
+import types
+import unittest.mock
+
+import pytest
+
+from conftest import get_port_chn, get_srv, get_srv_chn, get_srv_ports
+from context import sfc
+from sfc import journal, resource
+
+
+def test_journal_load(tmpdir):
+    path = str(tmpdir.join('sfc.journal'))
+    jnl = journal.Journal(path, sync_num=2)
+    jnl.add('stack', ['srv_chn'])
+    jnl.add('port_pair', ['pp_0', 'pp_1', 'pp_2'])
+    jnl.remove('port_pair', ['pp_1'])
+    jnl.close()
+    # Crash during writing a record
+    with open(path, 'a') as jnl_file:
+        jnl_file.write('-\tstack\tsrv_')
+
+    rsc_map = journal.Journal.load(path)
+    assert rsc_map['stack'] == ['srv_chn']
+    assert rsc_map['port_pair'] == ['pp_0', 'pp_2']
+    assert rsc_map['port_chain'] == []
+
+
+def test_port_chn_journal(tmpdir):
+    path = str(tmpdir.join('sfc.journal'))
+    jnl = journal.Journal(path)
+    srv_chn = get_srv_chn([[get_srv('sf%d' % idx)] for idx in range(2)])
+    srv_chn.heat_client.stacks.get.return_value.outputs = []
+    srv_chn.conn.network.ports.return_value = get_srv_ports(
+        ['sf%d' % idx for idx in range(2)])
+    port_chn = get_port_chn(srv_chn)
+    port_chn.journal = jnl
+    port_chn.create()
+    jnl.sync()
+
+    rsc_map = journal.Journal.load(path)
+    assert rsc_map['port_chain'] == ['pc_id']
+    assert rsc_map['flow_classifier'] == ['fc_id']
+    assert sorted(rsc_map['port_pair_group']) == ['pc_pp_grp_0_id',
+                                                  'pc_pp_grp_1_id']
+    assert sorted(rsc_map['port_pair']) == ['pc_pp_0_0_id', 'pc_pp_1_0_id']
+
+    port_chn.pc_client.delete_by_id.return_value = True
+    port_chn.delete()
+    jnl.close()
+    assert not any(journal.Journal.load(path).values())
+
+
+def test_teardown(tmpdir):
+    path = str(tmpdir.join('sfc.journal'))
+    jnl = journal.Journal(path)
+    jnl.add('stack', ['srv_chn', 'spare_0'])
+    jnl.add('port_pair', ['pp_0', 'pp_1'])
+    jnl.add('port_pair_group', ['grp_0'])
+    jnl.add('port_chain', ['pc'])
+    jnl.add('port_pair', ['pp_old'])
+    jnl.remove('port_pair', ['pp_old'])
+    jnl.close()
+
+    sess_reg = unittest.mock.MagicMock()
+    pc_client = sess_reg.get_sfc_client.return_value
+    conn = sess_reg.get_connection.return_value
+    del_lst = list()
+
+    def delete_by_id(rsc_name, item_id):
+        del_lst.append(item_id)
+        return item_id not in ('pp_0', 'pp_1')
+
+    pc_client.delete_by_id.side_effect = delete_by_id
+    # pp_0 is already deleted, pp_1 is still in use
+    pc_client.find_by_id.side_effect = lambda rsc_name, item_id: (
+        None if item_id == 'pp_0' else {'id': item_id})
+    conn.orchestration.find_stack.side_effect = lambda name: (
+        None if name == 'spare_0' else types.SimpleNamespace(name=name))
+
+    fail_map = journal.teardown(path, {}, sess_reg=sess_reg, max_workers=4,
+                                wait_complete=False)
+    assert fail_map == {'port_pair': ['pp_1']}
+    # Stacks are kept until their deletion is completed
+    assert journal.Journal.load(path)['stack'] == ['srv_chn']
+    # Dependency order and only resources in the journal are touched
+    assert del_lst[0] == 'pc'
+    assert del_lst[1] == 'grp_0'
+    assert sorted(del_lst[2:]) == ['pp_0', 'pp_1']
+    assert conn.orchestration.delete_stack.call_count == 1
+
+    # Resume the teardown
+    pc_client.delete_by_id.side_effect = None
+    pc_client.delete_by_id.return_value = True
+    conn.orchestration.find_stack.side_effect = lambda name: None
+    assert journal.teardown(path, {}, sess_reg=sess_reg,
+                            wait_complete=False) == {}
+    assert pc_client.delete_by_id.call_args[0] == ('port_pair', 'pp_1')
+    assert not os.path.exists(path)
+
+
+def test_port_chn_delete_fail(tmpdir):
+    path = str(tmpdir.join('sfc.journal'))
+    jnl = journal.Journal(path)
+    srv_chn = get_srv_chn([[get_srv('sf%d' % idx)] for idx in range(2)])
+    srv_chn.heat_client.stacks.get.return_value.outputs = []
+    srv_chn.conn.network.ports.return_value = get_srv_ports(
+        ['sf%d' % idx for idx in range(2)])
+    port_chn = get_port_chn(srv_chn)
+    port_chn.journal = jnl
+    port_chn.create()
+
+    # The port pair is still in use
+    port_chn.pc_client.delete_by_id.side_effect = lambda rsc_name, item_id: (
+        item_id != 'pc_pp_1_0_id')
+    port_chn.delete()
+    jnl.sync()
+    assert port_chn.rsc_id_map == {
+        'port_chain': [], 'flow_classifier': [], 'port_pair_group': [],
+        'port_pair': ['pc_pp_1_0_id']}
+    rsc_map = journal.Journal.load(path)
+    assert rsc_map['port_pair'] == ['pc_pp_1_0_id']
+    assert not rsc_map['port_chain'] and not rsc_map['port_pair_group']
+
+    # Retry only the failed deletion
+    port_chn.pc_client.delete_by_id.reset_mock(side_effect=True)
+    port_chn.pc_client.delete_by_id.return_value = True
+    port_chn.delete()
+    jnl.close()
+    assert port_chn.pc_client.delete_by_id.call_args_list == [
+        unittest.mock.call('port_pair', 'pc_pp_1_0_id')]
+    assert not any(journal.Journal.load(path).values())
+
+
+def _get_stack_event(stack_name, status):
+    return unittest.mock.Mock(id='e1', resource_name=stack_name,
+                              resource_status=status,
+                              resource_status_reason='')
+
+
+def test_teardown_wait_stack(tmpdir):
+    path = str(tmpdir.join('sfc.journal'))
+    jnl = journal.Journal(path)
+    jnl.add('stack', ['srv_chn', 'spare_0'])
+    jnl.close()
+
+    sess_reg = unittest.mock.MagicMock()
+    conn = sess_reg.get_connection.return_value
+    conn.orchestration.find_stack.side_effect = lambda name: (
+        types.SimpleNamespace(name=name, status='DELETE_IN_PROGRESS'))
+    heat_client = sess_reg.get_heat_client.return_value
+    heat_client.events.list.side_effect = lambda name, **kargs: [
+        _get_stack_event(name, 'DELETE_FAILED' if name == 'spare_0'
+                         else 'DELETE_COMPLETE')]
+
+    assert journal.teardown(path, {}, sess_reg=sess_reg) == {
+        'stack': ['spare_0']}
+    assert journal.Journal.load(path)['stack'] == ['spare_0']
+
+
+def test_srv_chn_delete_journal(tmpdir):
+    path = str(tmpdir.join('sfc.journal'))
+    jnl = journal.Journal(path)
+    jnl.add('stack', ['test_srv_chn'])
+    srv_chn = get_srv_chn([[get_srv('sf0')]])
+    srv_chn.journal = jnl
+    srv_chn.heat_client.events.list.return_value = [
+        _get_stack_event('test_srv_chn', 'DELETE_FAILED')]
+    with pytest.raises(resource.ServerChainError):
+        srv_chn.delete()
+    srv_chn.delete(wait_complete=False)
+    jnl.sync()
+    assert journal.Journal.load(path)['stack'] == ['test_srv_chn']
+
+    srv_chn.heat_client.events.list.return_value = [
+        _get_stack_event('test_srv_chn', 'DELETE_COMPLETE')]
+    srv_chn.delete()
+    jnl.close(remove_empty=True)
+    assert not os.path.exists(path)
+
+
+def test_srv_chn_release_journal(tmpdir):
+    path = str(tmpdir.join('sfc.journal'))
+    jnl = journal.Journal(path)
+    srv_chn = get_srv_chn([[get_srv('sf%d' % idx)] for idx in range(3)])
+    srv_chn.journal = jnl
+    srv_chn.pool = unittest.mock.MagicMock()
+    for idx in range(3):
+        spare = types.SimpleNamespace(name='spare_%d' % idx)
+        srv_chn.claimed_srv['sf%d' % idx] = spare
+        jnl.add('stack', [spare.name])
+
+    # Not waited for
+    srv_chn._release_srv(['sf0'])
+    # Failed to be deleted
+    srv_chn.pool.release.side_effect = lambda spare, wait_complete: (
+        spare.name != 'spare_1')
+    srv_chn._release_srv(['sf1', 'sf2'], wait_complete=True)
+    jnl.close()
+    assert not srv_chn.claimed_srv
+    assert journal.Journal.load(path)['stack'] == ['spare_0', 'spare_1']
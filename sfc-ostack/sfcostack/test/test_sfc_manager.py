@@ -6,9 +6,13 @@
 About: Unit test for sfc-ostack.sfc.manager
 """
 
+import contextlib
 import os
+import socket
 import unittest.mock
 
+import pytest
+
 from context import sfc
 from sfc import manager
 
@@ -20,3 +24,96 @@ class TestStaticSFCManager(object):
 
     def test_chain_srv_chn(self):
         pass
+
+
+def _get_sfc_conf(name):
+    sfc_conf = unittest.mock.MagicMock()
+    sfc_conf.function_chain.name = name
+    return sfc_conf
+
+
+def test_create_many():
+    sfc_mgr = manager.StaticSFCManager(
+        {}, sess_reg=unittest.mock.MagicMock())
+
+    def create_sfc(sfc_conf, *args):
+        if sfc_conf.function_chain.name == 'chn_err':
+            raise manager.SFCManagerError('Test error')
+        return sfc_conf.function_chain.name, [0.1]
+
+    sfc_mgr._create_sfc = create_sfc
+    result_lst = sfc_mgr.create_many(
+        [_get_sfc_conf(name) for name in ('chn_0', 'chn_err', 'chn_1')],
+        max_parallel=2)
+    assert [result['sfc'] for result in result_lst] == ['chn_0', None, 'chn_1']
+    assert isinstance(result_lst[1]['error'], manager.SFCManagerError)
+    assert result_lst[2]['time_info'] == [0.1]
+
+
+def test_ready_listener():
+    listener = manager.ReadyListener('127.0.0.1', 0)
+    port = listener._sock.getsockname()[1]
+    send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    for _ in range(2):
+        send_sock.sendto(b'ready', ('127.0.0.1', port))
+    # Packets are demultiplexed by source address
+    assert listener.wait([{'10.0.0.1'}], timeout=0.2) is False
+    assert listener.wait([{'10.0.0.2', '127.0.0.1'}, {'127.0.0.1'}],
+                         timeout=2)
+    assert listener.wait([{'127.0.0.1'}], timeout=0.2) is False
+    send_sock.close()
+    listener.close()
+
+
+def test_reorder_srv_chn():
+    sfc_mgr = manager.StaticSFCManager(
+        {}, sess_reg=unittest.mock.MagicMock())
+    srv_chn_conf = [[{'name': 'sf0'}],
+                    [{'name': 'sf1_0'}, {'name': 'sf1_1'}],
+                    [{'name': 'sf2'}]]
+    alloc_map = {'hyper_0': [srv_chn_conf[1][0], srv_chn_conf[1][1]],
+                 'hyper_1': [srv_chn_conf[2][0]],
+                 'hyper_2': [srv_chn_conf[0][0]]}
+    sfc_mgr._get_srv_chn_alloc = unittest.mock.MagicMock(
+        return_value=alloc_map)
+    reorder_srv_chn_conf = sfc_mgr._reorder_srv_chn(
+        'min_lat', srv_chn_conf, ['hyper_0', 'hyper_1', 'hyper_2'])
+    # Server groups are kept as a whole
+    assert sfc_mgr._get_srv_chn_str(reorder_srv_chn_conf) == \
+        'sf1_0|sf1_1,sf2,sf0'
+
+
+def test_req_report_capture_stopped():
+    sfc_mgr = manager.StaticSFCManager(
+        {}, sess_reg=unittest.mock.MagicMock(), req_report=True)
+    capture_lst = list()
+
+    @contextlib.contextmanager
+    def capture():
+        capture_lst.append('stats')
+        try:
+            yield 'stats'
+        finally:
+            capture_lst.remove('stats')
+
+    sfc_mgr.sess_reg.get_sfc_client.return_value.capture = capture
+    sfc_mgr._create_sfc_rsc = unittest.mock.MagicMock(
+        side_effect=manager.SFCManagerError('Test error'))
+    with pytest.raises(manager.SFCManagerError):
+        sfc_mgr._create_sfc(_get_sfc_conf('chn_err'), 'nova_default',
+                            'default', False, 'udp_packet')
+    assert capture_lst == []
+
+
+def test_get_srv_chn_alloc():
+    sfc_mgr = manager.StaticSFCManager(
+        {}, sess_reg=unittest.mock.MagicMock())
+    find_server = sfc_mgr.conn.compute.find_server
+    sfc_mgr.conn.compute.get_server.return_value.hypervisor_hostname = \
+        'hyper_0'
+    alloc_map = sfc_mgr._get_srv_chn_alloc(
+        [[{'name': 'sf0'}], [{'name': 'sf1'}]], ['hyper_0'], 'chn_srv_chn')
+    # Servers are found with their names in the cloud
+    assert [call[0][0] for call in find_server.call_args_list] == [
+        'chn_srv_chn_sf0', 'chn_srv_chn_sf1']
+    assert [srv['name'] for srv in alloc_map['hyper_0']] == ['sf0', 'sf1']
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+
+"""
+About: Unit test for sfc-ostack.sfc.pool
+"""
+
+import time
+import types
+import unittest.mock
+
+import pytest
+import yaml
+
+from conftest import NET_CONF, get_srv
+from context import sfc
+from sfc import pool, resource
+
+
+def _get_pool(**kargs):
+    sess_reg = unittest.mock.MagicMock()
+    conn = sess_reg.get_connection.return_value
+    conn.network.find_network.return_value.id = 'net_id'
+    conn.network.find_subnet.return_value.id = 'subnet_id'
+    sf_pool = pool.WarmPool({}, 'test_pool', NET_CONF, size=0,
+                            sess_reg=sess_reg, **kargs)
+
+    def boot_spare(profile):
+        srv_chn = unittest.mock.MagicMock()
+        srv_chn.name = 'spare_%d' % next(sf_pool._spare_id)
+        topo = {'pt_id': srv_chn.name + '_pt',
+                'pt_in_id': srv_chn.name + '_pt_in',
+                'pt_out_id': srv_chn.name + '_pt_out',
+                'fip': srv_chn.name + '_fip'}
+        with sf_pool._lock:
+            sf_pool._boot_num[profile] -= 1
+            sf_pool._spare_map[profile].append(
+                pool.SpareInstance(profile, srv_chn, topo))
+
+    sf_pool._boot_spare = boot_spare
+    return sf_pool
+
+
+def test_pool_refill_evict():
+    sf_pool = _get_pool(low_wm=1, high_wm=3, idle_timeout=60)
+    srv = get_srv('sf1')
+    sf_pool.add_profile(srv)
+    sf_pool.check()
+    sf_pool._executor.shutdown(wait=True)
+    assert sf_pool.get_spare_num(srv) == 3
+
+    # Idle spares are evicted down to the low watermark
+    for spare in sf_pool._spare_map[sf_pool.get_profile(srv)]:
+        spare.ready_ts = time.time() - 120
+    sf_pool._executor = unittest.mock.MagicMock()
+    sf_pool.check()
+    assert sf_pool.get_spare_num(srv) == 1
+    assert sf_pool._executor.submit.call_count == 2
+
+
+def _get_chn_layout(net='net_id', sep_access_port=True, fip_port='pt'):
+    return types.SimpleNamespace(
+        network_id={'public': 'net_id', 'net': net, 'subnet': 'subnet_id'},
+        sep_access_port=sep_access_port, fip_port=fip_port)
+
+
+def test_pool_profile():
+    sf_pool = _get_pool(low_wm=1, high_wm=1)
+    srv = get_srv('sf1')
+    sf_pool.add_profile(srv)
+    sf_pool.check()
+    sf_pool._executor.shutdown(wait=True)
+
+    # Spares are not claimed by chains on other networks or with other ports
+    for srv_chn in (_get_chn_layout(net='net2_id'),
+                    _get_chn_layout(sep_access_port=False, fip_port='pt_in')):
+        assert sf_pool.get_profile(srv) != sf_pool.get_profile(srv, srv_chn)
+        assert sf_pool.claim(srv, srv_chn=srv_chn) is None
+    assert sf_pool.get_spare_num(srv) == 1
+    assert sf_pool.claim(srv, srv_chn=_get_chn_layout())
+    assert sf_pool.get_spare_num(srv) == 0
+
+
+def test_pool_claim_fail():
+    sf_pool = _get_pool(low_wm=1, high_wm=1)
+    srv = get_srv('sf1')
+    sf_pool.add_profile(srv)
+    sf_pool.check()
+    sf_pool._executor.shutdown(wait=True)
+    sf_pool._executor = unittest.mock.MagicMock()
+
+    spare = sf_pool._spare_map[sf_pool.get_profile(srv)][0]
+    spare.srv_chn.conn.network.update_port.side_effect = RuntimeError()
+    with pytest.raises(RuntimeError):
+        sf_pool.claim(srv)
+    # The partially renamed spare is deleted
+    assert sf_pool.get_spare_num(srv) == 0
+    sf_pool._executor.submit.assert_called_once_with(sf_pool._delete_stack,
+                                                     spare.srv_chn)
+
+
+def test_srv_chn_claim():
+    sf_pool = _get_pool(low_wm=1, high_wm=1)
+    sf_pool.add_profile(get_srv('sf1'))
+    sf_pool.check()
+    sf_pool._executor.shutdown(wait=True)
+
+    sess_reg = unittest.mock.MagicMock()
+    conn = sess_reg.get_connection.return_value
+    conn.network.find_network.return_value.id = 'net_id'
+    conn.network.find_subnet.return_value.id = 'subnet_id'
+    srv_chn = resource.ServerChain({}, 'test_srv_chn', '', NET_CONF,
+                                   [[get_srv('sf1')], [get_srv('sf2')]],
+                                   True, 'pt', sess_reg=sess_reg, pool=sf_pool)
+    srv_chn.heat_client.events.list.return_value = [unittest.mock.Mock(
+        id='e1', resource_name='test_srv_chn',
+        resource_status='CREATE_COMPLETE')]
+    srv_chn.heat_client.stacks.get.return_value.outputs = [
+        {'output_key': 'sf2_topo', 'output_value': {'fip': 'sf2_fip'}}]
+    srv_chn.create_network()
+
+    # Only one spare of the profile is ready
+    assert list(srv_chn.claimed_srv.keys()) == ['sf1']
+    tpl = yaml.safe_load(
+        srv_chn.heat_client.stacks.create.call_args[1]['template'])
+    assert 'sf1_pt_in' not in tpl['resources']
+    assert 'sf2_pt_in' in tpl['resources']
+    assert srv_chn.topology()['sf1']['pt_in_id'] == 'spare_0_pt_in'
+    assert srv_chn.get_srv_fips(no_grp=True) == ['spare_0_fip', 'sf2_fip']
+    assert srv_chn.get_srv_fips(no_grp=True, with_claimed=False) == ['sf2_fip']
@@ -7,9 +7,457 @@ About: Unit test for sfc-ostack.sfc.resource
 """
 
 import os
+import time
+import types
+import unittest.mock
 
+import pytest
+import yaml
+
+from conftest import (FakeNetwork, get_port_chn, get_sfc_client, get_srv,
+                      get_srv_chn, get_srv_ports)
 from context import sfc
+from sfc import resource
 
 
 def test_srv_chn():
     assert 1 == 1
+
+
+def test_srv_chn_topo_output():
+    srv_chn = get_srv_chn([[get_srv('sf1')], [get_srv('sf2')]])
+    hot_tpl = yaml.safe_load(srv_chn.get_output_hot(only_network=True))
+    assert 'sf1' not in hot_tpl['resources']
+    topo = hot_tpl['outputs']['sf2_topo']['value']
+    assert topo['pt_in_id'] == {'get_resource': 'sf2_pt_in'}
+    assert topo['pt_out_ip'] == {
+        'get_attr': ['sf2_pt_out', 'fixed_ips', 0, 'ip_address']}
+    assert topo['fip'] == {'get_attr': ['sf2_fip', 'floating_ip_address']}
+
+
+def test_srv_chn_topology():
+    srv_chn = get_srv_chn([[get_srv('sf1')], [get_srv('sf2')]])
+    stack = srv_chn.heat_client.stacks.get.return_value
+    stack.outputs = [
+        {'output_key': '%s_topo' % name,
+         'output_value': {'pt_in_id': name + '_in', 'pt_out_id': name + '_out',
+                          'fip': name + '_fip'}}
+        for name in ('sf1', 'sf2')
+    ]
+    assert srv_chn.get_srv_ppgrp_id() == [[('sf1_in', 'sf1_out')],
+                                          [('sf2_in', 'sf2_out')]]
+    assert srv_chn.get_srv_fips(no_grp=True) == ['sf1_fip', 'sf2_fip']
+    # All lookups are served by one stack-show call
+    assert srv_chn.heat_client.stacks.get.call_count == 1
+    assert not srv_chn.conn.network.ports.called
+
+
+def _get_event(event_id, rsc_name, status):
+    return unittest.mock.Mock(id=event_id, resource_name=rsc_name,
+                              resource_status=status,
+                              resource_status_reason='')
+
+
+def test_srv_chn_wait_stack_events():
+    srv_chn = get_srv_chn([[get_srv('sf1')]])
+    srv_chn.heat_client.events.list.side_effect = [
+        [],
+        [_get_event('e1', 'sf1_pt', 'CREATE_COMPLETE')],
+        [_get_event('e2', 'test_srv_chn', 'CREATE_COMPLETE')]
+    ]
+    srv_chn.conn.orchestration.find_stack.return_value.status = \
+        'CREATE_IN_PROGRESS'
+    rsc_time = srv_chn._wait_creation_complete('test_srv_chn')
+    assert list(rsc_time.keys()) == ['sf1_pt']
+    # Events are followed with the ID of the last received event
+    call_lst = srv_chn.heat_client.events.list.call_args_list
+    assert call_lst[2][1]['marker'] == 'e1'
+
+    srv_chn.heat_client.events.list.side_effect = [
+        [_get_event('e3', 'test_srv_chn', 'UPDATE_FAILED')]
+    ]
+    try:
+        srv_chn._wait_creation_complete('test_srv_chn',
+                                        status='UPDATE_COMPLETE')
+    except resource.ServerChainError:
+        pass
+    else:
+        assert False
+
+
+def test_wait_stack_status_fallback():
+    conn = unittest.mock.MagicMock()
+    heat_client = unittest.mock.MagicMock()
+    # No events for the stack itself
+    heat_client.events.list.return_value = []
+    old_ts = '2018-01-01T00:00:00Z'
+    stack_lst = [
+        # Status of the previous update
+        types.SimpleNamespace(status='UPDATE_COMPLETE', updated_at=old_ts),
+        types.SimpleNamespace(status='UPDATE_IN_PROGRESS', updated_at=old_ts),
+        types.SimpleNamespace(status='UPDATE_COMPLETE', updated_at=old_ts)
+    ]
+    conn.orchestration.find_stack.side_effect = stack_lst
+    resource.wait_stack_complete(conn, heat_client, 'sc', 'UPDATE',
+                                 min_interval=0, max_interval=0)
+    assert conn.orchestration.find_stack.call_count == 3
+
+    now_ts = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    conn.orchestration.find_stack.side_effect = [
+        types.SimpleNamespace(status='UPDATE_FAILED', updated_at=old_ts),
+        types.SimpleNamespace(status='UPDATE_FAILED', updated_at=now_ts,
+                              status_reason='Quota exceeded')
+    ]
+    with pytest.raises(resource.ServerChainError, match='Quota exceeded'):
+        resource.wait_stack_complete(conn, heat_client, 'sc', 'UPDATE',
+                                     min_interval=0, max_interval=0)
+
+
+def test_srv_chn_update():
+    srv_chn = get_srv_chn([[get_srv('sf1')], [get_srv('sf2')],
+                           [get_srv('sf3')]])
+    srv_chn.heat_client.events.list.return_value = [
+        _get_event('e1', 'test_srv_chn', 'UPDATE_COMPLETE')]
+    sf2 = get_srv('sf2')
+    sf2['flavor'] = 'm.large'
+    srv_diff = srv_chn.update([[get_srv('sf1')], [sf2], [get_srv('sf4')]])
+    assert srv_diff == {'add': ['sf4'], 'remove': ['sf3'],
+                        'replace': ['sf2']}
+    tpl = yaml.safe_load(
+        srv_chn.heat_client.stacks.update.call_args[1]['template'])
+    assert 'sf4' in tpl['resources'] and 'sf3' not in tpl['resources']
+    assert tpl['resources']['sf2']['properties']['flavor'] == 'm.large'
+
+    # Reorder only, the stack is not updated
+    srv_chn.heat_client.stacks.update.reset_mock()
+    srv_diff = srv_chn.update([[get_srv('sf4')], [sf2], [get_srv('sf1')]])
+    assert not any(srv_diff.values())
+    assert not srv_chn.heat_client.stacks.update.called
+
+
+def test_srv_chn_nested():
+    srv_chn = get_srv_chn([[get_srv('sf1')], [get_srv('sf2')]])
+    srv_chn.nested = True
+    stack_args = srv_chn.get_stack_args()
+    tpl = yaml.safe_load(stack_args['template'])
+    assert tpl['resources']['grp_0'] == {'type': 'grp_0.yaml'}
+    assert tpl['outputs']['sf2_topo']['value'] == {
+        'get_attr': ['grp_1', 'sf2_topo']}
+    grp_tpl = yaml.safe_load(stack_args['files']['grp_1.yaml'])
+    assert 'sf2' in grp_tpl['resources']
+    assert 'sf1' not in grp_tpl['resources']
+    assert 'sf2_topo' in grp_tpl['outputs']
+
+
+def test_srv_chn_nested_update():
+    srv_chn = get_srv_chn([[get_srv('sf1_0'), get_srv('sf1_1')],
+                           [get_srv('sf2')]])
+    srv_chn.nested = True
+    srv_chn.heat_client.events.list.return_value = [
+        _get_event('e1', 'test_srv_chn', 'UPDATE_COMPLETE')]
+
+    # Remove the first server of a group and reorder the groups
+    srv_chn.update([[get_srv('sf2')], [get_srv('sf1_1')], [get_srv('sf3')]])
+    stack_args = srv_chn.heat_client.stacks.update.call_args[1]
+    tpl = yaml.safe_load(stack_args['template'])
+    # Nested stacks of existing groups are kept
+    assert sorted(tpl['resources'].keys()) == ['grp_0', 'grp_1', 'grp_2']
+    assert tpl['outputs']['sf1_1_topo']['value'] == {
+        'get_attr': ['grp_0', 'sf1_1_topo']}
+    assert tpl['outputs']['sf2_topo']['value'] == {
+        'get_attr': ['grp_1', 'sf2_topo']}
+    grp_tpl = yaml.safe_load(stack_args['files']['grp_0.yaml'])
+    assert 'sf1_1' in grp_tpl['resources']
+    assert 'sf1_0' not in grp_tpl['resources']
+    assert 'sf3' in yaml.safe_load(
+        stack_args['files']['grp_2.yaml'])['resources']
+
+    # Added groups get new names
+    srv_chn.update([[get_srv('sf2')], [get_srv('sf1_1')], [get_srv('sf3')],
+                    [get_srv('sf4')]])
+    assert [srv_grp.name for srv_grp in srv_chn.srv_grp_lst] == [
+        'grp_1', 'grp_0', 'grp_2', 'grp_3']
+
+
+def test_srv_chn_nested_move():
+    srv_chn = get_srv_chn([[get_srv('sf1'), get_srv('sf2')]])
+    srv_chn.nested = True
+    srv_chn.heat_client.events.list.return_value = [
+        _get_event('e1', 'test_srv_chn', 'UPDATE_COMPLETE')]
+
+    # Split the group, the moved server is re-created in a new nested stack
+    srv_diff = srv_chn.update([[get_srv('sf1')], [get_srv('sf2')]])
+    assert srv_diff == {'add': [], 'remove': [], 'replace': ['sf2']}
+    stack_args = srv_chn.heat_client.stacks.update.call_args[1]
+    assert 'sf2' not in yaml.safe_load(
+        stack_args['files']['grp_0.yaml'])['resources']
+    assert 'sf2' in yaml.safe_load(
+        stack_args['files']['grp_1.yaml'])['resources']
+
+    # Reordering groups keeps the nested stacks
+    srv_chn.heat_client.stacks.update.reset_mock()
+    srv_diff = srv_chn.update([[get_srv('sf2')], [get_srv('sf1')]])
+    assert not any(srv_diff.values())
+    assert not srv_chn.heat_client.stacks.update.called
+
+
+def test_srv_chn_init_cfg(tmpdir):
+    script = tmpdir.join('init.sh')
+    script.write('#!/bin/bash\necho "ready"\n')
+    srv_lst = [get_srv('sf%d' % idx) for idx in range(3)]
+    for srv in srv_lst:
+        srv['init_script'] = str(script)
+    srv_chn = get_srv_chn([[srv] for srv in srv_lst])
+    tpl = yaml.safe_load(srv_chn.get_output_hot())
+    cfg_lst = [name for name, rsc in tpl['resources'].items()
+               if rsc['type'] == 'OS::Heat::SoftwareConfig']
+    assert len(cfg_lst) == 1
+    assert tpl['resources'][cfg_lst[0]]['properties']['config'] == \
+        '#!/bin/bash\necho "ready"\n'
+    for srv in srv_lst:
+        prop = tpl['resources'][srv['name']]['properties']
+        assert prop['user_data'] == {'get_resource': cfg_lst[0]}
+
+
+def test_srv_chn_srv_model():
+    srv_chn = get_srv_chn([[get_srv('sf1')], [get_srv('sf2')]])
+    assert srv_chn.get_srv_num() == 2
+    srv = srv_chn.get_srv('sf2')
+    assert srv.grp_idx == 1 and srv['image'] == 'ubuntu-cloud'
+    assert srv_chn.get_srv_grp(1).get_srv('sf2') is srv
+    # Cloud names are prefixed with the chain name
+    assert srv_chn.get_srv_ppgrp_name() == [
+        [('test_srv_chn_sf1_pt_in', 'test_srv_chn_sf1_pt_out')],
+        [('test_srv_chn_sf2_pt_in', 'test_srv_chn_sf2_pt_out')]]
+    rsc_map = yaml.safe_load(srv_chn.get_output_hot())['resources']
+    assert rsc_map['sf1']['properties']['name'] == 'test_srv_chn_sf1'
+    assert rsc_map['sf1_pt_in']['properties']['name'] == \
+        'test_srv_chn_sf1_pt_in'
+
+    # Servers with unchanged confs are kept after reordering
+    srv_chn.update([[srv_chn.get_srv('sf2').conf], [get_srv('sf1')]])
+    assert srv_chn.get_srv('sf2') is srv
+    assert srv.grp_idx == 0
+
+
+def test_srv_chn_port_index():
+    srv_chn = get_srv_chn([[get_srv('sf0')], [get_srv('sf1')]])
+    network = srv_chn.conn.network = FakeNetwork()
+    network.port_lst = get_srv_ports(['sf0'])
+    port = srv_chn._get_port('test_srv_chn_sf0_pt_in')
+    assert port.id == 'sf0_pt_in_id'
+    assert srv_chn._get_port('test_srv_chn_sf0_pt_out').id == 'sf0_pt_out_id'
+    # All lookups are served by one port listing on the chain's network
+    assert network.req_lst == [('ports', {'network_id': 'net_id'})]
+
+    # Ports created after the index is built
+    network.port_lst += get_srv_ports(['sf1'])
+    assert srv_chn._get_port('test_srv_chn_sf1_pt_in').id == 'sf1_pt_in_id'
+    assert network.count('ports') == 2
+    assert srv_chn._get_port('test_srv_chn_sf0_pt_in').id == 'sf0_pt_in_id'
+    assert network.count('ports') == 2
+
+    with pytest.raises(resource.ServerChainError):
+        srv_chn._get_port('test_srv_chn_sf2_pt_in')
+    assert network.count('ports') == 3
+
+
+def test_srv_chn_fip_fallback():
+    port_lst = [
+        types.SimpleNamespace(id='%s_pt_id' % srv, name='test_srv_chn_%s_pt'
+                              % srv) for srv in ('sf0', 'sf1')]
+    fip_lst = [
+        types.SimpleNamespace(port_id=None, floating_ip_address='10.0.0.1'),
+        types.SimpleNamespace(port_id='sf1_pt_id',
+                              floating_ip_address='10.0.0.11'),
+        types.SimpleNamespace(port_id='sf0_pt_id',
+                              floating_ip_address='10.0.0.10')
+    ]
+
+    def get_fallback_srv_chn(fip_lst):
+        srv_chn = get_srv_chn([[get_srv('sf0')], [get_srv('sf1')]])
+        # Stack without topology outputs
+        srv_chn.heat_client.stacks.get.return_value.outputs = []
+        srv_chn.conn.network = FakeNetwork()
+        srv_chn.conn.network.port_lst = port_lst
+        srv_chn.conn.network.fip_lst = fip_lst
+        return srv_chn
+
+    srv_chn = get_fallback_srv_chn(fip_lst)
+    assert srv_chn.get_srv_fips(no_grp=True) == ['10.0.0.10', '10.0.0.11']
+    assert srv_chn.get_srv_fips() == [['10.0.0.10'], ['10.0.0.11']]
+    # One floating IP listing and one port listing
+    assert srv_chn.conn.network.req_lst == [
+        ('ips', {'floating_network_id': 'net_id'}),
+        ('ports', {'network_id': 'net_id'})]
+
+    srv_chn = get_fallback_srv_chn(fip_lst[:2])
+    with pytest.raises(resource.ServerChainError):
+        srv_chn.get_srv_fips()
+
+
+def test_port_chn_create():
+    srv_chn = get_srv_chn([[get_srv('sf%d' % idx)] for idx in range(4)])
+    srv_chn.heat_client.stacks.get.return_value.outputs = []
+    srv_chn.conn.network.ports.return_value = get_srv_ports(
+        ['sf%d' % idx for idx in range(4)])
+    port_chn = get_port_chn(srv_chn)
+    port_chn.create(max_workers=4)
+    pc_args = port_chn.pc_client.create.call_args_list[-1][0][1]
+    # Groups are kept in the chain order
+    assert pc_args['port_pair_groups'] == [
+        'pc_pp_grp_%d_id' % idx for idx in range(4)]
+    assert pc_args['flow_classifiers'] == ['fc_id']
+    assert port_chn.pc_client.create_bulk.call_count == 4
+
+
+def test_port_chn_create_lb():
+    srv_grp = [dict(get_srv('sf1_%d' % idx), lb_fields=['ip_src'])
+               for idx in range(3)]
+    srv_chn = get_srv_chn([[get_srv('sf0')], srv_grp])
+    srv_chn.heat_client.stacks.get.return_value.outputs = []
+    srv_chn.conn.network.ports.return_value = get_srv_ports(
+        ['sf0', 'sf1_0', 'sf1_1', 'sf1_2'])
+    hot_tpl = yaml.safe_load(srv_chn.get_output_hot())
+    assert all(name in hot_tpl['resources'] for name in
+               ('sf1_0', 'sf1_1', 'sf1_2'))
+
+    port_chn = get_port_chn(srv_chn)
+    port_chn.create()
+    grp_args_map = {
+        call[0][1]['name']: call[0][1]
+        for call in port_chn.pc_client.create.call_args_list
+        if call[0][0] == 'port_pair_group'
+    }
+    assert 'port_pair_group_parameters' not in grp_args_map['pc_pp_grp_0']
+    grp_args = grp_args_map['pc_pp_grp_1']
+    assert grp_args['port_pair_group_parameters'] == {'lb_fields': ['ip_src']}
+    assert grp_args['port_pairs'] == ['pc_pp_1_%d_id' % idx
+                                      for idx in range(3)]
+
+    # lb_fields of a existing group is immutable
+    srv_chn.update([[get_srv('sf0')],
+                    [dict(srv, lb_fields=['ip_dst']) for srv in srv_grp]],
+                   wait_complete=False)
+    with pytest.raises(resource.PortChainError):
+        port_chn.update()
+
+
+def test_port_chn_update():
+    srv_chn = get_srv_chn([[get_srv('sf%d' % idx)] for idx in range(3)])
+    srv_chn.heat_client.stacks.get.return_value.outputs = []
+    srv_chn.conn.network.ports.return_value = get_srv_ports(
+        ['sf%d' % idx for idx in range(4)])
+    pc_client = get_sfc_client()
+    port_chn = get_port_chn(srv_chn)
+    port_chn.pc_client = pc_client
+    port_chn.create()
+    neutron = pc_client._httpclient
+    pc = pc_client.find('port_chain', 'pc')
+    fc_id, grp_id_lst = pc['flow_classifiers'], pc['port_pair_groups']
+
+    # Reorder, remove sf1 and add sf3
+    srv_chn.update([[get_srv('sf2')], [get_srv('sf0')], [get_srv('sf3')]],
+                   wait_complete=False)
+    post_num = neutron.count('POST')
+    assert port_chn.update() == {'add': 1, 'update': 0, 'keep': 2,
+                                 'remove': 1, 'flow_classifier': False}
+    # One bulk request for port pairs and one for the group
+    assert neutron.count('POST') == post_num + 2
+    pc = pc_client.find('port_chain', 'pc')
+    assert pc['flow_classifiers'] == fc_id
+    # Groups of sf2 and sf0 are kept
+    assert pc['port_pair_groups'][:2] == [grp_id_lst[2], grp_id_lst[0]]
+    assert len(pc_client.list('port_pair_group')) == 3
+    assert len(pc_client.list('port_pair')) == 3
+
+    # Deleted with remembered IDs, no lookups
+    get_num, del_num = neutron.count('GET'), neutron.count('DELETE')
+    port_chn.delete()
+    assert neutron.count('GET') == get_num
+    assert neutron.count('DELETE') == del_num + 1 + 1 + 3 + 3
+    for rsc_name in pc_client.rsc_tuple:
+        assert pc_client.list(rsc_name) == []
+
+
+def _get_name_lst(pc_client, rsc_name):
+    return [item['name'] for item in pc_client.list(rsc_name)]
+
+
+def test_port_chn_update_move():
+    srv_chn = get_srv_chn([[get_srv('sf0'), get_srv('sf1')],
+                           [get_srv('sf2')]])
+    srv_chn.heat_client.stacks.get.return_value.outputs = []
+    srv_chn.conn.network.ports.return_value = get_srv_ports(
+        ['sf%d' % idx for idx in range(4)])
+    pc_client = get_sfc_client()
+    port_chn = get_port_chn(srv_chn)
+    port_chn.pc_client = pc_client
+    port_chn.create()
+    neutron = pc_client._httpclient
+    pp_id_set = set(item['id'] for item in pc_client.list('port_pair'))
+
+    # Split the first group, port pairs are moved instead of re-created
+    srv_chn.update([[get_srv('sf0')], [get_srv('sf1')], [get_srv('sf2')]],
+                   wait_complete=False)
+    flow_conf = {'name': 'fc', 'logical_source_port': 'src',
+                 'logical_destination_port': 'dst'}
+    assert port_chn.update(flow_conf=flow_conf) == {
+        'add': 1, 'update': 1, 'keep': 1, 'remove': 0,
+        'flow_classifier': False}
+    assert set(item['id'] for item in pc_client.list('port_pair')) == \
+        pp_id_set
+    pc = pc_client.find('port_chain', 'pc')
+    assert [len(pc_client.find_by_id('port_pair_group', grp_id)[
+        'port_pairs']) for grp_id in pc['port_pair_groups']] == [1, 1, 1]
+
+    # Merge the groups again
+    srv_chn.update([[get_srv('sf1'), get_srv('sf0')], [get_srv('sf2')]],
+                   wait_complete=False)
+    assert port_chn.update()['remove'] == 1
+    assert set(item['id'] for item in pc_client.list('port_pair')) == \
+        pp_id_set
+    assert len(pc_client.list('port_pair_group')) == 2
+
+    # Update by a new object, names of new items are still unique
+    port_chn = get_port_chn(srv_chn)
+    port_chn.pc_client = pc_client
+    srv_chn.update([[get_srv('sf1')], [get_srv('sf0')], [get_srv('sf2')],
+                    [get_srv('sf3')]], wait_complete=False)
+    assert port_chn.update()['add'] == 2
+    for rsc_name in ('port_pair', 'port_pair_group'):
+        name_lst = _get_name_lst(pc_client, rsc_name)
+        assert len(set(name_lst)) == len(name_lst)
+    assert 'pc_pp_3_0_g1' in _get_name_lst(pc_client, 'port_pair')
+
+    port_chn.delete()
+    for rsc_name in pc_client.rsc_tuple:
+        assert pc_client.list(rsc_name) == []
+
+
+def test_port_chn_update_cleanup_fail():
+    srv_chn = get_srv_chn([[get_srv('sf0')], [get_srv('sf1')]])
+    srv_chn.heat_client.stacks.get.return_value.outputs = []
+    srv_chn.conn.network.ports.return_value = get_srv_ports(['sf0', 'sf1'])
+    pc_client = get_sfc_client()
+    port_chn = get_port_chn(srv_chn)
+    port_chn.pc_client = pc_client
+    port_chn.create()
+    grp_id = pc_client.find('port_pair_group', 'pc_pp_grp_1')['id']
+    pp_id = pc_client.find('port_pair', 'pc_pp_1_0')['id']
+
+    # The orphaned group can not be deleted, so its port pair is still in use
+    delete_by_id = pc_client.delete_by_id
+    pc_client.delete_by_id = lambda rsc_name, item_id: (
+        item_id != grp_id and delete_by_id(rsc_name, item_id))
+    srv_chn.update([[get_srv('sf0')]], wait_complete=False)
+    assert port_chn.update()['remove'] == 0
+    assert grp_id in port_chn.rsc_id_map['port_pair_group']
+    assert pp_id in port_chn.rsc_id_map['port_pair']
+
+    # Left items are deleted with the port chain
+    pc_client.delete_by_id = delete_by_id
+    port_chn.delete()
+    assert not any(port_chn.rsc_id_map.values())
+    for rsc_name in pc_client.rsc_tuple:
+        assert pc_client.list(rsc_name) == []
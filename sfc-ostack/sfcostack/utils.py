@@ -9,8 +9,14 @@ Email: xianglinks@gmail.com
 """
 
 import functools
+import os
+import threading
 import warnings
 
+# Path -> (mtime, content)
+_FILE_CACHE = dict()
+_FILE_CACHE_LOCK = threading.Lock()
+
 
 def deprecated(func):
     """This is a decorator which can be used to mark functions
@@ -26,3 +32,21 @@ def deprecated(func):
         return func(*args, **kwargs)
 
     return new_func
+
+
+def read_cached(path):
+    """Read a text file, the content is cached until its mtime changes
+
+    :param path (str): Path of the file
+    :retype: str
+    """
+    mtime = os.stat(path).st_mtime
+    with _FILE_CACHE_LOCK:
+        cached = _FILE_CACHE.get(path, None)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    with open(path, 'r') as text_file:
+        content = text_file.read()
+    with _FILE_CACHE_LOCK:
+        _FILE_CACHE[path] = (mtime, content)
+    return content